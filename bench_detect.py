@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import sys
+import time
+
+from playwright.async_api import async_playwright
+
+import main as orchestrator
+from main import DEFAULT_PREFLIGHT_CONFIG, HELPER_CALL
+from replay import percentile
+
+
+# 在页面内重复执行同一个检测，只计算检测本身的耗时，不含CDP往返
+BENCH_SCRIPT = '''async ([check, repeat]) => {
+    let run;
+    if (check.helper) {
+        run = () => window.__nf[check.helper](...(check.args || []));
+    } else if (check.xpath) {
+        run = () => {
+            const node = document.evaluate(check.xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+            return !!node && !!(node.offsetWidth || node.offsetHeight || node.getClientRects().length);
+        };
+    } else {
+        run = (0, eval)(check.script);
+    }
+    const times = [];
+    let result;
+    for (let i = 0; i < repeat; i++) {
+        const started = performance.now();
+        const value = run();
+        result = value && typeof value.then === 'function' ? await value : value;
+        times.push(performance.now() - started);
+    }
+    return {result, times};
+}'''
+
+PLACEHOLDERS = {
+    '@preflightRules': DEFAULT_PREFLIGHT_CONFIG['rules']
+}
+
+
+def resolve(value):
+    """以@开头的字符串引用main.py中的同名常量(XPath、检测脚本、点击目标)，修改main.py后用例自动跟着变化"""
+    if not isinstance(value, str) or not value.startswith('@'):
+        return value
+    if value in PLACEHOLDERS:
+        return PLACEHOLDERS[value]
+    if not hasattr(orchestrator, value[1:]):
+        raise ValueError(f"用例引用的常量不存在: {value}")
+    return getattr(orchestrator, value[1:])
+
+
+def load_cases(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        cases = json.load(f)['cases']
+    for case in cases:
+        for check in case['checks']:
+            check['args'] = [resolve(arg) for arg in check.get('args', [])]
+            for key in ('xpath', 'script'):
+                if key in check:
+                    check[key] = resolve(check[key])
+    return cases
+
+
+def matches(expected, actual):
+    """expected为字典时只比较其中列出的键，便于只写关心的字段"""
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(key in actual and matches(value, actual[key]) for key, value in expected.items())
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and all(map(matches, expected, actual))
+    return expected == actual
+
+
+async def roundtrip(page, check, times):
+    """main.py中每次检测都经过一次page.evaluate，单独统计包含CDP往返的耗时"""
+    samples = []
+    for _ in range(times):
+        started = time.perf_counter()
+        if check.get('helper'):
+            await page.evaluate(HELPER_CALL, [check['helper'], check['args']])
+        else:
+            await page.evaluate(BENCH_SCRIPT, [check, 1])
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentile(samples, 50)
+
+
+async def run_cases(cases, directory, helpers_script, inject_script, repeat, roundtrips):
+    results = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context(viewport={'width': 1280, 'height': 800})
+        await context.add_init_script(script=helpers_script)
+        page = await context.new_page()
+        for case in cases:
+            await page.goto(pathlib.Path(os.path.join(directory, case['fixture'])).resolve().as_uri())
+            await page.evaluate('() => { window.minesweeperNoAutostart = true; }')
+            await page.evaluate(inject_script)
+            for check in case['checks']:
+                measured = await page.evaluate(BENCH_SCRIPT, [check, repeat])
+                times = measured['times']
+                results.append({
+                    'id': f"{case['fixture']}::{check['name']}",
+                    'ok': matches(check['expect'], measured['result']),
+                    'expect': check['expect'],
+                    'actual': measured['result'],
+                    'meanMs': sum(times) / len(times),
+                    'p95Ms': percentile(times, 95),
+                    'maxMs': max(times),
+                    'callMs': await roundtrip(page, check, roundtrips)
+                })
+        await browser.close()
+    return results
+
+
+def regressions(results, baseline, tolerance, min_increase):
+    """页面内平均耗时超过基线的tolerance倍且至少慢min_increase毫秒时视为退化"""
+    found = []
+    for result in results:
+        base = baseline.get(result['id'])
+        if base is None:
+            continue
+        if result['meanMs'] > base['meanMs'] * tolerance and result['meanMs'] - base['meanMs'] >= min_increase:
+            found.append((result, base))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地Chromium中用保存的页面快照测试检测脚本的耗时和判断结果')
+    parser.add_argument('--cases', default='detect_fixtures/cases.json', help='用例文件，页面快照路径相对于该文件所在目录')
+    parser.add_argument('--helpers', default='helpers.js', help='页面公共函数脚本')
+    parser.add_argument('--inject', default='inject.js', help='扫雷注入脚本')
+    parser.add_argument('--repeat', type=int, default=50, help='每个检测在页面内重复执行的次数')
+    parser.add_argument('--roundtrips', type=int, default=5, help='每个检测包含CDP往返的测量次数')
+    parser.add_argument('--baseline', help='与之前保存的基线比较，耗时退化时以非0退出')
+    parser.add_argument('--save-baseline', metavar='PATH', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='判定为退化的倍数')
+    parser.add_argument('--min-increase', type=float, default=0.5, help='判定为退化的最少增加毫秒数')
+    args = parser.parse_args()
+
+    cases = load_cases(args.cases)
+    with open(args.helpers, 'r', encoding='utf-8') as f:
+        helpers_script = f.read()
+    with open(args.inject, 'r', encoding='utf-8') as f:
+        inject_script = f.read()
+
+    results = asyncio.run(run_cases(cases, os.path.dirname(os.path.abspath(args.cases)), helpers_script, inject_script,
+                                    args.repeat, args.roundtrips))
+
+    width = max(len(result['id']) for result in results)
+    print(f"{'用例':<{width}}  结果  平均ms   p95ms   最大ms  往返ms")
+    for result in results:
+        print(f"{result['id']:<{width}}  {'通过' if result['ok'] else '失败'}  {result['meanMs']:6.3f} {result['p95Ms']:7.3f} "
+              f"{result['maxMs']:8.3f} {result['callMs']:7.2f}")
+
+    failed = [result for result in results if not result['ok']]
+    print(f"\n{len(results)} 个检测，{len(failed)} 个判断错误")
+    for result in failed:
+        print(f"  {result['id']}: 期望 {json.dumps(result['expect'], ensure_ascii=False)}，"
+              f"实际 {json.dumps(result['actual'], ensure_ascii=False)}")
+
+    slower = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            slower = regressions(results, json.load(f), args.tolerance, args.min_increase)
+        print(f"与基线相比变慢的检测: {len(slower)} 个")
+        for result, base in slower:
+            print(f"  {result['id']}: {base['meanMs']:.3f} ms -> {result['meanMs']:.3f} ms")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({result['id']: {'meanMs': result['meanMs'], 'callMs': result['callMs']} for result in results},
+                      f, indent=4)
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if failed or slower:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
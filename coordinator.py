@@ -0,0 +1,90 @@
+
+import asyncio
+
+from fleet import env_key
+from logger import get_logger
+
+
+log = get_logger()
+
+
+def load_hosts(config):
+    """返回MoreLogin主机列表。未配置"hosts"时由"api"和"concurrency"组成单个主机，与原来的配置兼容"""
+    concurrency = config['concurrency']
+    defaults = {
+        'maxInstances': concurrency['maxInstances'],
+        'delayBetweenStartMs': concurrency['delayBetweenStartMs']
+    }
+    if not config.get('hosts'):
+        return [{'name': 'default', **defaults, **config['api']}]
+
+    hosts = []
+    names = set()
+    for index, host in enumerate(config['hosts']):
+        host = {'name': f'host{index + 1}', **defaults, **host}
+        for key in ('appId', 'secretKey', 'baseUrl'):
+            if not host.get(key):
+                raise ValueError(f"主机 {host['name']} 缺少 {key}")
+        if host['name'] in names:
+            raise ValueError(f"主机名重复: {host['name']}")
+        names.add(host['name'])
+        hosts.append(host)
+    return hosts
+
+
+def least_loaded(hosts, assignment):
+    return min(hosts, key=lambda host: (len(assignment[host['name']]) + 1) / host['maxInstances'])['name']
+
+
+def assign(environments, hosts):
+    """把环境分配到主机: 指定了"host"的环境只能在该主机运行，其余按各主机的剩余容量(已分配数/maxInstances)依次分配到最空闲的主机。
+    返回 ({主机名: [环境]}, [无法分配的环境])"""
+    by_name = {host['name']: host for host in hosts}
+    assignment = {host['name']: [] for host in hosts}
+    unassigned = []
+    floating = []
+    for env in environments:
+        name = env.get('host')
+        if name is None:
+            floating.append(env)
+        elif name in by_name:
+            assignment[name].append(env)
+        else:
+            unassigned.append(env)
+
+    for env in floating:
+        assignment[least_loaded(hosts, assignment)].append(env)
+
+    if unassigned:
+        log.error(f"以下环境指定的主机不存在，已跳过: "
+                  f"{', '.join(str(env['uniqueId']) + '(' + str(env.get('host')) + ')' for env in unassigned)}")
+    return assignment, unassigned
+
+
+async def locate(hosts, assignment, check):
+    """按分配结果查询各主机上的环境状态，check(host, envs)返回其中在该主机上无效的环境。
+    配置文件只存在于某个主机上，未指定"host"的环境在分配到的主机上无效时，依次换到其他主机上查询，所有主机都无效才剔除。
+    返回 ({主机名: [环境]}, [(无效的环境, 最后查询的主机名)])"""
+    placed = {host['name']: [] for host in hosts}
+    tried = {}
+    dropped = []
+    pending = assignment
+    while any(pending.values()):
+        results = await asyncio.gather(*(check(host, pending[host['name']]) for host in hosts))
+        moved = {host['name']: [] for host in hosts}
+        for host, invalid in zip(hosts, results):
+            invalid_keys = {env_key(env) for env in invalid}
+            placed[host['name']].extend(env for env in pending[host['name']] if env_key(env) not in invalid_keys)
+            for env in invalid:
+                seen = tried.setdefault(env_key(env), set())
+                seen.add(host['name'])
+                candidates = [other for other in hosts if other['name'] not in seen]
+                if env.get('host') is None and candidates:
+                    name = least_loaded(candidates, {other['name']: placed[other['name']] + moved[other['name']]
+                                                     for other in candidates})
+                    log.info(f"环境 {env['uniqueId']} 在主机 {host['name']} 上无效，改到 {name} 上查询")
+                    moved[name].append(env)
+                else:
+                    dropped.append((env, host['name']))
+        pending = moved
+    return placed, dropped
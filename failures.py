@@ -0,0 +1,193 @@
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_RETRY_CONFIG = {
+    'maxAttempts': 3,
+    'baseDelaySeconds': 30,
+    'maxDelaySeconds': 600
+}
+
+DEFAULT_BREAKER_CONFIG = {
+    'failureThreshold': 3,
+    'cooldownSeconds': 60
+}
+
+
+class EnvFailure(Exception):
+    """单个环境的失败，按类型决定是否重试，不会影响同批次的其他环境"""
+    kind = 'unknown'
+    retryable = True
+
+    def __init__(self, message, stage=None):
+        super().__init__(message)
+        self.stage = stage
+
+
+class ApiError(EnvFailure):
+    """MoreLogin接口返回了非0的code"""
+    kind = 'api_error'
+
+
+class InvalidEnv(ApiError):
+    """状态查询时MoreLogin不认识该环境，重试也不会成功"""
+    kind = 'invalid_env'
+    retryable = False
+
+
+class ApiUnavailable(EnvFailure):
+    """MoreLogin本地接口本身无法访问，计入熔断器"""
+    kind = 'api_unavailable'
+
+
+class CdpConnectError(EnvFailure):
+    kind = 'cdp_connect'
+
+
+class NavigationTimeout(EnvFailure):
+    kind = 'navigation_timeout'
+
+
+class SiteThrottled(EnvFailure):
+    """站点持续返回429或5xx，稍后重试"""
+    kind = 'site_throttled'
+
+
+class GameStall(EnvFailure):
+    kind = 'game_stall'
+
+
+class DeadlineExceeded(EnvFailure):
+    """环境会话或其中某个阶段超过时间预算，任务已被取消"""
+    kind = 'deadline'
+
+
+def classify(exc, stage=None):
+    if isinstance(exc, EnvFailure):
+        if exc.stage is None:
+            exc.stage = stage
+        return exc
+    failure = EnvFailure(f"{type(exc).__name__}: {str(exc)}", stage)
+    failure.__cause__ = exc
+    return failure
+
+
+class CircuitBreaker:
+    """连续多次接口不可用后暂停新的启动请求，冷却后放行一次试探请求"""
+
+    def __init__(self, name, failure_threshold, cooldown_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return 'half-open'
+        return 'open'
+
+    async def wait_ready(self):
+        """等待可以发出请求；返回True表示本次请求是半开状态下的试探请求"""
+        while True:
+            state = self.state
+            if state == 'closed':
+                return False
+            if state == 'half-open' and not self.probing:
+                self.probing = True
+                return True
+            remaining = self.cooldown_seconds - (time.monotonic() - self.opened_at)
+            await asyncio.sleep(max(remaining, 1))
+
+    def record_success(self):
+        if self.opened_at is not None:
+            log.info(f"MoreLogin接口已恢复，熔断器关闭 ({self.name})")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def release_probe(self):
+        # 试探请求被取消时既不算成功也不算失败，放行下一个请求重新试探
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                log.error(f"MoreLogin接口连续 {self.failures} 次不可用，暂停启动 {self.cooldown_seconds} 秒 ({self.name})")
+            self.opened_at = time.monotonic()
+
+
+_breaker_config = dict(DEFAULT_BREAKER_CONFIG)
+_breakers = {}
+
+
+def configure_breakers(config=None):
+    _breaker_config.update(config or {})
+
+
+def get_breaker(baseUrl):
+    breaker = _breakers.get(baseUrl)
+    if breaker is None:
+        breaker = _breakers[baseUrl] = CircuitBreaker(
+            baseUrl, _breaker_config['failureThreshold'], _breaker_config['cooldownSeconds'])
+    return breaker
+
+
+class RetryQueue:
+    """失败环境的重试队列，按指数退避计算下一次可执行时间"""
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_RETRY_CONFIG, **(config or {})}
+        self.heap = []
+        self.attempts = {}
+        self.given_up = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, env, failure):
+        key = (env['uniqueId'], env['envId'])
+        attempts = self.attempts.get(key, 1)
+        if not failure.retryable or attempts >= self.config['maxAttempts']:
+            log.error(f"实例 {env['uniqueId']} 已失败 {attempts} 次 ({failure.kind})，放弃重试")
+            self.given_up.append((env, failure))
+            return False
+
+        delay = min(self.config['baseDelaySeconds'] * (2 ** (attempts - 1)), self.config['maxDelaySeconds'])
+        self.attempts[key] = attempts + 1
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), env))
+        log.warning(f"实例 {env['uniqueId']} 失败 ({failure.kind}，阶段 {failure.stage or 'unknown'})，"
+                    f"{delay:.0f} 秒后进行第 {attempts + 1} 次尝试")
+        return True
+
+    def envs(self):
+        return [entry[2] for entry in sorted(self.heap)]
+
+    async def take(self, limit):
+        """等待最早的重试到期，然后取出所有已到期的环境，最多limit个"""
+        if not self.heap:
+            return []
+        wait = self.heap[0][0] - time.monotonic()
+        if wait > 0:
+            log.info(f"等待 {wait:.0f} 秒后开始重试...")
+            await asyncio.sleep(wait)
+
+        batch = []
+        now = time.monotonic()
+        while self.heap and len(batch) < limit and self.heap[0][0] <= now:
+            batch.append(heapq.heappop(self.heap)[2])
+        return batch
@@ -0,0 +1,96 @@
+
+import asyncio
+import collections
+import re
+import time
+from urllib.parse import urlparse
+
+from failures import ApiError, EnvFailure
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_FLEET_CONFIG = {
+    'enabled': True,
+    'concurrency': 10,
+    'attachRunning': True,
+    'maxAgeSeconds': 30,
+    # 只有明确表示环境不存在的错误才剔除，其他错误(例如接口忙)按状态未知处理，照常启动
+    'invalidPattern': r'not found|not exist|invalid|不存在|无效|未找到'
+}
+
+
+def env_key(env):
+    return (env['uniqueId'], env['envId'])
+
+
+def debug_address(baseUrl, port):
+    """调试端口在MoreLogin所在的机器上，主机名取自baseUrl；IPv6地址加方括号"""
+    host = urlparse(baseUrl).hostname or '127.0.0.1'
+    if ':' in host:
+        host = f'[{host}]'
+    return f'{host}:{port}'
+
+
+class Fleet:
+    """MoreLogin中各环境的实际状态: 已在运行的环境直接连接调试端口，无效的envId在占用并发名额之前剔除"""
+
+    def __init__(self, config=None, baseUrl=None):
+        self.config = {**DEFAULT_FLEET_CONFIG, **(config or {})}
+        self.baseUrl = baseUrl
+        self.status = {}
+
+    async def sync(self, environments, query):
+        """并发查询环境状态，query(env)返回 /api/env/status 的data；maxAgeSeconds内查询过的环境跳过"""
+        if not self.config['enabled']:
+            return
+        now = time.monotonic()
+        stale = [env for env in environments
+                 if now - self.status.get(env_key(env), {}).get('at', float('-inf')) > self.config['maxAgeSeconds']]
+        if not stale:
+            return
+        semaphore = asyncio.Semaphore(self.config['concurrency'])
+
+        async def check(env):
+            async with semaphore:
+                try:
+                    data = await query(env)
+                except ApiError as e:
+                    if re.search(self.config['invalidPattern'], str(e), re.IGNORECASE):
+                        return {'state': 'invalid', 'reason': str(e)}
+                    return {'state': 'unknown', 'reason': str(e)}
+                except EnvFailure as e:
+                    return {'state': 'unknown', 'reason': str(e)}
+            running = 'running' in (str(data.get('localStatus')), str(data.get('status')))
+            if running and data.get('debugPort'):
+                return {'state': 'running', 'debugPort': data['debugPort']}
+            return {'state': 'stopped'}
+
+        results = await asyncio.gather(*(check(env) for env in stale))
+        checked_at = time.monotonic()
+        for env, status in zip(stale, results):
+            self.status[env_key(env)] = {**status, 'at': checked_at}
+        counts = collections.Counter(status['state'] for status in results)
+        log.info(f"环境状态同步完成 ({checked_at - now:.1f} 秒): 运行中 {counts['running']}，未运行 {counts['stopped']}，"
+                 f"无效 {counts['invalid']}，未知 {counts['unknown']}")
+
+    def state(self, env):
+        return self.status.get(env_key(env), {}).get('state', 'unknown')
+
+    def invalid(self, environments):
+        return [env for env in environments if self.state(env) == 'invalid']
+
+    def reason(self, env):
+        return self.status.get(env_key(env), {}).get('reason')
+
+    def debug_url(self, env):
+        """环境已在运行时返回调试地址，否则返回None由调用方正常启动"""
+        status = self.status.get(env_key(env))
+        if not self.config['attachRunning'] or not status or status['state'] != 'running':
+            return None
+        return debug_address(self.baseUrl, status['debugPort'])
+
+    def forget(self, env):
+        # 环境被关闭或重新启动后状态不再可信，下次使用前重新查询
+        self.status.pop(env_key(env), None)
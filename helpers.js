@@ -0,0 +1,300 @@
+(function() {
+
+    if (window.__nf) return;
+
+    const CLOSE_TEXTS = ['X', '×', '✕', '✖'];
+
+
+    function isVisible(el) {
+        return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    }
+
+
+    function textOf(el) {
+        return (el.textContent || '').trim();
+    }
+
+
+    function isClickable(el) {
+        return el.tagName === 'BUTTON' || el.tagName === 'A' ||
+               el.getAttribute('role') === 'button' ||
+               el.style.cursor === 'pointer';
+    }
+
+
+    function clickTargetOf(el) {
+        let target = el;
+        while (target && target.tagName !== 'BODY') {
+            if (isClickable(target)) return target;
+            target = target.parentElement;
+        }
+        return el;
+    }
+
+
+    function findByText(label, opts) {
+        const exact = opts.exact !== false;
+        const matches = Array.from(document.querySelectorAll(opts.tag || '*')).filter(el => {
+            const text = textOf(el);
+            return exact ? text === label : text.includes(label);
+        });
+
+        // 只去掉内部还有其他匹配元素的外层元素；指定tag时<button><p>文字</p></button>中的<p>不是候选，button保留
+        const innermost = exact ? matches : matches.filter(el =>
+            !matches.some(other => other !== el && el.contains(other)));
+        return innermost.find(isVisible) || innermost[0] || null;
+    }
+
+
+    function clickByText(label, opts) {
+        opts = opts || {};
+        const el = findByText(label, opts);
+        if (!el) return false;
+        (opts.direct ? el : clickTargetOf(el)).click();
+        return true;
+    }
+
+
+    function clickXPath(xpath) {
+        const result = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null);
+        if (result && result.singleNodeValue) {
+            result.singleNodeValue.click();
+            return true;
+        }
+        return false;
+    }
+
+
+    function clickSelector(selector) {
+        const el = document.querySelector(selector);
+        if (el) {
+            el.click();
+            return true;
+        }
+        return false;
+    }
+
+
+    function clickAny(steps) {
+        for (const step of steps) {
+            let clicked = false;
+            if (step.xpath) clicked = clickXPath(step.xpath);
+            else if (step.selector) clicked = clickSelector(step.selector);
+            else if (step.text) clicked = clickByText(step.text, step);
+            else if (step.closestToCenter) clicked = clickClosestToCenter(step.closestToCenter);
+            if (clicked) return true;
+        }
+        return false;
+    }
+
+
+    function clickClosestToCenter(selector) {
+        const cx = window.innerWidth / 2;
+        const cy = window.innerHeight / 2;
+        let closest = null;
+        let closestDistance = Infinity;
+        for (const el of document.querySelectorAll(selector)) {
+            const rect = el.getBoundingClientRect();
+            const distance = Math.hypot(rect.left + rect.width / 2 - cx, rect.top + rect.height / 2 - cy);
+            if (distance < closestDistance) {
+                closestDistance = distance;
+                closest = el;
+            }
+        }
+        if (closest) {
+            closest.click();
+            return true;
+        }
+        return false;
+    }
+
+
+    function textVisible(...labels) {
+        return labels.some(label => {
+            const el = findByText(label, {exact: false});
+            return !!el && isVisible(el);
+        });
+    }
+
+
+    function hasText(...words) {
+        const text = (document.body.innerText || document.body.textContent || '').toUpperCase();
+        return words.every(word => text.includes(word));
+    }
+
+
+    function modalText() {
+        if (hasText('MAXIMUM', 'GAMEPLAY', 'REACHED')) return 'text';
+        if (hasText('PLAY', 'AGAIN', 'TOMORROW')) return 'tomorrow';
+        if (/TOTAL[^\n]*\d/.test((document.body.innerText || '').toUpperCase())) return 'total';
+        return null;
+    }
+
+
+    function findModal() {
+        const byText = modalText();
+        if (byText === 'text' || byText === 'tomorrow') return {found: true, method: byText};
+
+        const vw = window.innerWidth;
+        const vh = window.innerHeight;
+        const overlay = Array.from(document.querySelectorAll('div')).some(el => {
+            if (!el.children || el.children.length === 0) return false;
+            const style = window.getComputedStyle(el);
+            const bgColor = style.backgroundColor || '';
+            return (style.position === 'fixed' || style.position === 'absolute') &&
+                   bgColor.includes('rgb') &&
+                   parseFloat(style.opacity || 1) < 1 &&
+                   parseInt(style.zIndex || 0) > 10 &&
+                   el.offsetWidth > vw * 0.5 &&
+                   el.offsetHeight > vh * 0.5;
+        });
+        if (overlay) return {found: true, method: 'visual'};
+
+        const closeButton = Array.from(document.querySelectorAll('*')).some(el => {
+            if (!CLOSE_TEXTS.includes(el.textContent || '')) return false;
+            const style = window.getComputedStyle(el);
+            const rect = el.getBoundingClientRect();
+            return (style.position === 'absolute' || style.position === 'fixed') &&
+                   style.cursor === 'pointer' &&
+                   rect.top < vh * 0.4 && rect.right > vw * 0.6;
+        });
+        if (closeButton) return {found: true, method: 'closeBtn'};
+
+        if (byText) return {found: true, method: byText};
+        return {found: false};
+    }
+
+
+    function closeModal() {
+        const element = document.elementFromPoint(window.innerWidth * 0.85, window.innerHeight * 0.25);
+        if (element) {
+            if (CLOSE_TEXTS.includes(element.textContent || '')) {
+                element.click();
+                return true;
+            }
+            let target = element;
+            for (let i = 0; i < 5 && target && target.tagName !== 'BODY'; i++) {
+                if (target.tagName === 'BUTTON' || target.tagName === 'A' ||
+                    window.getComputedStyle(target).cursor === 'pointer') {
+                    target.click();
+                    return true;
+                }
+                target = target.parentElement;
+            }
+            element.click();
+            return true;
+        }
+
+        const closeButton = Array.from(document.querySelectorAll('*')).find(el =>
+            CLOSE_TEXTS.includes(el.textContent || '') && window.getComputedStyle(el).cursor === 'pointer');
+        if (closeButton) {
+            closeButton.click();
+            return true;
+        }
+
+        const modal = document.querySelector('div[class*="modal"], div[role="dialog"]');
+        const button = modal && modal.querySelector('button[aria-label="Close"], button[class*="close"]');
+        if (button) {
+            button.click();
+            return true;
+        }
+        return false;
+    }
+
+
+    function clickOutside(points) {
+        const vw = window.innerWidth;
+        const vh = window.innerHeight;
+        const presets = {
+            edges: [[10, 10], [vw - 10, 10], [10, vh - 10], [vw - 10, vh - 10],
+                    [vw / 2, 10], [vw / 2, vh - 10], [10, vh / 2], [vw - 10, vh / 2]],
+            sides: [[vw / 2, vh * 0.1], [vw * 0.1, vh / 2], [vw * 0.9, vh / 2], [vw / 2, vh * 0.9]]
+        };
+        let success = false;
+        for (const [x, y] of presets[points] || presets.edges) {
+            const el = document.elementFromPoint(x, y);
+            if (el) {
+                el.dispatchEvent(new MouseEvent('click', {view: window, bubbles: true, cancelable: true}));
+                success = true;
+            }
+        }
+        return success;
+    }
+
+
+    function scopeText(el, levels) {
+        const texts = [];
+        let node = el;
+        for (let i = 0; i < levels && node && node.tagName !== 'BODY'; i++) {
+            texts.push((node.innerText || node.textContent || '').toUpperCase());
+            node = node.parentElement;
+        }
+        return texts;
+    }
+
+
+    function taskStatus(rules) {
+        // 每个任务: 找到入口按钮，在按钮所在卡片内读取剩余次数和"已用完"提示；无法判断时返回null，由调用方照常执行
+        const result = {};
+        const pageText = (document.body.innerText || '').toUpperCase();
+        for (const [name, rule] of Object.entries(rules)) {
+            const status = {available: null, remaining: null, reason: 'unknown'};
+            result[name] = status;
+
+            const globalHit = (rule.pageTexts || []).find(text => pageText.includes(text.toUpperCase()));
+            if (globalHit) {
+                Object.assign(status, {available: false, reason: globalHit});
+                continue;
+            }
+
+            const label = findByText(rule.button, {exact: true});
+            if (!label) {
+                status.reason = 'button-missing';
+                continue;
+            }
+            const target = clickTargetOf(label);
+            const scopes = scopeText(target, rule.scopeLevels || 4);
+
+            if (rule.remainingPattern) {
+                const pattern = new RegExp(rule.remainingPattern, 'i');
+                for (const text of scopes) {
+                    const match = text.match(pattern);
+                    if (match) {
+                        status.remaining = Number(match[1]);
+                        break;
+                    }
+                }
+            }
+            const exhausted = (rule.exhaustedTexts || []).find(text =>
+                scopes.some(scope => scope.includes(text.toUpperCase())));
+
+            if (target.disabled || target.getAttribute('aria-disabled') === 'true') {
+                Object.assign(status, {available: false, reason: 'button-disabled'});
+            } else if (exhausted) {
+                Object.assign(status, {available: false, reason: exhausted});
+            } else if (status.remaining !== null) {
+                Object.assign(status, {available: status.remaining > 0, reason: 'remaining'});
+            } else {
+                Object.assign(status, {available: true, reason: 'button-enabled'});
+            }
+        }
+        return result;
+    }
+
+
+    window.__nf = {
+        clickByText,
+        clickXPath,
+        clickSelector,
+        clickAny,
+        clickClosestToCenter,
+        clickOutside,
+        findModal,
+        taskStatus,
+        textVisible,
+        closeModal,
+        modalGone: () => modalText() === null,
+        gameLoaded: () => document.querySelectorAll('.cell, .grid, .board, .game-container, .gamerow').length > 0,
+        viewport: () => [window.innerWidth, window.innerHeight]
+    };
+})();
@@ -0,0 +1,215 @@
+
+import argparse
+import socket
+import sqlite3
+import statistics
+import time
+
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_HISTORY_CONFIG = {
+    'enabled': True,
+    'path': 'history.db'
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    host TEXT NOT NULL,
+    startedAt TEXT NOT NULL,
+    endedAt TEXT,
+    envs INTEGER,
+    peakRssMb REAL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    runId INTEGER NOT NULL REFERENCES runs (id),
+    uniqueId TEXT NOT NULL,
+    envId TEXT NOT NULL,
+    startedAt TEXT NOT NULL,
+    day TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    status TEXT NOT NULL,
+    kind TEXT,
+    stage TEXT,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    attached INTEGER NOT NULL DEFAULT 0,
+    gamesWon INTEGER NOT NULL DEFAULT 0,
+    gamesLost INTEGER NOT NULL DEFAULT 0,
+    diceRolls INTEGER NOT NULL DEFAULT 0,
+    jsHeapMb REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_env ON sessions (uniqueId, day);
+CREATE INDEX IF NOT EXISTS idx_sessions_day ON sessions (day);
+CREATE TABLE IF NOT EXISTS stage_timings (
+    sessionId INTEGER NOT NULL REFERENCES sessions (id),
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_session ON stage_timings (sessionId);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_stage ON stage_timings (stage);
+'''
+
+# 用于判断环境是否变慢的阶段: 启动环境和打开页面
+TREND_STAGES = ('start_env', 'navigate')
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux上ru_maxrss单位为KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class History:
+    """每次运行和每个环境会话的结果、各阶段耗时，按天汇总后用于发现变慢的环境"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.run_id = None
+
+    def close(self):
+        if self.run_id is not None:
+            with self.db:
+                self.db.execute('UPDATE runs SET endedAt = ?, peakRssMb = ? WHERE id = ?',
+                                (time.strftime('%Y-%m-%d %H:%M:%S'), peak_rss_mb(), self.run_id))
+        self.db.close()
+
+    def start_run(self, envs):
+        with self.db:
+            cursor = self.db.execute('INSERT INTO runs (host, startedAt, envs) VALUES (?, ?, ?)',
+                                     (socket.gethostname(), time.strftime('%Y-%m-%d %H:%M:%S'), envs))
+        self.run_id = cursor.lastrowid
+
+    def record(self, sessions, attempts=None):
+        """sessions为run_instance结束时生成的字典列表，一轮结束后批量写入"""
+        attempts = attempts or {}
+        with self.db:
+            for session in sessions:
+                cursor = self.db.execute(
+                    'INSERT INTO sessions (runId, uniqueId, envId, startedAt, day, seconds, status, kind, stage, attempt, '
+                    'attached, gamesWon, gamesLost, diceRolls, jsHeapMb) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (self.run_id, str(session['uniqueId']), str(session['envId'] or ''), session['startedAt'],
+                     session['startedAt'][:10], session['seconds'], session['status'], session.get('kind'),
+                     session.get('stage'), attempts.get((session['uniqueId'], session['envId']), 1),
+                     int(session.get('attached', False)), session['counts'].get('games_won', 0),
+                     session['counts'].get('games_lost', 0), session['counts'].get('dice_rolls', 0),
+                     session.get('jsHeapMb')))
+                self.db.executemany('INSERT INTO stage_timings (sessionId, stage, seconds) VALUES (?, ?, ?)',
+                                    [(cursor.lastrowid, stage, seconds) for stage, seconds in session['timings'].items()])
+
+    def stage_trends(self, since):
+        """{阶段: {日期: 中位数}}"""
+        rows = self.db.execute(
+            'SELECT t.stage, s.day, t.seconds FROM stage_timings t JOIN sessions s ON s.id = t.sessionId '
+            'WHERE s.day >= ? ORDER BY t.stage, s.day', (since,))
+        return medians(rows)
+
+    def env_days(self, since):
+        """{uniqueId: {日期: (会话数, 成功数, 胜, 负)}}"""
+        result = {}
+        for uniqueId, day, sessions, ok, won, lost in self.db.execute(
+                'SELECT uniqueId, day, COUNT(*), SUM(status = \'ok\'), SUM(gamesWon), SUM(gamesLost) FROM sessions '
+                'WHERE day >= ? GROUP BY uniqueId, day ORDER BY uniqueId, day', (since,)):
+            result.setdefault(uniqueId, {})[day] = (sessions, ok, won, lost)
+        return result
+
+    def env_stage_samples(self, since, stages=TREND_STAGES):
+        """{(uniqueId, 阶段): [(日期, 秒)]}，直接连接已运行环境的会话没有真正启动，不计入"""
+        result = {}
+        for uniqueId, stage, day, seconds in self.db.execute(
+                f'SELECT s.uniqueId, t.stage, s.day, t.seconds FROM stage_timings t JOIN sessions s ON s.id = t.sessionId '
+                f'WHERE s.day >= ? AND s.attached = 0 AND t.stage IN ({", ".join("?" * len(stages))}) ORDER BY s.startedAt',
+                (since, *stages)):
+            result.setdefault((uniqueId, stage), []).append((day, seconds))
+        return result
+
+
+def medians(rows):
+    grouped = {}
+    for key, day, seconds in rows:
+        grouped.setdefault(key, {}).setdefault(day, []).append(seconds)
+    return {key: {day: statistics.median(values) for day, values in days.items()} for key, days in grouped.items()}
+
+
+def degrading(samples, recent_days, ratio, min_increase, min_samples=3):
+    """最近recent_days天的中位数相比之前的中位数变慢超过ratio倍且至少慢min_increase秒时返回 (之前, 最近)"""
+    days = sorted({day for day, _ in samples})
+    if len(days) <= recent_days:
+        return None
+    cutoff = days[-recent_days]
+    before = [seconds for day, seconds in samples if day < cutoff]
+    recent = [seconds for day, seconds in samples if day >= cutoff]
+    if len(before) < min_samples or len(recent) < min_samples:
+        return None
+    baseline = statistics.median(before)
+    current = statistics.median(recent)
+    if current >= baseline * ratio and current - baseline >= min_increase:
+        return baseline, current
+    return None
+
+
+def open_history(config):
+    config = {**DEFAULT_HISTORY_CONFIG, **(config or {})}
+    if not config['enabled']:
+        return None
+    return History(config['path'])
+
+
+def report(history, days, recent_days, ratio, min_increase):
+    since = time.strftime('%Y-%m-%d', time.localtime(time.time() - days * 86400))
+    lines = []
+
+    trends = history.stage_trends(since)
+    all_days = sorted({day for values in trends.values() for day in values})
+    lines.append(f"== 各阶段耗时中位数(秒)，{since} 起 ==")
+    lines.append(f"{'阶段':<14}" + ''.join(f"{day[5:]:>8}" for day in all_days))
+    for stage, values in sorted(trends.items()):
+        lines.append(f"{stage:<14}" + ''.join(f"{values[day]:8.1f}" if day in values else f"{'-':>8}" for day in all_days))
+
+    lines.append("\n== 各环境每天的结果 (成功/会话数，胜-负) ==")
+    for uniqueId, values in sorted(history.env_days(since).items(), key=lambda kv: str(kv[0])):
+        cells = [f"{day[5:]} {ok}/{sessions} {won}-{lost}" for day, (sessions, ok, won, lost) in sorted(values.items())]
+        lines.append(f"{uniqueId:<8}" + '  '.join(cells))
+
+    flagged = []
+    for (uniqueId, stage), samples in history.env_stage_samples(since).items():
+        result = degrading(samples, recent_days, ratio, min_increase)
+        if result:
+            flagged.append((result[1] - result[0], uniqueId, stage, *result))
+    lines.append(f"\n== 变慢的环境 (最近 {recent_days} 天中位数 >= 之前的 {ratio} 倍且至少慢 {min_increase} 秒) ==")
+    if not flagged:
+        lines.append("无")
+    for _, uniqueId, stage, baseline, current in sorted(flagged, reverse=True):
+        lines.append(f"{uniqueId:<8} {stage:<10} {baseline:6.1f} 秒 -> {current:6.1f} 秒")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行历史: 按天查看各阶段和各环境的耗时趋势，找出变慢的环境')
+    parser.add_argument('--db', default=DEFAULT_HISTORY_CONFIG['path'], help='历史数据库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help='输出趋势报告')
+    report_parser.add_argument('--days', type=int, default=14, help='统计最近多少天')
+    report_parser.add_argument('--recent-days', type=int, default=3, help='与之前比较的最近天数')
+    report_parser.add_argument('--ratio', type=float, default=1.5, help='判定为变慢的倍数')
+    report_parser.add_argument('--min-increase', type=float, default=2.0, help='判定为变慢的最少增加秒数')
+    args = parser.parse_args()
+
+    history = History(args.db)
+    try:
+        if args.command == 'report':
+            print(report(history, args.days, args.recent_days, args.ratio, args.min_increase))
+    finally:
+        history.db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@
 (function() {
     
     const DELAY_BETWEEN_MOVES = 1000; 
+    const RETRY_DELAY = 200;
+    const MAX_UNACKED_ROUNDS = 3;
     
     
     let gameState = {
@@ -9,11 +11,142 @@
         rows: 10,  
         cols: 10,  
         gameOver: false,
+        result: null, 
         clickedCells: new Set(), 
-        runningLoop: true 
+        unackedClicks: 0,
+        stalledCell: null,
+        runningLoop: true,
+        source: 'dom'
     };
     
     
+    // 由Python端监听游戏接口响应后推送的棋盘，比点击时间新时优先使用，不再读取DOM样式
+    let networkState = null;
+    let lastClickAt = 0;
+    window.minesweeperPushState = function(state) {
+        networkState = Object.assign({ at: performance.now() }, state);
+        if (pendingAck) {
+            pendingAck();
+        }
+    };
+    
+    
+    window.minesweeperStatus = function() {
+        return {
+            gameOver: gameState.gameOver,
+            result: gameState.result,
+            clicks: gameState.clickedCells.size,
+            unacked: gameState.unackedClicks,
+            stalled: gameState.stalledCell,
+            running: gameState.runningLoop
+        };
+    };
+    
+    
+    const TRACE_LIMIT = 2000;
+    const gameId = Date.now();
+    window.__minesweeperTrace = window.__minesweeperTrace || [];
+    let lastDecision = null;
+    let traceRecordedGameOver = false;
+    
+    
+    function encodeBoard() {
+        const { tiles, rows, cols } = gameState;
+        const lines = [];
+        for (let y = 0; y < rows; y++) {
+            let line = '';
+            for (let x = 0; x < cols; x++) {
+                const tile = tiles[y][x];
+                line += tile === null ? '.' : String(tile);
+            }
+            lines.push(line);
+        }
+        return lines.join('/');
+    }
+    
+    
+    function decodeBoard(board) {
+        const lines = board.split('/');
+        const tiles = lines.map(line => Array.from(line).map(ch => {
+            if (ch === '.') return null;
+            if (ch >= '0' && ch <= '8') return Number(ch);
+            return ch;
+        }));
+        return { tiles, rows: tiles.length, cols: tiles.length ? tiles[0].length : 0 };
+    }
+    
+    
+    function decide(reason, move, probabilityMap) {
+        let probs = null;
+        if (probabilityMap) {
+            probs = {};
+            const moveKey = move ? `${move[0]},${move[1]}` : null;
+            for (const key in probabilityMap) {
+                if (probabilityMap[key] > 0 || key === moveKey) {
+                    probs[key] = Math.round(probabilityMap[key] * 1000) / 1000;
+                }
+            }
+        }
+        lastDecision = { reason, move, probs };
+        return move;
+    }
+    
+    
+    function recordTrace(entry) {
+        const trace = window.__minesweeperTrace;
+        if (trace.length >= TRACE_LIMIT) {
+            trace.shift();
+        }
+        trace.push(Object.assign({ t: Date.now(), game: gameId }, entry));
+    }
+    
+    
+    window.collectMinesweeperTrace = function() {
+        const trace = window.__minesweeperTrace;
+        window.__minesweeperTrace = [];
+        return trace;
+    };
+    
+    
+    window.minesweeperSolve = function(board) {
+        const decoded = decodeBoard(board);
+        gameState.tiles = decoded.tiles;
+        gameState.rows = decoded.rows;
+        gameState.cols = decoded.cols;
+        gameState.clickedCells = new Set();
+        gameState.runningLoop = true;
+        const started = performance.now();
+        calculateNextMove();
+        return Object.assign({ elapsedMs: performance.now() - started }, lastDecision);
+    };
+    
+    
+    // 离线基准测试用: 从当前DOM解析一次棋盘，返回编码后的棋盘和耗时
+    window.minesweeperParse = function() {
+        const started = performance.now();
+        const state = parseGameState();
+        if (!state) {
+            return null;
+        }
+        return {
+            board: encodeBoard(),
+            rows: state.rows,
+            cols: state.cols,
+            gameOver: state.gameOver,
+            result: state.result,
+            source: state.source,
+            elapsedMs: performance.now() - started
+        };
+    };
+    
+    
+    function logMove(...args) {
+        if (window.minesweeperVerbose) {
+            console.log(...args);
+        }
+    }
+    
+    
     window.stopMinesweeper = function() {
         console.log('正在停止扫雷脚本...');
         gameState.runningLoop = false;
@@ -21,8 +154,66 @@
     };
     
     
+    function parseNetworkState() {
+        if (!networkState || !networkState.board || networkState.at < lastClickAt) {
+            return false;
+        }
+        const decoded = decodeBoard(networkState.board);
+        gameState.tiles = decoded.tiles;
+        gameState.rows = decoded.rows;
+        gameState.cols = decoded.cols;
+        gameState.source = 'network';
+        if (networkState.gameOver) {
+            gameState.gameOver = true;
+            gameState.result = networkState.result || gameState.result;
+        }
+        return true;
+    }
+    
+    
+    // 从格子的类名和样式解析其状态: null未翻开，数字，'F'标记，'B'/'X'/'M'雷；无法识别时返回undefined
+    function decodeTile(tile) {
+        
+        const isNumberTile = tile.classList.contains('tile-changed') && 
+                            tile.textContent && !isNaN(parseInt(tile.textContent));
+        
+        
+        const isEmptyTile = tile.style.backgroundColor === 'transparent' && 
+                          tile.style.color === 'white';
+        
+        
+        const isUnclickedTile = !tile.classList.contains('tile-changed') && 
+                             !tile.classList.contains('tile-flagged') && 
+                             !tile.classList.contains('tile-mine') && 
+                             !tile.classList.contains('bomb') && 
+                             !isEmptyTile && 
+                             (!tile.textContent || tile.textContent.trim() === '');
+        
+        
+        if (tile.classList.contains('bomb')) {
+            // 未标记的雷在胜利时显示，其余雷表示踩雷
+            return tile.classList.contains('bomb-unflagged-won') ? 'B' : 'X';
+        } else if (tile.classList.contains('tile-flagged')) {
+            return 'F';
+        } else if (tile.classList.contains('tile-mine')) {
+            return 'M';
+        } else if (isNumberTile) {
+            return parseInt(tile.textContent);
+        } else if (isEmptyTile) {
+            return 0;
+        } else if (isUnclickedTile) {
+            return null;
+        }
+        return undefined;
+    }
+    
+    
     function parseGameState() {
         
+        if (parseNetworkState()) {
+            return gameState;
+        }
+        gameState.source = 'dom';
         
         const gameRow = document.querySelector('.gamerow');
         if (!gameRow) {
@@ -56,66 +247,25 @@
             const cells = row.children; 
             
             for (let x = 0; x < cells.length; x++) {
-                const cell = cells[x];
-                const tile = cell.querySelector('.tile');
+                const tile = cells[x].querySelector('.tile');
                 
                 if (!tile) continue;
                 
-                
-                
-                
-                const isNumberTile = tile.classList.contains('tile-changed') && 
-                                    tile.textContent && !isNaN(parseInt(tile.textContent));
-                
-                
-                const isEmptyTile = tile.style.backgroundColor === 'transparent' && 
-                                  tile.style.color === 'white';
-                
-                
-                const isUnclickedTile = !tile.classList.contains('tile-changed') && 
-                                     !tile.classList.contains('tile-flagged') && 
-                                     !tile.classList.contains('tile-mine') && 
-                                     !tile.classList.contains('bomb') && 
-                                     !isEmptyTile && 
-                                     (!tile.textContent || tile.textContent.trim() === '');
-                
-                
-                const isUnflaggedBomb = tile.classList.contains('bomb') && 
-                                      tile.classList.contains('bomb-unflagged-won');
-                
-                
-                const isExplodedBomb = tile.classList.contains('bomb') && 
-                                     !tile.classList.contains('bomb-unflagged-won');
-                
-                if (isUnflaggedBomb) {
-                    
-                    gameState.tiles[y][x] = 'B';
+                const value = decodeTile(tile);
+                gameState.tiles[y][x] = value;
+                if (value === 'B') {
                     gameState.gameOver = true; 
+                    gameState.result = 'won';
                     console.log('游戏胜利！检测到未标记的雷');
-                } else if (isExplodedBomb) {
-                    
-                    gameState.tiles[y][x] = 'X';
+                } else if (value === 'X') {
                     gameState.gameOver = true; 
+                    gameState.result = 'lost';
                     console.log('游戏失败！踩到地雷了');
-                } else if (tile.classList.contains('tile-flagged')) {
-                    
-                    gameState.tiles[y][x] = 'F';
-                } else if (tile.classList.contains('tile-mine')) {
-                    
-                    gameState.tiles[y][x] = 'M';
+                } else if (value === 'M') {
                     gameState.gameOver = true;
-                } else if (isNumberTile) {
-                    
-                    gameState.tiles[y][x] = parseInt(tile.textContent);
-                } else if (isEmptyTile) {
-                    
-                    gameState.tiles[y][x] = 0;
-                } else if (isUnclickedTile) {
-                    
-                    gameState.tiles[y][x] = null;
-                } else {
-                    
-                    console.log(`无法识别的格子类型 at (${x}, ${y})`, tile);
+                    gameState.result = 'lost';
+                } else if (value === undefined) {
+                    logMove(`无法识别的格子类型 at (${x}, ${y})`, tile.className);
                     gameState.tiles[y][x] = null;
                 }
             }
@@ -126,72 +276,240 @@
     }
     
     
-    function clickTile(x, y) {
-        
-        const cellKey = `${x},${y}`;
-        if (gameState.clickedCells.has(cellKey)) {
-            console.warn(`格子 (${x}, ${y}) 已经被点击过，跳过`);
-            return false;
-        }
-        
-        
+    function findTile(x, y) {
         const gameRow = document.querySelector('.gamerow');
         if (!gameRow) {
             console.error('找不到游戏棋盘');
-            return false;
+            return null;
         }
         
         
         const gameCols = gameRow.querySelectorAll('.gamecol');
         if (!gameCols || gameCols.length <= y) {
             console.error(`找不到行 ${y}`);
-            return false;
+            return null;
         }
         
         
         const cells = gameCols[y].children;
         if (!cells || cells.length <= x) {
             console.error(`找不到列 ${x}`);
-            return false;
+            return null;
         }
         
         
         const tile = cells[x].querySelector('.tile');
         if (!tile) {
             console.error(`找不到格子 (${x}, ${y})`);
-            return false;
+            return null;
         }
+        return tile;
+    }
+    
+    
+    // 点击是否生效只看格子是否已经翻开或标记，与parseGameState的判断一致；悬停、焦点等样式变化不算
+    function tileOpened(x, y, since) {
+        if (networkState && networkState.at >= since && networkState.board) {
+            if (networkState.gameOver) return true;
+            const row = networkState.board.split('/')[y];
+            if (row && row[x] !== undefined && row[x] !== '.') return true;
+        }
+        const tile = findTileQuiet(x, y);
+        if (!tile) return false;
+        const value = decodeTile(tile);
+        return value !== null && value !== undefined;
+    }
+    
+    
+    // 依次尝试的点击方式: 前一种在确认时限内没有让格子翻开时换下一种
+    const DISPATCH_STRATEGIES = ['click', 'pointer', 'native', 'point'];
+    
+    function dispatchClick(tile, strategy) {
+        const rect = tile.getBoundingClientRect();
+        const init = {
+            bubbles: true,
+            cancelable: true,
+            view: window,
+            button: 0,
+            clientX: rect.left + rect.width / 2,
+            clientY: rect.top + rect.height / 2
+        };
+        if (strategy === 'pointer') {
+            // 只监听pointerdown/mousedown的页面收不到单独的click
+            for (const type of ['pointerdown', 'mousedown', 'pointerup', 'mouseup', 'click']) {
+                const EventType = type.startsWith('pointer') && window.PointerEvent ? PointerEvent : MouseEvent;
+                tile.dispatchEvent(new EventType(type, Object.assign({
+                    pointerId: 1,
+                    isPrimary: true,
+                    buttons: type.endsWith('down') ? 1 : 0
+                }, init)));
+            }
+        } else if (strategy === 'native') {
+            tile.click();
+        } else if (strategy === 'point') {
+            // 事件处理器可能在覆盖格子的元素上
+            const target = document.elementFromPoint(init.clientX, init.clientY) || tile;
+            target.dispatchEvent(new MouseEvent('click', init));
+        } else {
+            tile.dispatchEvent(new MouseEvent('click', init));
+        }
+    }
+    
+    
+    // 确认时限按最近的确认耗时自适应: 中位数的3倍，限制在 ACK_MIN_MS ~ ACK_MAX_MS 之间
+    // 下限不能太低: 同步渲染时中位数接近0，稍慢一次的更新就会被当成未生效而重复点击
+    const ACK_MIN_MS = 200;
+    const ACK_MAX_MS = 600;
+    const ACK_SAMPLES = 20;
+    const ackLatencies = [];
+    let pendingAck = null;
+    
+    function ackTimeout() {
+        if (ackLatencies.length < 3) {
+            return 250;
+        }
+        const sorted = ackLatencies.slice().sort((a, b) => a - b);
+        return Math.min(ACK_MAX_MS, Math.max(ACK_MIN_MS, sorted[Math.floor(sorted.length / 2)] * 3));
+    }
+    
+    
+    function waitForAck(x, y, tile, strategy, attempt) {
+        const gameRow = document.querySelector('.gamerow');
+        return new Promise(resolve => {
+            let observer = null;
+            let timer = null;
+            let done = false;
+            const started = performance.now();
+            const finish = (source) => {
+                if (done) return;
+                done = true;
+                if (observer) observer.disconnect();
+                clearTimeout(timer);
+                pendingAck = null;
+                if (source) {
+                    ackLatencies.push(performance.now() - started);
+                    ackLatencies.splice(0, ackLatencies.length - ACK_SAMPLES);
+                }
+                resolve(source);
+            };
+            // 棋盘有变化或者收到新的接口状态时检查格子是否已经翻开
+            const check = () => {
+                if (tileOpened(x, y, started)) return finish('opened');
+            };
+            pendingAck = check;
+            if (gameRow) {
+                observer = new MutationObserver(check);
+                observer.observe(document.body || gameRow, { subtree: true, childList: true, attributes: true, characterData: true });
+            }
+            // 每换一种方式时限多加一份，给前一次点击较慢的更新留出时间
+            timer = setTimeout(() => finish(null), ackTimeout() * attempt);
+            lastClickAt = performance.now();
+            dispatchClick(tile, strategy);
+            // React等框架对离散事件同步更新DOM，派发后立即检查一次
+            if (pendingAck === check) check();
+        });
+    }
+    
+    
+    function findTileQuiet(x, y) {
+        const gameCols = document.querySelectorAll('.gamerow .gamecol');
+        const cell = gameCols[y] && gameCols[y].children[x];
+        return cell ? cell.querySelector('.tile') : null;
+    }
+    
+    
+    async function clickTile(x, y) {
         
+        const cellKey = `${x},${y}`;
+        if (gameState.clickedCells.has(cellKey)) {
+            logMove(`格子 (${x}, ${y}) 已经被点击过，跳过`);
+            return 'opened';
+        }
         
         
-        
-        const isNumberTile = tile.classList.contains('tile-changed') && 
-                            tile.textContent && !isNaN(parseInt(tile.textContent));
+        const tile = findTile(x, y);
+        if (!tile) {
+            return 'missing';
+        }
         
         
-        const isEmptyTile = tile.style.backgroundColor === 'transparent' && 
-                          tile.style.color === 'white';
         
         
-        if (isNumberTile || isEmptyTile || tile.classList.contains('tile-flagged')) {
-            console.warn(`格子 (${x}, ${y}) 已经被翻开或标记，跳过`);
-            return false;
+        if (gameState.source === 'network') {
+            if (gameState.tiles[y][x] !== null) {
+                logMove(`格子 (${x}, ${y}) 已经被翻开或标记，跳过`);
+                return 'opened';
+            }
+        } else {
+            const isNumberTile = tile.classList.contains('tile-changed') && 
+                                tile.textContent && !isNaN(parseInt(tile.textContent));
+            
+            
+            const isEmptyTile = tile.style.backgroundColor === 'transparent' && 
+                              tile.style.color === 'white';
+            
+            
+            if (isNumberTile || isEmptyTile || tile.classList.contains('tile-flagged')) {
+                logMove(`格子 (${x}, ${y}) 已经被翻开或标记，跳过`);
+                return 'opened';
+            }
         }
         
-        console.log(`点击格子 (${x}, ${y})`);
         
+        // 由Python端提供: 每一步点击先从本机所有环境共用的操作预算中取一个令牌，站点退避期间也在这里等待
+        if (typeof window.minesweeperAcquire === 'function') {
+            try {
+                await window.minesweeperAcquire();
+            } catch (e) {
+                logMove('获取点击预算失败', e);
+            }
+        }
         
-        gameState.clickedCells.add(cellKey);
         
+        for (const [index, strategy] of DISPATCH_STRATEGIES.entries()) {
+            // 棋盘可能在两次尝试之间重新渲染，每次重新查找格子
+            const target = findTileQuiet(x, y);
+            if (!target) {
+                return 'missing';
+            }
+            // 上一种方式的更新可能在确认时限之后才到达，格子已经翻开时不再点击
+            if (tileOpened(x, y, lastClickAt)) {
+                gameState.clickedCells.add(cellKey);
+                return 'acked';
+            }
+            logMove(`点击格子 (${x}, ${y}) (${strategy})`);
+            const ack = await waitForAck(x, y, target, strategy, index + 1);
+            if (ack) {
+                // 只有确认翻开的点击才记为已点击
+                gameState.clickedCells.add(cellKey);
+                return 'acked';
+            }
+            logMove(`格子 (${x}, ${y}) 点击后没有翻开 (${strategy})，换一种方式`);
+        }
+        if (tileOpened(x, y, lastClickAt)) {
+            gameState.clickedCells.add(cellKey);
+            return 'acked';
+        }
+        gameState.unackedClicks += 1;
+        return 'unacked';
+    }
+    
+    
+    function pickOpeningMove() {
+        const { tiles, rows, cols } = gameState;
+        const book = window.minesweeperOpeningBook;
+        const entry = book && book.boards && book.boards[`${rows}x${cols}`];
+        if (!entry || !Array.isArray(entry.cells)) {
+            return null;
+        }
         
-        const clickEvent = new MouseEvent('click', {
-            bubbles: true,
-            cancelable: true,
-            view: window
-        });
         
-        tile.dispatchEvent(clickEvent);
-        return true;
+        for (const [x, y] of entry.cells) {
+            if (y < rows && x < cols && tiles[y][x] === null && !gameState.clickedCells.has(`${x},${y}`)) {
+                return [x, y];
+            }
+        }
+        return null;
     }
     
     
@@ -216,8 +534,13 @@
         
         
         if (revealed.length === 0) {
+            const openingMove = pickOpeningMove();
+            if (openingMove) {
+                logMove(`开局表格子: (${openingMove[0]}, ${openingMove[1]})`);
+                return decide('book', openingMove);
+            }
             const corners = [[0, 0], [0, rows-1], [cols-1, 0], [cols-1, rows-1]];
-            return corners[Math.floor(Math.random() * corners.length)];
+            return decide('corner', corners[Math.floor(Math.random() * corners.length)]);
         }
         
         
@@ -310,15 +633,15 @@
             }
             
             if (bestSafeCell) {
-                console.log('找到安全格子:', bestSafeCell);
-                return bestSafeCell;
+                logMove('找到安全格子:', bestSafeCell);
+                return decide('safe', bestSafeCell);
             }
             
             
             const safeCellsArray = Array.from(safeCells).map(key => key.split(',').map(Number));
             const randomSafeCell = safeCellsArray[Math.floor(Math.random() * safeCellsArray.length)];
-            console.log('随机安全格子:', randomSafeCell);
-            return randomSafeCell;
+            logMove('随机安全格子:', randomSafeCell);
+            return decide('safe-random', randomSafeCell);
         }
         
         
@@ -391,8 +714,8 @@
         
         
         if (bestCell) {
-            console.log(`基于概率的最佳格子: (${bestCell[0]}, ${bestCell[1]}) (概率: ${minProbability}, 边缘分: ${maxEdgeScore})`);
-            return bestCell;
+            logMove(`基于概率的最佳格子: (${bestCell[0]}, ${bestCell[1]}) (概率: ${minProbability}, 边缘分: ${maxEdgeScore})`);
+            return decide('probability', bestCell, probabilityMap);
         }
         
         
@@ -400,15 +723,15 @@
         const safeUnknown = unrevealed.filter(([x, y]) => !mineCells.has(`${x},${y}`));
         if (safeUnknown.length > 0) {
             const randomCell = safeUnknown[Math.floor(Math.random() * safeUnknown.length)];
-            console.log(`随机格子 (后备): (${randomCell[0]}, ${randomCell[1]})`);
-            return randomCell;
+            logMove(`随机格子 (后备): (${randomCell[0]}, ${randomCell[1]})`);
+            return decide('fallback-random', randomCell);
         }
         
         
         if (unrevealed.length > 0) {
             const lastResort = unrevealed[Math.floor(Math.random() * unrevealed.length)];
-            console.log(`最后手段: (${lastResort[0]}, ${lastResort[1]})`);
-            return lastResort;
+            logMove(`最后手段: (${lastResort[0]}, ${lastResort[1]})`);
+            return decide('last-resort', lastResort);
         }
         
         
@@ -419,8 +742,8 @@
             for (let x = 0; x < cols; x++) {
                 if (tiles[y][x] === null && !gameState.clickedCells.has(`${x},${y}`)) {
                     anyUnclickedCell = [x, y];
-                    console.log(`找到未点击的格子: (${x}, ${y})`);
-                    return anyUnclickedCell;
+                    logMove(`找到未点击的格子: (${x}, ${y})`);
+                    return decide('any-unclicked', anyUnclickedCell);
                 }
             }
         }
@@ -428,10 +751,12 @@
         
         console.log('所有格子都已点击过或被标记，游戏可能已完成');
         gameState.runningLoop = false;
-        return null; 
+        return decide('none', null); 
     }
     
     
+    let unackedRounds = {};
+    
     function gameLoop() {
         
         if (!gameState.runningLoop) {
@@ -440,6 +765,15 @@
         }
         
         
+        // 站点返回429/5xx时Python端设置的全局退避，期间不发出点击
+        const pausedFor = (window.minesweeperPausedUntil || 0) - Date.now();
+        if (pausedFor > 0) {
+            logMove(`站点限流，暂停 ${pausedFor} 毫秒`);
+            setTimeout(gameLoop, pausedFor);
+            return;
+        }
+        
+        
         if (!parseGameState()) {
             console.error('无法解析游戏状态，5秒后重试...');
             if (gameState.runningLoop) {
@@ -451,11 +785,25 @@
         
         if (gameState.gameOver) {
             console.log('游戏结束!');
+            if (!traceRecordedGameOver) {
+                traceRecordedGameOver = true;
+                recordTrace({ rows: gameState.rows, cols: gameState.cols, board: encodeBoard(), result: gameState.result });
+            }
             return;
         }
         
         
         const nextMove = calculateNextMove();
+        if (lastDecision) {
+            recordTrace({
+                rows: gameState.rows,
+                cols: gameState.cols,
+                board: encodeBoard(),
+                move: lastDecision.move,
+                reason: lastDecision.reason,
+                probs: lastDecision.probs
+            });
+        }
         
         
         if (!nextMove) {
@@ -466,22 +814,38 @@
         const [nextX, nextY] = nextMove;
         
         
-        if (clickTile(nextX, nextY)) {
-            
-            if (gameState.runningLoop) {
-                setTimeout(gameLoop, DELAY_BETWEEN_MOVES);
+        clickTile(nextX, nextY).then(outcome => {
+            const cellKey = `${nextX},${nextY}`;
+            if (outcome === 'acked' || outcome === 'opened') {
+                // opened: 棋盘解析落后于页面，格子实际已经翻开，记为已点击后正常进行下一步
+                gameState.clickedCells.add(cellKey);
+                unackedRounds = {};
+                if (gameState.runningLoop) {
+                    setTimeout(gameLoop, DELAY_BETWEEN_MOVES);
+                }
+                return;
             }
-        } else {
-            console.error('点击失败，3秒后重试...');
             
-            gameState.clickedCells.add(`${nextX},${nextY}`);
+            // 点击没有让格子翻开或找不到格子时不记为已点击，重新解析棋盘后立即重试；同一格子连续多轮不成功时停止，避免空等
+            unackedRounds[cellKey] = (unackedRounds[cellKey] || 0) + 1;
+            if (unackedRounds[cellKey] >= MAX_UNACKED_ROUNDS) {
+                console.error(`格子 (${nextX}, ${nextY}) 连续 ${MAX_UNACKED_ROUNDS} 轮点击失败 (${outcome})，停止游戏循环`);
+                gameState.stalledCell = cellKey;
+                gameState.runningLoop = false;
+                return;
+            }
+            console.error(`点击未完成 (${outcome})，${RETRY_DELAY} 毫秒后重试...`);
             if (gameState.runningLoop) {
-                setTimeout(gameLoop, 3000);
+                setTimeout(gameLoop, RETRY_DELAY);
             }
-        }
+        });
     }
     
     
+    if (window.minesweeperNoAutostart) {
+        return;
+    }
+    
     console.log('扫雷自动化脚本已启动!');
     console.log('要停止脚本，请在控制台输入 stopMinesweeper() 并回车');
     setTimeout(gameLoop, 1000); 
@@ -0,0 +1,234 @@
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_INVENTORY_CONFIG = {
+    'enabled': True,
+    'path': 'inventory.db'
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS environments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uniqueId TEXT NOT NULL,
+    envId TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL,
+    lastStatus TEXT,
+    lastKind TEXT,
+    lastRunAt TEXT,
+    runs INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (uniqueId, envId)
+);
+CREATE INDEX IF NOT EXISTS idx_environments_envId ON environments (envId);
+CREATE INDEX IF NOT EXISTS idx_environments_uniqueId ON environments (uniqueId);
+CREATE INDEX IF NOT EXISTS idx_environments_status ON environments (active, lastStatus, lastRunAt);
+CREATE TABLE IF NOT EXISTS tags (
+    envRowId INTEGER NOT NULL REFERENCES environments (id),
+    tag TEXT NOT NULL,
+    PRIMARY KEY (tag, envRowId)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_env ON tags (envRowId);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+class Inventory:
+    """env.json的索引副本，记录每个环境的标签和最近一次运行结果，用于按条件挑选环境"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def sync_file(self, env_path):
+        """env.json有变化时才重新导入，未变化时直接复用已有索引"""
+        stat = os.stat(env_path)
+        signature = f'{os.path.abspath(env_path)}:{stat.st_mtime_ns}:{stat.st_size}'
+        if self._get_meta('source') == signature:
+            return False
+        with open(env_path, 'r', encoding='utf-8') as f:
+            environments = json.load(f)['environments']
+        self.sync(environments)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('source', signature))
+        return True
+
+    def sync(self, environments):
+        """以env.json为准: 新增或更新条目，文件中已删除的条目标记为不活跃(保留历史状态)"""
+        with self.db:
+            self.db.execute('UPDATE environments SET active = 0')
+            for position, env in enumerate(environments):
+                self.db.execute(
+                    'INSERT INTO environments (uniqueId, envId, position, active, data) VALUES (?, ?, ?, 1, ?) '
+                    'ON CONFLICT (uniqueId, envId) DO UPDATE SET position = excluded.position, active = 1, data = excluded.data',
+                    (str(env.get('uniqueId')), str(env.get('envId') or ''), position, json.dumps(env, ensure_ascii=False)))
+                # 标签以文件为准，先清空再写入，文件中去掉的标签不再参与筛选
+                row_id = self._row_id(env)
+                self.db.execute('DELETE FROM tags WHERE envRowId = ?', (row_id,))
+                if env.get('tags'):
+                    self.db.executemany('INSERT OR IGNORE INTO tags (envRowId, tag) VALUES (?, ?)',
+                                        [(row_id, tag) for tag in env['tags']])
+        log.info(f"环境清单已同步: {len(environments)} 个环境")
+
+    def _row_id(self, env):
+        row = self.db.execute('SELECT id FROM environments WHERE uniqueId = ? AND envId = ?',
+                              (str(env.get('uniqueId')), str(env.get('envId') or ''))).fetchone()
+        return row[0] if row else None
+
+    def _where(self, envIds=None, uniqueIds=None, tags=None, statuses=None, since=None):
+        clauses = ['e.active = 1']
+        params = []
+        if envIds:
+            clauses.append(f"e.envId IN ({', '.join('?' * len(envIds))})")
+            params.extend(str(v) for v in envIds)
+        if uniqueIds:
+            clauses.append(f"e.uniqueId IN ({', '.join('?' * len(uniqueIds))})")
+            params.extend(str(v) for v in uniqueIds)
+        if tags:
+            clauses.append(f"e.id IN (SELECT envRowId FROM tags WHERE tag IN ({', '.join('?' * len(tags))}))")
+            params.extend(tags)
+        if statuses:
+            never = 'never' in statuses
+            statuses = [s for s in statuses if s != 'never']
+            parts = []
+            if statuses:
+                parts.append(f"e.lastStatus IN ({', '.join('?' * len(statuses))})")
+                params.extend(statuses)
+            if never:
+                parts.append('e.lastStatus IS NULL')
+            clauses.append('(' + ' OR '.join(parts) + ')')
+        if since:
+            clauses.append('e.lastRunAt >= ?')
+            params.append(since)
+        return ' AND '.join(clauses), params
+
+    def select(self, envIds=None, uniqueIds=None, tags=None, statuses=None, since=None, limit=None):
+        """按条件返回env.json中的原始条目，保持文件中的顺序"""
+        where, params = self._where(envIds, uniqueIds, tags, statuses, since)
+        sql = f'SELECT e.data FROM environments e WHERE {where} ORDER BY e.position'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [json.loads(row[0]) for row in self.db.execute(sql, params)]
+
+    def rows(self, **query):
+        where, params = self._where(**query)
+        sql = (f'SELECT e.uniqueId, e.envId, e.lastStatus, e.lastKind, e.lastRunAt, e.runs, '
+               f'(SELECT group_concat(tag, \',\') FROM tags t WHERE t.envRowId = e.id) '
+               f'FROM environments e WHERE {where} ORDER BY e.position')
+        return self.db.execute(sql, params).fetchall()
+
+    def record(self, results):
+        """results为 [(env, status, kind)]，一轮结束后批量写入"""
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.db:
+            self.db.executemany(
+                'UPDATE environments SET lastStatus = ?, lastKind = ?, lastRunAt = ?, runs = runs + 1 '
+                'WHERE uniqueId = ? AND envId = ?',
+                [(status, kind, now, str(env.get('uniqueId')), str(env.get('envId') or ''))
+                 for env, status, kind in results])
+
+    def tag(self, tag, environments, remove=False):
+        row_ids = [row_id for row_id in (self._row_id(env) for env in environments) if row_id is not None]
+        with self.db:
+            if remove:
+                self.db.executemany('DELETE FROM tags WHERE envRowId = ? AND tag = ?', [(r, tag) for r in row_ids])
+            else:
+                self.db.executemany('INSERT OR IGNORE INTO tags (envRowId, tag) VALUES (?, ?)', [(r, tag) for r in row_ids])
+        return len(row_ids)
+
+
+def open_inventory(config, env_path):
+    config = {**DEFAULT_INVENTORY_CONFIG, **(config or {})}
+    if not config['enabled']:
+        return None
+    inventory = Inventory(config['path'])
+    inventory.sync_file(env_path)
+    return inventory
+
+
+def add_selection_args(parser):
+    group = parser.add_argument_group('环境筛选 (可组合，条件之间为"且")')
+    group.add_argument('--env-id', action='append', default=[], help='按envId选择，可重复指定')
+    group.add_argument('--unique-id', action='append', default=[], help='按uniqueId选择，可重复指定')
+    group.add_argument('--tag', action='append', default=[], help='按标签选择，可重复指定(任一标签匹配)')
+    group.add_argument('--status', action='append', default=[],
+                       help='按最近一次运行结果选择: ok、failed、never(从未运行)')
+    group.add_argument('--since', help='只选最近一次运行时间不早于该时间的环境，如 2025-01-01')
+    group.add_argument('--limit', type=int, help='最多选择的环境数量')
+
+
+def selection_query(args):
+    return {
+        'envIds': args.env_id,
+        'uniqueIds': args.unique_id,
+        'tags': args.tag,
+        'statuses': args.status,
+        'since': args.since
+    }
+
+
+def has_selection(args):
+    return any(selection_query(args).values()) or args.limit is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='环境清单: 从env.json建立索引，按条件查询和打标签')
+    parser.add_argument('--db', default=DEFAULT_INVENTORY_CONFIG['path'], help='清单数据库路径')
+    parser.add_argument('--env', default='env.json', help='环境列表文件路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('sync', help='从env.json导入')
+    list_parser = subparsers.add_parser('list', help='列出符合条件的环境')
+    add_selection_args(list_parser)
+    tag_parser = subparsers.add_parser('tag', help='给符合条件的环境添加或移除标签')
+    tag_parser.add_argument('name', help='标签名')
+    tag_parser.add_argument('--remove', action='store_true', help='移除标签')
+    add_selection_args(tag_parser)
+    args = parser.parse_args()
+
+    inventory = Inventory(args.db)
+    try:
+        if args.command == 'sync':
+            inventory.sync_file(args.env)
+            print(f"已同步 {args.env} 到 {args.db}")
+        elif args.command == 'list':
+            query = selection_query(args)
+            rows = inventory.rows(**query)
+            if args.limit:
+                rows = rows[:args.limit]
+            for uniqueId, envId, status, kind, runAt, runs, tags in rows:
+                print(f"{uniqueId}\t{envId or '-'}\t{status or 'never'}{'(' + kind + ')' if kind else ''}\t"
+                      f"{runAt or '-'}\t运行{runs}次\t{tags or ''}")
+            print(f"共 {len(rows)} 个环境")
+        elif args.command == 'tag':
+            if not has_selection(args):
+                parser.error('tag 需要至少一个筛选条件')
+            environments = inventory.select(limit=args.limit, **selection_query(args))
+            count = inventory.tag(args.name, environments, args.remove)
+            print(f"已{'移除' if args.remove else '添加'}标签 {args.name}: {count} 个环境")
+    finally:
+        inventory.close()
+
+
+if __name__ == '__main__':
+    main()
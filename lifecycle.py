@@ -0,0 +1,78 @@
+
+import asyncio
+import weakref
+
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_LIFECYCLE_CONFIG = {
+    'enabled': True,
+    'freezeLeftover': True,
+    'freezeFinished': True,
+    'timeoutSeconds': 5
+}
+
+# 已冻结的页面和每个页面的CDP会话，页面关闭后自动移除
+frozenPages = weakref.WeakKeyDictionary()
+pageSessions = weakref.WeakKeyDictionary()
+
+_lifecycle_config = dict(DEFAULT_LIFECYCLE_CONFIG)
+
+
+def configure_lifecycle(config=None):
+    _lifecycle_config.update(config or {})
+
+
+async def set_state(page, state):
+    """Page.setWebLifecycleState: frozen会同时把页面切到后台，定时器、动画和轮询请求全部暂停，active恢复"""
+    session = pageSessions.get(page)
+    if session is None:
+        session = await page.context.new_cdp_session(page)
+        pageSessions[page] = session
+    await asyncio.wait_for(session.send('Page.setWebLifecycleState', {'state': state}),
+                           _lifecycle_config['timeoutSeconds'])
+
+
+async def freeze(page):
+    if not _lifecycle_config['enabled'] or page in frozenPages or page.is_closed():
+        return False
+    try:
+        await set_state(page, 'frozen')
+    except Exception as e:
+        log.debug(f"冻结标签页失败 ({page.url}): {str(e)}")
+        return False
+    frozenPages[page] = True
+    return True
+
+
+async def wake(page):
+    """冻结的页面在再次操作之前恢复，未冻结时只做一次字典查询"""
+    if page not in frozenPages:
+        return
+    del frozenPages[page]
+    try:
+        await set_state(page, 'active')
+    except Exception as e:
+        log.debug(f"恢复标签页失败 ({page.url}): {str(e)}")
+
+
+def is_frozen(page):
+    return page in frozenPages
+
+
+async def freeze_idle(context, active):
+    """冻结环境中除active之外的标签页(配置文件恢复的旧标签页、连接时的空白页)"""
+    if not _lifecycle_config['freezeLeftover']:
+        return
+    idle = [page for page in context.pages if page not in active]
+    frozen = await asyncio.gather(*(freeze(page) for page in idle))
+    if any(frozen):
+        log.info(f"已冻结 {sum(frozen)} 个空闲标签页")
+
+
+async def finished(page):
+    """并行任务结束后其标签页不再使用，冻结直到环境关闭，避免与仍在进行的任务抢CPU"""
+    if _lifecycle_config['freezeFinished']:
+        await freeze(page)
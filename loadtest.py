@@ -0,0 +1,211 @@
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import main as orchestrator
+from logger import shutdown_logging
+from replay import percentile
+
+
+def wait_for_server(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def read_process_table():
+    """一次扫描/proc得到每个进程的父进程和RSS(字节)，非Linux返回None"""
+    if not os.path.isdir('/proc'):
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    children = {}
+    rss = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(name))
+            rss[int(name)] = int(fields[21]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return children, rss
+
+
+def tree_rss(table, root_pid, exclude=()):
+    """root_pid及其所有子孙进程的RSS之和，exclude中的进程连同其子树不计入"""
+    children, rss = table
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in exclude:
+            continue
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+def measure_rss(mock_pids):
+    """调度进程(不含模拟服务及其启动的浏览器)和浏览器各自的内存，在线程中执行避免扫描/proc占用事件循环"""
+    table = read_process_table()
+    if table is None:
+        return None
+    own = tree_rss(table, os.getpid(), exclude=set(mock_pids))
+    browsers = sum(tree_rss(table, pid) for pid in mock_pids)
+    return own, browsers
+
+
+async def sample(stats, mock_pids, interval):
+    """采样事件循环延迟和内存: 延迟为sleep实际醒来时间与预期的差值"""
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        stats['lagMs'].append(max(0.0, (time.perf_counter() - expected) * 1000))
+        stats['active'].append(len(orchestrator.openEnvs))
+        measured = await asyncio.to_thread(measure_rss, mock_pids)
+        if measured is not None:
+            stats['orchestratorRss'].append(measured[0])
+            stats['browserRss'].append(measured[1])
+
+
+def mock_env(args, index):
+    env = {'uniqueId': index + 1, 'envId': f'mock-{index + 1}'}
+    # 多主机时前几个环境固定在第一个主机上，其余由调度自动分配
+    if args.hosts > 1 and index < args.pinned:
+        env['host'] = 'mock1'
+    return env
+
+
+def build_files(args, directory):
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config = copy.deepcopy(config)
+    base_url = f'http://127.0.0.1:{args.port}'
+    config['api'] = {'appId': 'mock', 'secretKey': 'mock', 'baseUrl': base_url}
+    config['site'] = {'rewardsUrl': f'{base_url}/portal/rewards?games={args.games}&delay={args.delay}'}
+    config['concurrency'] = {'maxInstances': args.concurrency, 'delayBetweenStartMs': args.stagger}
+    config.pop('hosts', None)
+    if args.hosts > 1:
+        # 每个主机一个模拟服务，端口依次递增，并发数平分
+        config['hosts'] = [{'name': f'mock{i + 1}', 'appId': 'mock', 'secretKey': 'mock',
+                            'baseUrl': f'http://127.0.0.1:{args.port + i}',
+                            'maxInstances': max(1, args.concurrency // args.hosts)} for i in range(args.hosts)]
+    config['rounds'] = {'delayBetweenRoundsSeconds': 0}
+    config.setdefault('logging', {}).update({'dir': os.path.join(directory, 'logs'), 'consoleLevel': 'WARNING'})
+    config['trace'] = {'enabled': False, 'dir': os.path.join(directory, 'traces')}
+    config['retry'] = {'maxAttempts': 1}
+    config['metrics'] = {'enabled': False}
+    config['network'] = {'enabled': True, 'urlPattern': r'/api/mock/state'}
+    config['inventory'] = {'enabled': True, 'path': os.path.join(directory, 'inventory.db')}
+    config['history'] = {'enabled': True, 'path': os.path.join(directory, 'history.db')}
+    config['timing'] = {**config.get('timing', {}), 'path': os.path.join(directory, 'timing.json')}
+    config['snapshots'] = {**config.get('snapshots', {}), 'dir': os.path.join(directory, 'snapshots')}
+    config['throttle'] = {**config.get('throttle', {}), 'urlPattern': r'127\.0\.0\.1'}
+    config['render'] = {**config.get('render', {}), 'reduced': args.reduced_render}
+
+    config_path = os.path.join(directory, 'config.json')
+    env_path = os.path.join(directory, 'env.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    with open(env_path, 'w', encoding='utf-8') as f:
+        json.dump({'environments': [mock_env(args, i) for i in range(args.envs)]}, f, indent=4)
+    return config_path, env_path
+
+
+async def run(args, config_path, env_path, mock_pids):
+    stats = {'lagMs': [], 'active': [], 'orchestratorRss': [], 'browserRss': []}
+    sampler = asyncio.create_task(sample(stats, mock_pids, args.sample_interval))
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        await orchestrator.main(orchestrator.parse_args(['--config', config_path, '--env', env_path,
+                                                         '--start-round', '1', '--no-resume']))
+    finally:
+        stats['wallSeconds'] = time.perf_counter() - wall_start
+        stats['cpuSeconds'] = time.process_time() - cpu_start
+        sampler.cancel()
+    return stats
+
+
+def report(args, stats):
+    peak_active = max(stats['active'] or [0]) or 1
+    print(f"\n====== 压测结果: {args.envs} 个环境，{args.hosts} 个主机，并发 {args.concurrency} ======")
+    print(f"总耗时: {stats['wallSeconds']:.1f} 秒，调度进程CPU: {stats['cpuSeconds']:.1f} 秒 "
+          f"(每环境 {stats['cpuSeconds'] / args.envs * 1000:.0f} ms)")
+    print(f"事件循环延迟: p50 {percentile(stats['lagMs'], 50):.1f} ms，p99 {percentile(stats['lagMs'], 99):.1f} ms，"
+          f"最大 {max(stats['lagMs'] or [0]):.1f} ms")
+    print(f"同时运行的环境峰值: {max(stats['active'] or [0])}")
+    if stats['orchestratorRss']:
+        peak_own = max(stats['orchestratorRss'])
+        peak_browsers = max(stats['browserRss'])
+        print(f"调度进程内存峰值: {peak_own / 1048576:.0f} MB (每个运行中环境 {peak_own / peak_active / 1048576:.1f} MB)")
+        print(f"浏览器内存峰值: {peak_browsers / 1048576:.0f} MB (每个运行中环境 {peak_browsers / peak_active / 1048576:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用模拟MoreLogin接口和本地奖励页面压测main.py的调度开销')
+    parser.add_argument('--envs', type=int, default=100, help='模拟环境数量')
+    parser.add_argument('--concurrency', type=int, default=20, help='maxInstances')
+    parser.add_argument('--stagger', type=int, default=200, help='delayBetweenStartMs')
+    parser.add_argument('--games', type=int, default=3, help='模拟页面每天可玩的局数')
+    parser.add_argument('--delay', type=int, default=100, help='模拟页面每次操作的响应延迟(毫秒)')
+    parser.add_argument('--port', type=int, default=40100, help='模拟服务端口')
+    parser.add_argument('--config', default='config.json', help='作为基础的配置文件')
+    parser.add_argument('--chrome', help='Chromium可执行文件，默认使用playwright自带的chromium')
+    parser.add_argument('--invalid', type=int, default=0, help='其中envId无效的环境数量(取最后N个)')
+    parser.add_argument('--reduced-render', action='store_true', help='开启精简渲染模式，与默认模式对比每个环境的耗时和CPU')
+    parser.add_argument('--hosts', type=int, default=1, help='模拟的MoreLogin主机数量，端口从--port开始依次递增')
+    parser.add_argument('--pinned', type=int, default=0, help='多主机时固定在第一个主机上的环境数量(取前N个)')
+    parser.add_argument('--sample-interval', type=float, default=0.1, help='采样间隔(秒)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='newton-loadtest-')
+    config_path, env_path = build_files(args, directory)
+    orchestrator.INTERRUPTED_FILE = os.path.join(directory, 'interrupted.json')
+
+    mocks = []
+    for port in range(args.port, args.port + args.hosts):
+        command = [sys.executable, 'mock_server.py', '--port', str(port)]
+        if args.chrome:
+            command += ['--chrome', args.chrome]
+        for i in range(args.envs - args.invalid, args.envs):
+            command += ['--invalid-env', f'mock-{i + 1}']
+        mocks.append(subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__))))
+    try:
+        for port in range(args.port, args.port + args.hosts):
+            if not wait_for_server(f'http://127.0.0.1:{port}/portal/rewards'):
+                print("模拟服务启动失败")
+                sys.exit(1)
+        stats = asyncio.run(run(args, config_path, env_path, [mock.pid for mock in mocks]))
+        report(args, stats)
+        print(f"日志目录: {os.path.join(directory, 'logs')}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
+        for mock in mocks:
+            mock.terminate()
+        for mock in mocks:
+            try:
+                mock.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                mock.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+
+import contextvars
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+
+
+LOGGER_NAME = 'newton'
+
+DEFAULT_LOGGING_CONFIG = {
+    'level': 'DEBUG',
+    'consoleLevel': 'INFO',
+    'dir': 'logs',
+    'maxBytes': 5 * 1024 * 1024,
+    'backupCount': 3,
+    'browserConsole': {
+        'enabled': True,
+        'level': 'warning',
+        'sampleRate': 0.1
+    }
+}
+
+# 浏览器console类型到日志级别的映射，顺序即严重程度
+BROWSER_LEVELS = {
+    'debug': logging.DEBUG,
+    'log': logging.INFO,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR
+}
+
+uniqueIdVar = contextvars.ContextVar('uniqueId', default='-')
+envIdVar = contextvars.ContextVar('envId', default='-')
+
+_listener = None
+_browser_console_config = DEFAULT_LOGGING_CONFIG['browserConsole']
+
+
+def get_logger():
+    return logging.getLogger(LOGGER_NAME)
+
+
+def bind_env(uniqueId, envId):
+    """为当前协程上下文绑定环境信息，之后的日志都会带上uniqueId/envId"""
+    uniqueIdVar.set(str(uniqueId))
+    envIdVar.set(envId or '-')
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, 'uniqueId'):
+            record.uniqueId = uniqueIdVar.get()
+        if not hasattr(record, 'envId'):
+            record.envId = envIdVar.get()
+        return True
+
+
+class ConsoleFormatter(logging.Formatter):
+    """控制台只输出一行摘要，完整堆栈写入文件"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname).1s [%(uniqueId)s] %(message)s', datefmt='%H:%M:%S')
+
+    def format(self, record):
+        summary = copy.copy(record)
+        summary.exc_info = None
+        summary.exc_text = None
+        message = super().format(summary)
+        if record.exc_info and record.exc_info[1] is not None:
+            exc = record.exc_info[1]
+            detail = str(exc).splitlines()[0] if str(exc) else ''
+            message += f" ({type(exc).__name__}: {detail})"
+        return message
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """队列只在进程内使用，保留exc_info交给各个输出端自行决定是否展开堆栈"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class PerEnvFileHandler(logging.Handler):
+    """按环境把日志写入各自的滚动文件，未绑定环境的日志写入main.log"""
+
+    def __init__(self, directory, max_bytes, backup_count):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.handlers = {}
+        self.formatter = logging.Formatter(
+            '%(asctime)s %(levelname)-7s [uniqueId=%(uniqueId)s envId=%(envId)s] %(message)s')
+        os.makedirs(directory, exist_ok=True)
+
+    def _handler_for(self, record):
+        uniqueId = getattr(record, 'uniqueId', '-')
+        key = 'main' if uniqueId == '-' else 'env-' + re.sub(r'[^\w.-]', '_', uniqueId)
+        handler = self.handlers.get(key)
+        if handler is None:
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(self.directory, key + '.log'),
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding='utf-8'
+            )
+            handler.setFormatter(self.formatter)
+            self.handlers[key] = handler
+        return handler
+
+    def emit(self, record):
+        try:
+            self._handler_for(record).emit(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        super().close()
+
+
+def setup_logging(config=None):
+    """启动基于队列的日志管道，调用方只负责入队，格式化和写盘在后台线程完成"""
+    global _listener, _browser_console_config
+
+    log_config = {**DEFAULT_LOGGING_CONFIG, **(config or {})}
+    _browser_console_config = {**DEFAULT_LOGGING_CONFIG['browserConsole'], **log_config['browserConsole']}
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(log_config['consoleLevel'])
+    console_handler.setFormatter(ConsoleFormatter())
+
+    file_handler = PerEnvFileHandler(log_config['dir'], log_config['maxBytes'], log_config['backupCount'])
+    file_handler.setLevel(log_config['level'])
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    logger = get_logger()
+    logger.handlers.clear()
+    logger.addHandler(queue_handler)
+    logger.setLevel(min(logging.getLevelName(log_config['level']), logging.getLevelName(log_config['consoleLevel'])))
+    logger.propagate = False
+
+    shutdown_logging()
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def forward_browser_console(page, config=None):
+    """把页面的console消息按级别过滤、按比例采样后转发到日志，错误消息总是转发"""
+    console_config = {**_browser_console_config, **(config or {})}
+    if not console_config['enabled']:
+        return
+
+    logger = get_logger()
+    min_level = BROWSER_LEVELS.get(console_config['level'], logging.WARNING)
+    sample_rate = console_config['sampleRate']
+
+    def on_console(message):
+        level = BROWSER_LEVELS.get(message.type, logging.INFO)
+        if level < min_level:
+            return
+        if level < logging.ERROR and random.random() >= sample_rate:
+            return
+        logger.log(level, f"[浏览器] {message.text}")
+
+    def on_page_error(error):
+        logger.error(f"[浏览器] 页面异常: {error}")
+
+    page.on('console', on_console)
+    page.on('pageerror', on_page_error)
@@ -3,7 +3,6 @@ from playwright.async_api import async_playwright
 
 import sys
 import asyncio
-import traceback
 import time
 import hashlib
 import random
@@ -11,6 +10,112 @@ import string
 import requests
 import json
 import os
+import signal
+import argparse
+import contextlib
+from urllib.parse import urlparse
+
+from logger import setup_logging, shutdown_logging, get_logger, bind_env, forward_browser_console
+from metrics import (start_metrics_server, ACTIVE_INSTANCES, QUEUE_DEPTH, ENV_STARTS, ENV_CLOSES,
+                     ENV_STARTS_PER_MINUTE, ENV_CLOSES_PER_MINUTE, API_LATENCY, GAMES, DICE_ROLLS, TASK_RESULTS,
+                     SLOTS_IN_USE, CLOSE_RELEASE)
+from stages import (start_session, fork_session, current_stage, enter_stage, leave_stage, record_error, count,
+                    configure_deadlines)
+from timing import timing, configure_timing, save_timing
+from traces import write_trace, DEFAULT_TRACE_CONFIG
+from profiler import Profiler
+from network import listen, listener_for
+from snapshots import watch_console, capture_failure, configure_snapshots
+from inventory import open_inventory, add_selection_args, selection_query, has_selection
+from history import open_history
+from failures import (EnvFailure, ApiError, ApiUnavailable, CdpConnectError, NavigationTimeout, SiteThrottled, GameStall, InvalidEnv,
+                      RetryQueue, classify, configure_breakers, get_breaker)
+from fleet import Fleet, debug_address
+from throttle import configure_throttle, acquire, throttled, watch_site, expose_budget, navigate_attempts, is_error
+from render import configure_render, reduced, settle_seconds, install_reduced_motion, reduce_page
+from lifecycle import configure_lifecycle, freeze_idle, finished, wake, is_frozen
+from coordinator import load_hosts, assign, locate
+
+
+log = get_logger()
+
+INTERRUPTED_FILE = 'interrupted.json'
+REWARDS_URL = 'https://www.magicnewton.com/portal/rewards'
+DEFAULT_TASKS_CONFIG = {
+    'parallelTabs': False,
+    'graph': {
+        'minesweeper': [],
+        'dice': []
+    }
+}
+DEFAULT_PREFLIGHT_CONFIG = {
+    'enabled': True,
+    'waitSeconds': 5,
+    'rules': {
+        'minesweeper': {
+            'button': 'Play now',
+            'remainingPattern': r'(\d+)\s*(?:PLAYS?|GAMES?)\s*(?:LEFT|REMAINING)',
+            'exhaustedTexts': ['PLAY AGAIN TOMORROW', 'NO PLAYS LEFT'],
+            'pageTexts': ['MAXIMUM GAMEPLAY REACHED']
+        },
+        'dice': {
+            'button': 'Roll now',
+            'exhaustedTexts': ['NEXT ROLL IN', 'COME BACK TOMORROW']
+        }
+    }
+}
+DEFAULT_CLOSE_CONFIG = {
+    'confirm': True,
+    'timeoutSeconds': 30,
+    'pollMs': 500
+}
+HEAP_SAMPLE_SECONDS = 5
+HELPER_MISSING = '__nf_missing__'
+HELPER_CALL = f"([name, args]) => window.__nf ? window.__nf[name](...args) : '{HELPER_MISSING}'"
+
+# 页面上的按钮定位和检测脚本；bench_detect.py直接引用这些常量，在保存的页面快照上检查修改后是否仍然有效
+PLAY_NOW_XPATH = "//p[normalize-space()='Play now']"
+CONTINUE_XPATH = "//div[contains(text(),'Continue')]"
+PLAY_AGAIN_XPATH = "//div[normalize-space()='Play Again']"
+RETURN_HOME_XPATH = "//div[@class='fPSBzf bYPztT bYPznK pezuA cMGtQw pBppg dMMuNs']//button[@type='button']"
+SIMPLE_RETURN_HOME_XPATH = "//button[contains(., 'Return Home')]"
+ROLL_NOW_XPATH = "//p[normalize-space()='Roll now']"
+ABSOLUTE_LETS_ROLL_XPATH = "/html[1]/body[1]/div[1]/div[11]/div[3]/div[1]/div[1]/div[3]/button[1]"
+SIMPLIFIED_LETS_ROLL_XPATH = "//button[contains(@class, 'hoEiop')]"
+LETS_ROLL_XPATH = "//button[@class='hoEiop dgDkEX iFUqYl bZRhvx eAZrqn diIxfU jTWvec ThTOq efvJEH cGFOJB fzoqjJ coifUy eAZrpM kyvghW fznPAm fzoAXm eePqkU']"
+THROW_DICE_XPATH = "//p[normalize-space()='Throw Dice']"
+RETURN_HOME_TARGETS = [
+    {'text': 'Return Home', 'tag': 'button', 'exact': False, 'direct': True},
+    {'closestToCenter': 'button'}
+]
+LETS_ROLL_TARGETS = [
+    {'xpath': ABSOLUTE_LETS_ROLL_XPATH},
+    {'text': "Let's roll", 'tag': 'button', 'exact': False, 'direct': True},
+    {'text': "Let's Roll", 'tag': 'button', 'exact': False, 'direct': True},
+    {'selector': 'button[class*="hoEiop"]'}
+]
+THROW_DICE_TARGETS = [
+    {'text': 'Throw Dice', 'tag': 'p'},
+    {'text': 'Throw Dice', 'exact': False}
+]
+GAME_PROGRESS_SCRIPT = '''() => {
+    const openedCells = document.querySelectorAll('.cell.open, .revealed, .flagged').length;
+    return {
+        openedCells: openedCells,
+        time: new Date().toISOString()
+    };
+}'''
+GAME_STATUS_SCRIPT = '() => window.minesweeperStatus ? window.minesweeperStatus() : null'
+
+
+runtimeConfig = {}
+openEnvs = {}
+envPorts = {}
+slotsInUse = set()
+unreleasedEnvs = {}
+runProgress = {'pending': [], 'running': []}
+sessionLog = []
+fileCache = {}
 
 
 def requestHeader(appId, secretKey):
@@ -43,9 +148,13 @@ def md5Encode(nonceId, appId, secretKey):
 
 
 
-def postRequest(url, data, headers):
+def postRequest(url, data, headers, timeout=30):
     headers['Content-Type'] = 'application/json'
-    return requests.post(url, json=data, headers=headers)
+    started = time.monotonic()
+    try:
+        return requests.post(url, json=data, headers=headers, timeout=timeout)
+    finally:
+        API_LATENCY.observe(time.monotonic() - started, endpoint=urlparse(url).path)
 
 
 
@@ -54,162 +163,700 @@ def getRequest(url, headers):
 
 
 
-def load_config():
+def load_config(path='config.json'):
     try:
-        with open('config.json', 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8') as f:
             config = json.load(f)
         return config
     except Exception as e:
-        print(f"加载配置文件失败: {str(e)}")
+        log.error(f"加载配置文件失败: {str(e)}")
         sys.exit(1)
 
 
 
-def load_environments():
+def load_environments(path='env.json'):
     try:
-        with open('env.json', 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8') as f:
             env_config = json.load(f)
         return env_config['environments']
     except Exception as e:
-        print(f"加载环境配置文件失败: {str(e)}")
+        log.error(f"加载环境配置文件失败: {str(e)}")
         sys.exit(1)
 
 
-async def main():
+def load_opening_book():
+    if not os.path.exists('opening_book.json'):
+        return None
+    try:
+        with open('opening_book.json', 'r', encoding='utf-8') as f:
+            book = json.load(f)
+        log.info(f"已加载开局表，包含棋盘: {', '.join(book.get('boards', {}).keys())}")
+        return book
+    except Exception as e:
+        log.warning(f"加载开局表失败，将使用默认开局: {str(e)}")
+        return None
+
+
+def load_script(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def cached(key, loader):
+    """运行期间文件内容不变，只读取一次，避免每个环境都在事件循环上同步读文件"""
+    if key not in fileCache:
+        fileCache[key] = loader()
+    return fileCache[key]
+
+
+def load_interrupted():
+    if not os.path.exists(INTERRUPTED_FILE):
+        return None
+    try:
+        with open(INTERRUPTED_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        log.warning(f"读取中断记录失败: {str(e)}")
+        return None
+
+
+
+def save_interrupted(reason, retry_queues=()):
+    pending = list(runProgress['pending'])
+    for retry_queue in retry_queues:
+        pending.extend(env for env in retry_queue.envs() if env not in pending)
+    record = {
+        'interruptedAt': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'reason': reason,
+        'interrupted': list(runProgress['running']),
+        'pending': pending
+    }
+    try:
+        with open(INTERRUPTED_FILE, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=4)
+        log.warning(f"已记录中断状态到 {INTERRUPTED_FILE}: 中断 {len(record['interrupted'])} 个，未开始 {len(record['pending'])} 个")
+    except Exception as e:
+        log.error(f"保存中断记录失败: {str(e)}")
+
+
+
+def install_signal_handlers(task):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(task.cancel))
+
+
+
+async def shutdown(timeout):
+    """关闭本进程启动过的所有环境，整体耗时不超过timeout秒"""
+    if not openEnvs:
+        return
+    log.warning(f"正在关闭 {len(openEnvs)} 个已启动的环境...")
+    close_tasks = [closeEnv(*args) for args in list(openEnvs.values())]
+    try:
+        await asyncio.wait_for(asyncio.gather(*close_tasks, return_exceptions=True), timeout=timeout)
+    except asyncio.TimeoutError:
+        log.error(f"关闭环境超时 ({timeout} 秒)，仍有 {len(openEnvs)} 个环境可能未关闭: "
+                  f"{', '.join(str(args[1]) for args in openEnvs.values())}")
+
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Newton 扫雷/骰子自动化')
+    parser.add_argument('--config', default='config.json', help='配置文件路径')
+    parser.add_argument('--env', default='env.json', help='环境列表文件路径')
+    parser.add_argument('--start-round', type=int, help='起始轮次，指定后不再交互询问')
+    parser.add_argument('--rounds', type=int, help='执行轮数，指定后不再交互询问')
+    parser.add_argument('--no-resume', action='store_true', help='忽略上次的中断记录，不询问是否继续')
+    parser.add_argument('--profile', action='store_true', help='性能分析: 记录事件循环延迟、阻塞回调和各阶段CDP调用，结束时输出报告')
+    parser.add_argument('--profile-cprofile', action='store_true', help='性能分析时同时记录cProfile')
+    parser.add_argument('--timing', choices=['learned', 'fast', 'safe'], help='等待时间策略，覆盖配置文件中的timing.profile')
+    add_selection_args(parser)
+    return parser.parse_args(argv)
+
+
+
+def drain_sessions(batch=None):
+    """取出已结束的会话记录；多个主机同时运行时只取本批环境的记录"""
+    keys = None if batch is None else {(env['uniqueId'], env['envId']) for env in batch}
+    sessions = [session for session in sessionLog if keys is None or (session['uniqueId'], session['envId']) in keys]
+    sessionLog[:] = [session for session in sessionLog if session not in sessions]
+    return sessions
+
+
+
+def round_results(batch, failures):
+    failed = {(env['uniqueId'], env['envId']): failure for env, failure in failures}
+    results = []
+    for env in batch:
+        failure = failed.get((env['uniqueId'], env['envId']))
+        results.append((env, 'failed', failure.kind) if failure else (env, 'ok', None))
+    return results
+
+
+
+async def main(args=None):
+    if args is None:
+        args = parse_args([])
+    config = {}
+    retry_queues = {}
+    metrics_server = None
+    inventory = None
+    history = None
+    profiler = None
     try:
         
-        config = load_config()
-        environments = load_environments()
-        
-        
-        api_config = config['api']
-        APPID = api_config['appId']
-        SECRETKEY = api_config['secretKey']
-        BASEURL = api_config['baseUrl']
+        config = load_config(args.config)
+        runtimeConfig.update(config)
+        setup_logging(config.get('logging'))
+        install_signal_handlers(asyncio.current_task())
+        if args.profile:
+            profiler = Profiler(config.get('profile'), args.profile_cprofile or None)
+            profiler.start()
+        environments = load_environments(args.env)
+        inventory = open_inventory(config.get('inventory'), args.env)
+        selected = has_selection(args)
+        if selected:
+            if inventory is None:
+                log.error("按条件选择环境需要启用 inventory")
+                sys.exit(1)
+            environments = inventory.select(limit=args.limit, **selection_query(args))
+            log.info(f"按条件选中 {len(environments)} 个环境")
+            if not environments:
+                log.warning("没有符合条件的环境")
+                return
         
         
-        concurrency_config = config['concurrency']
-        max_instances = concurrency_config['maxInstances']
-        delay_between_start = concurrency_config['delayBetweenStartMs'] / 1000  
+        hosts = load_hosts(config)
         
         
         rounds_config = config['rounds']
         delay_between_rounds = rounds_config['delayBetweenRoundsSeconds']
         
         
-        total_environments = len(environments)
-        total_rounds = (total_environments + max_instances - 1) // max_instances  
+        task_graph(config.get('tasks'))
+        metrics_server = await start_metrics_server(config.get('metrics'))
+        configure_breakers(config.get('circuitBreaker'))
+        configure_deadlines(config.get('deadlines'))
+        configure_snapshots(config.get('snapshots'))
+        configure_lifecycle(config.get('lifecycle'))
+        configure_render(config.get('render'))
+        configure_throttle(config.get('throttle'))
+        configure_timing({**config.get('timing', {}), **({'profile': args.timing} if args.timing else {})})
         
-        print(f"环境总数: {total_environments}, 并发数: {max_instances}, 需要执行 {total_rounds} 轮")
         
+        resumed = False
+        interrupted = None if args.no_resume or selected else load_interrupted()
+        if interrupted:
+            resume_envs = interrupted.get('interrupted', []) + interrupted.get('pending', [])
+            answer = input(f"检测到上次运行在 {interrupted.get('interruptedAt')} 中断，"
+                           f"{len(resume_envs)} 个环境未完成，是否只继续这些环境? (y/N): ")
+            if answer.strip().lower() == 'y' and resume_envs:
+                environments = resume_envs
+                resumed = True
         
-        try:
-            start_round = int(input(f"请输入起始轮次 (1-{total_rounds}，默认为1): ") or "1")
-            if start_round < 1 or start_round > total_rounds:
-                print(f"输入的起始轮次超出范围，将使用默认值1")
-                start_round = 1
-                
-            remaining_rounds = total_rounds - start_round + 1
-            exec_rounds = int(input(f"请输入要执行的轮数 (1-{remaining_rounds}，默认为{remaining_rounds}): ") or str(remaining_rounds))
-            if exec_rounds < 1 or exec_rounds > remaining_rounds:
-                print(f"输入的执行轮数超出范围，将使用默认值{remaining_rounds}")
-                exec_rounds = remaining_rounds
-                
-            end_round = start_round + exec_rounds - 1
-            if end_round > total_rounds:
-                end_round = total_rounds
-                
-            print(f"\n将从第 {start_round} 轮开始，执行到第 {end_round} 轮，共 {exec_rounds} 轮")
-        except ValueError:
-            print("输入格式错误，将使用默认设置")
-            start_round = 1
-            end_round = total_rounds
-            exec_rounds = total_rounds
         
+        assignment, unassigned = assign(environments, hosts)
+        if inventory and unassigned:
+            inventory.record([(env, 'failed', 'unknown_host') for env in unassigned])
+        fleets = {host['name']: Fleet(config.get('fleet'), host['baseUrl']) for host in hosts}
+        assignment, invalid = await locate(hosts, assignment,
+                                           lambda host, envs: prepare_host(host, envs, fleets[host['name']]))
+        if invalid:
+            log.warning(f"以下环境的envId无效，已跳过: "
+                        f"{', '.join(str(env['uniqueId']) + '(' + str(fleets[name].reason(env)) + ')' for env, name in invalid)}")
+            if inventory:
+                inventory.record([(env, 'failed', InvalidEnv.kind) for env, _ in invalid])
+        retry_queues = {host['name']: RetryQueue(config.get('retry')) for host in hosts}
+        history = open_history(config.get('history'))
+        if history:
+            history.start_run(sum(len(envs) for envs in assignment.values()))
         
-        for round_num in range(start_round, end_round + 1):
-            print(f"\n====== 开始执行第 {round_num}/{total_rounds} 轮任务 ======\n")
-            
-            
-            start_idx = (round_num - 1) * max_instances
-            end_idx = min(round_num * max_instances, total_environments)
-            
-            print(f"本轮处理环境索引范围: {start_idx} 到 {end_idx-1}")
-            
-            
-            tasks = []
-            for i in range(start_idx, end_idx):
-                env = environments[i]
-                tasks.append(run_instance(env['uniqueId'], env['envId'], APPID, SECRETKEY, BASEURL))
-                
-                await asyncio.sleep(delay_between_start)
-            
-            
-            await asyncio.gather(*tasks)
+        
+        if len(hosts) == 1:
+            host = hosts[0]
+            environments = assignment[host['name']]
+            max_instances = host['maxInstances']
+            total_environments = len(environments)
+            total_rounds = (total_environments + max_instances - 1) // max_instances  
             
+            log.info(f"环境总数: {total_environments}, 并发数: {max_instances}, 需要执行 {total_rounds} 轮")
             
-            print("\n所有实例任务已完成，正在关闭环境...")
-            close_tasks = []
-            for i in range(start_idx, end_idx):
-                env = environments[i]
-                close_tasks.append(closeEnv(env['envId'], env['uniqueId'], APPID, SECRETKEY, BASEURL))
             
+            if resumed or selected:
+                start_round = 1
+                end_round = total_rounds
+                exec_rounds = total_rounds
+            elif args.start_round is not None or args.rounds is not None:
+                start_round = args.start_round or 1
+                if start_round < 1 or start_round > total_rounds:
+                    log.warning("指定的起始轮次超出范围，将使用默认值1")
+                    start_round = 1
+                remaining_rounds = total_rounds - start_round + 1
+                exec_rounds = args.rounds or remaining_rounds
+                if exec_rounds < 1 or exec_rounds > remaining_rounds:
+                    log.warning(f"指定的执行轮数超出范围，将使用默认值{remaining_rounds}")
+                    exec_rounds = remaining_rounds
+                end_round = start_round + exec_rounds - 1
+                log.info(f"将从第 {start_round} 轮开始，执行到第 {end_round} 轮，共 {exec_rounds} 轮")
+            else:
+                try:
+                    start_round = int(input(f"请输入起始轮次 (1-{total_rounds}，默认为1): ") or "1")
+                    if start_round < 1 or start_round > total_rounds:
+                        log.warning("输入的起始轮次超出范围，将使用默认值1")
+                        start_round = 1
+                    
+                    remaining_rounds = total_rounds - start_round + 1
+                    exec_rounds = int(input(f"请输入要执行的轮数 (1-{remaining_rounds}，默认为{remaining_rounds}): ") or str(remaining_rounds))
+                    if exec_rounds < 1 or exec_rounds > remaining_rounds:
+                        log.warning(f"输入的执行轮数超出范围，将使用默认值{remaining_rounds}")
+                        exec_rounds = remaining_rounds
+                    
+                    end_round = start_round + exec_rounds - 1
+                    if end_round > total_rounds:
+                        end_round = total_rounds
+                    
+                    log.info(f"\n将从第 {start_round} 轮开始，执行到第 {end_round} 轮，共 {exec_rounds} 轮")
+                except ValueError:
+                    log.warning("输入格式错误，将使用默认设置")
+                    start_round = 1
+                    end_round = total_rounds
+                    exec_rounds = total_rounds
             
-            await asyncio.gather(*close_tasks)
-            print(f"第 {round_num} 轮所有环境已关闭")
             
+            runProgress['pending'] = environments[(start_round - 1) * max_instances:min(end_round * max_instances, total_environments)]
+            QUEUE_DEPTH.set(len(runProgress['pending']))
+            await run_host(host, environments, start_round, end_round, retry_queues[host['name']], fleets[host['name']],
+                           inventory, history, delay_between_rounds)
+        else:
+            # 多个主机: 每个主机按自己的并发数分轮执行分配到的环境，各主机同时进行
+            log.info(f"{len(hosts)} 个主机，环境总数: {sum(len(envs) for envs in assignment.values())}，"
+                     + '，'.join(f"{host['name']} {len(assignment[host['name']])} 个(并发 {host['maxInstances']})" for host in hosts))
+            runProgress['pending'] = [env for host in hosts for env in assignment[host['name']]]
+            QUEUE_DEPTH.set(len(runProgress['pending']))
+            host_tasks = [asyncio.create_task(run_host(host, assignment[host['name']], 1, None, retry_queues[host['name']],
+                                                       fleets[host['name']], inventory, history, delay_between_rounds,
+                                                       f"[{host['name']}] "))
+                          for host in hosts]
+            try:
+                await asyncio.gather(*host_tasks)
+            finally:
+                for task in host_tasks:
+                    task.cancel()
+                await asyncio.gather(*host_tasks, return_exceptions=True)
+        
+        log.info("\n====== 所有轮次任务已完成 ======\n")
+        given_up = [item for queue in retry_queues.values() for item in queue.given_up]
+        if given_up:
+            log.warning(f"以下环境多次失败后放弃: "
+                        f"{', '.join(str(env['uniqueId']) + '(' + failure.kind + ')' for env, failure in given_up)}")
+        
+        if os.path.exists(INTERRUPTED_FILE):
+            os.remove(INTERRUPTED_FILE)
+        
+    except asyncio.CancelledError:
+        log.warning("收到中断信号，正在取消任务并关闭环境...")
+        await shutdown(config.get('shutdown', {}).get('closeTimeoutSeconds', 30))
+        save_interrupted('signal', retry_queues.values())
+    except Exception:
+        log.exception('运行错误')
+        await shutdown(config.get('shutdown', {}).get('closeTimeoutSeconds', 30))
+        save_interrupted('error', retry_queues.values())
+    finally:
+        await save_timing()
+        if metrics_server:
+            metrics_server.close()
+        if inventory:
+            inventory.close()
+        if history:
+            history.record(drain_sessions(), {key: attempts for queue in retry_queues.values()
+                                              for key, attempts in queue.attempts.items()})
+            history.close()
+        if profiler:
+            profiler.stop()
+
+
+
+async def prepare_host(host, environments, fleet):
+    """先查询主机上各环境的状态，返回其中envId无效的环境；已在运行的环境稍后直接连接"""
+    await fleet.sync(environments, lambda env: envStatus(env['envId'], env['uniqueId'],
+                                                         host['appId'], host['secretKey'], host['baseUrl']))
+    return fleet.invalid(environments)
+
+
+
+async def run_host(host, environments, start_round, end_round, retry_queue, fleet, inventory, history,
+                   delay_between_rounds, label=''):
+    """在一个MoreLogin主机上按并发数分轮执行环境，最后处理该主机的重试队列；end_round为None时执行到最后一轮"""
+    appId, secretKey, baseUrl = host['appId'], host['secretKey'], host['baseUrl']
+    max_instances = host['maxInstances']
+    delay_between_start = host['delayBetweenStartMs'] / 1000  
+    total_environments = len(environments)
+    total_rounds = (total_environments + max_instances - 1) // max_instances  
+    if end_round is None:
+        end_round = total_rounds
+    
+    # 上一轮关闭后仍未释放的环境占着主机名额，本轮少启动相应数量，放不下的环境顺延到下一轮
+    deferred = []
+    round_num = start_round
+    while round_num <= end_round or deferred:
+        log.info(f"\n====== {label}开始执行第 {round_num}/{max(round_num, total_rounds)} 轮任务 ======\n")
+        
+        
+        start_idx = (round_num - 1) * max_instances
+        end_idx = min(round_num * max_instances, total_environments)
+        
+        log.debug(f"本轮处理环境索引范围: {start_idx} 到 {end_idx-1}")
+        
+        
+        batch = deferred + (environments[start_idx:end_idx] if round_num <= end_round else [])
+        capacity = await freeSlots(baseUrl, max_instances)
+        batch, deferred = batch[:capacity], batch[capacity:]
+        if deferred:
+            log.info(f"{label}主机有 {max_instances - capacity} 个名额尚未释放，本轮启动 {len(batch)} 个环境，"
+                     f"{len(deferred)} 个顺延到下一轮")
+        failures = await run_round(batch, appId, secretKey, baseUrl, delay_between_start, fleet)
+        if inventory:
+            inventory.record(round_results(batch, failures))
+        if history:
+            history.record(drain_sessions(batch), retry_queue.attempts)
+        for env, failure in failures:
+            retry_queue.push(env, failure)
+        await save_timing()
+        log.info(f"{label}第 {round_num} 轮所有环境已关闭")
+        
+        
+        if round_num < total_rounds or deferred:
+            log.info(f"{label}等待 {delay_between_rounds} 秒后开始下一轮...")
+            await asyncio.sleep(delay_between_rounds)
+        round_num += 1
+    
+    
+    while len(retry_queue) > 0:
+        batch = await retry_queue.take(await freeSlots(baseUrl, max_instances))
+        if not batch:
+            continue
+        log.info(f"\n====== {label}开始重试 {len(batch)} 个失败环境 ======\n")
+        failures = await run_round(batch, appId, secretKey, baseUrl, delay_between_start, fleet)
+        if inventory:
+            inventory.record(round_results(batch, failures))
+        if history:
+            history.record(drain_sessions(batch), retry_queue.attempts)
+        for env, failure in failures:
+            retry_queue.push(env, failure)
+
+
+
+async def run_round(batch, appId, secretKey, baseUrl, delay_between_start, fleet=None):
+    skipped = []
+    if fleet is not None:
+        # 每轮开始前刷新本批环境的状态，运行期间变为无效的环境不再占用名额
+        await fleet.sync(batch, lambda env: envStatus(env['envId'], env['uniqueId'], appId, secretKey, baseUrl))
+        for env in fleet.invalid(batch):
+            skipped.append((env, InvalidEnv(f"envId无效: {fleet.reason(env)}", 'start_env')))
+            if env in runProgress['pending']:
+                runProgress['pending'].remove(env)
+        batch = [env for env in batch if fleet.state(env) != 'invalid']
+    
+    
+    async def run_and_close(env, debugUrl):
+        # 每个环境的任务结束后立即关闭，没有任务可做的环境不用等本轮最慢的环境
+        result = await run_instance(env['uniqueId'], env['envId'], appId, secretKey, baseUrl, debugUrl)
+        closed = await closeEnv(env['envId'], env['uniqueId'], appId, secretKey, baseUrl)
+        runProgress['running'].remove(env)
+        if fleet is not None:
+            fleet.forget(env)
+        return result, closed
+    
+    tasks = []
+    try:
+        for env in batch:
+            debugUrl = fleet.debug_url(env) if fleet is not None else None
+            tasks.append(asyncio.create_task(run_and_close(env, debugUrl)))
+            if env in runProgress['pending']:
+                runProgress['pending'].remove(env)
+            runProgress['running'].append(env)
+            QUEUE_DEPTH.set(len(runProgress['pending']))
             
-            if round_num < total_rounds:
-                print(f"等待 {delay_between_rounds} 秒后开始下一轮...")
-                await asyncio.sleep(delay_between_rounds)
+            await asyncio.sleep(delay_between_start)
         
-        print("\n====== 所有轮次任务已完成 ======\n")
         
+        outcomes = await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    
+    
+    log.info(f"本轮 {len(batch)} 个环境已全部关闭，{sum(1 for _, closed in outcomes if closed)} 个已确认释放")
+    return skipped + [(env, result) for env, (result, _) in zip(batch, outcomes) if result is not True]
+
+
+
+async def apiPost(baseUrl, path, data, appId, secretKey):
+    breaker = get_breaker(baseUrl)
+    probe = await breaker.wait_ready()
+    headers = requestHeader(appId, secretKey)
+    try:
+        response = await asyncio.to_thread(postRequest, baseUrl + path, data, headers)
+        if response.status_code >= 500:
+            raise Exception(f"HTTP {response.status_code}")
+        result = response.json()
     except Exception as e:
-        error_message = traceback.format_exc()
-        print('运行错误: ' + error_message)
+        breaker.record_failure()
+        raise ApiUnavailable(f"请求 {path} 失败: {str(e)}") from e
+    except BaseException:
+        # 超时、Ctrl-C或本轮取消时不能让熔断器一直停在试探中
+        if probe:
+            breaker.release_probe()
+        raise
+    
+    breaker.record_success()
+    if result.get('code') != 0:
+        raise ApiError(f"{path} 返回错误: {result.get('msg')}")
+    return result.get('data') or {}
 
 
 
 async def closeEnv(envId, uniqueId, appId, secretKey, baseUrl):
     try:
-        print(f"开始关闭实例 (uniqueId={uniqueId}, envId={envId})")
-        requestPath = baseUrl + '/api/env/close'
+        log.info(f"开始关闭实例 (uniqueId={uniqueId}, envId={envId})")
         data = {
             'envId': envId,
             'uniqueId': uniqueId
         }
-        headers = requestHeader(appId, secretKey)
-        response = postRequest(requestPath, data, headers).json()
-
-        if response['code'] != 0:
-            print(f"实例 {uniqueId} 关闭失败: {response['msg']}")
-            return False
+        await apiPost(baseUrl, '/api/env/close', data, appId, secretKey)
+        openEnvs.pop((uniqueId, envId), None)
         
-        print(f"实例 {uniqueId} 关闭成功")
-        return True
-    except Exception as e:
-        errorMessage = traceback.format_exc()
-        print(f"实例 {uniqueId} 关闭出错: {errorMessage}")
+        log.info(f"实例 {uniqueId} 关闭成功")
+        ENV_CLOSES.inc(result='ok')
+        ENV_CLOSES_PER_MINUTE.mark()
+        return await confirmReleased(envId, uniqueId, appId, secretKey, baseUrl)
+    except EnvFailure as e:
+        log.warning(f"实例 {uniqueId} 关闭失败: {str(e)}")
+        ENV_CLOSES.inc(result='failed')
+        # 环境可能本来就没有启动成功，确认已不在运行时同样归还名额
+        if await envReleased(envId, uniqueId, appId, secretKey, baseUrl):
+            releaseSlot(uniqueId, envId)
+        else:
+            unreleasedEnvs[(uniqueId, envId)] = (envId, uniqueId, appId, secretKey, baseUrl)
+        return False
+    except Exception:
+        log.exception(f"实例 {uniqueId} 关闭出错")
+        ENV_CLOSES.inc(result='error')
         return False
 
 
 
-async def run_instance(uniqueId, envId, appId, secretKey, baseUrl):
+async def portOpen(debugUrl):
+    host, port = debugUrl.rsplit(':', 1)
+    host = host.strip('[]')
     try:
-        print(f"开始启动实例 (uniqueId={uniqueId}, envId={envId})")
-        debugUrl = await startEnv(envId, uniqueId, appId, secretKey, baseUrl)
-        print(f"实例 {uniqueId} - 调试URL: {debugUrl}")
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), 1)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+
+async def envReleased(envId, uniqueId, appId, secretKey, baseUrl):
+    # 调试端口不再监听，且MoreLogin不再报告运行中(接口不可用时只看端口)
+    debugUrl = envPorts.get((uniqueId, envId))
+    if debugUrl and await portOpen(debugUrl):
+        return False
+    try:
+        status = await envStatus(envId, uniqueId, appId, secretKey, baseUrl)
+    except EnvFailure:
+        return True
+    return 'running' not in (str(status.get('localStatus')), str(status.get('status')))
+
+
 
-        async with async_playwright() as p:
-            browser, context = await connectBrowser(p, debugUrl)
-            await operationEnv(context)
+def holdSlot(uniqueId, envId):
+    slotsInUse.add((uniqueId, envId))
+    SLOTS_IN_USE.set(len(slotsInUse))
+
+
+
+def releaseSlot(uniqueId, envId):
+    envPorts.pop((uniqueId, envId), None)
+    unreleasedEnvs.pop((uniqueId, envId), None)
+    slotsInUse.discard((uniqueId, envId))
+    SLOTS_IN_USE.set(len(slotsInUse))
+
+
+
+async def recheckUnreleased():
+    """上一轮关闭后未确认释放的环境，在下一轮启动前再检查一次"""
+    if not unreleasedEnvs:
+        return
+    pending = list(unreleasedEnvs.values())
+    results = await asyncio.gather(*(envReleased(*args) for args in pending))
+    for args, released in zip(pending, results):
+        if released:
+            releaseSlot(args[1], args[0])
+
+
+
+async def freeSlots(baseUrl, max_instances):
+    """返回主机本批可以启动的环境数量: 有未释放的环境时先等待(最多close.timeoutSeconds)，仍未释放的继续占用名额"""
+    config = {**DEFAULT_CLOSE_CONFIG, **runtimeConfig.get('close', {})}
+    deadline = time.monotonic() + config['timeoutSeconds']
+    while True:
+        await recheckUnreleased()
+        held = [args for args in unreleasedEnvs.values() if args[4] == baseUrl]
+        if not held or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(config['pollMs'] / 1000)
+    if not held:
+        return max_instances
+    log.warning(f"{len(held)} 个环境关闭后仍未释放资源: {', '.join(str(args[1]) for args in held)}")
+    # 至少保留一个名额，避免一直不释放的环境让主机停止运行
+    return max(1, max_instances - len(held))
+
+
+
+async def confirmReleased(envId, uniqueId, appId, secretKey, baseUrl):
+    """关闭接口返回成功后，轮询直到浏览器真正退出才释放名额，超时的环境留到下一轮开始前再确认"""
+    config = {**DEFAULT_CLOSE_CONFIG, **runtimeConfig.get('close', {})}
+    key = (uniqueId, envId)
+    if not config['confirm']:
+        releaseSlot(uniqueId, envId)
+        return True
+    started = time.monotonic()
+    while True:
+        if await envReleased(envId, uniqueId, appId, secretKey, baseUrl):
+            elapsed = time.monotonic() - started
+            CLOSE_RELEASE.observe(elapsed, result='released')
+            log.info(f"实例 {uniqueId} 资源已释放，关闭到释放耗时 {elapsed:.1f} 秒")
+            releaseSlot(uniqueId, envId)
+            return True
+        if time.monotonic() - started >= config['timeoutSeconds']:
+            CLOSE_RELEASE.observe(time.monotonic() - started, result='timeout')
+            log.warning(f"实例 {uniqueId} 关闭后 {config['timeoutSeconds']} 秒仍未释放，名额暂不归还")
+            unreleasedEnvs[key] = (envId, uniqueId, appId, secretKey, baseUrl)
+            return False
+        await asyncio.sleep(config['pollMs'] / 1000)
+
+
+
+async def run_instance(uniqueId, envId, appId, secretKey, baseUrl, debugUrl=None):
+    bind_env(uniqueId, envId)
+    tracker = start_session()
+    ACTIVE_INSTANCES.inc()
+    p = None
+    context = None
+    heap_sampler = None
+    started = time.monotonic()
+    session = {'uniqueId': uniqueId, 'envId': envId, 'startedAt': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'status': 'failed', 'attached': debugUrl is not None}
+    try:
+        log.info(f"开始启动实例 (uniqueId={uniqueId}, envId={envId})")
+        # 整个会话和每个阶段都有时间预算，超时后取消本任务，环境在本轮结束时统一关闭并进入重试队列
+        async with tracker.bounded():
+            enter_stage('start_env')
         
+            openEnvs[(uniqueId, envId)] = (envId, uniqueId, appId, secretKey, baseUrl)
+            holdSlot(uniqueId, envId)
+            attached = debugUrl is not None
+            if attached:
+                log.info(f"实例 {uniqueId} 已在运行，直接连接调试端口 {debugUrl}")
+                ENV_STARTS.inc(result='attached')
+            else:
+                debugUrl = await startAndCount(envId, uniqueId, appId, secretKey, baseUrl)
+
+            envPorts[(uniqueId, envId)] = debugUrl
+            p = await startPlaywright()
+            enter_stage('connect')
+            try:
+                browser, context = await connectBrowser(p, debugUrl)
+            except Exception as e:
+                if not attached:
+                    raise CdpConnectError(f"连接调试端口 {debugUrl} 失败: {str(e)}") from e
+                # 查询到的端口已失效(例如浏览器刚被关闭)，按正常流程重新启动
+                log.warning(f"连接已运行的实例失败，重新启动: {str(e)}")
+                enter_stage('start_env')
+                debugUrl = await startAndCount(envId, uniqueId, appId, secretKey, baseUrl)
+                envPorts[(uniqueId, envId)] = debugUrl
+                enter_stage('connect')
+                try:
+                    browser, context = await connectBrowser(p, debugUrl)
+                except Exception as e:
+                    raise CdpConnectError(f"连接调试端口 {debugUrl} 失败: {str(e)}") from e
+            heap_sampler = asyncio.create_task(sampleHeap(context, session))
+            await operationEnv(context, uniqueId, envId)
+        
+        session['status'] = 'ok'
         return True
     except Exception as e:
-        errorMessage = traceback.format_exc()
-        print(f'实例 {uniqueId} 运行错误: ' + errorMessage)
-        return False
+        failure = classify(e, tracker.stage)
+        record_error(failure.stage)
+        session.update(kind=failure.kind, stage=failure.stage)
+        log.error(f'实例 {uniqueId} 运行错误 ({failure.kind})', exc_info=e)
+        # 在断开浏览器之前保存现场，超时取消的会话也能留下快照
+        await capture_failure(context, failure, uniqueId, envId)
+        return failure
+    finally:
+        if heap_sampler is not None:
+            heap_sampler.cancel()
+        if context is not None:
+            recordHeap(session, await jsHeapMb(context))
+        if p is not None:
+            await p.stop()
+        tracker.finish()
+        ACTIVE_INSTANCES.dec()
+        session.update(seconds=round(time.monotonic() - started, 3), timings=dict(tracker.timings),
+                       counts=dict(tracker.counts))
+        sessionLog.append(session)
+
+
+
+async def jsHeapMb(context):
+    """各标签页JS堆占用之和(冻结的标签页不能执行脚本，跳过)"""
+    total = 0
+    for page in context.pages:
+        if is_frozen(page):
+            continue
+        try:
+            used = await asyncio.wait_for(page.evaluate('() => performance.memory ? performance.memory.usedJSHeapSize : 0'), 2)
+            total += used or 0
+        except Exception:
+            pass
+    return round(total / 1048576, 1) if total else None
+
+
+
+def recordHeap(session, used):
+    if used is not None and used > (session.get('jsHeapMb') or 0):
+        session['jsHeapMb'] = used
+
+
+
+async def sampleHeap(context, session):
+    """会话期间定期采样JS堆，运行历史中记录峰值而不是结束时的值(结束时部分标签页已冻结或关闭)"""
+    while True:
+        recordHeap(session, await jsHeapMb(context))
+        await asyncio.sleep(HEAP_SAMPLE_SECONDS)
+
+
+
+async def startPlaywright():
+    starting = asyncio.ensure_future(async_playwright().start())
+    try:
+        return await asyncio.shield(starting)
+    except asyncio.CancelledError:
+        # 启动中途被取消时等driver启动完再停止，否则会遗留node进程导致无法退出
+        try:
+            await (await starting).stop()
+        except Exception:
+            pass
+        raise
 
 
 
@@ -227,514 +874,336 @@ async def connectBrowser(playwright, debugUrl):
     pages = context.pages
     current_page = pages[0] if pages else await context.new_page()
     
-    print(current_page.url)
+    log.debug(f"当前页面: {current_page.url}")
     return browser, context
 
 
+async def startAndCount(envId, uniqueId, appId, secretKey, baseUrl):
+    try:
+        debugUrl = await startEnv(envId, uniqueId, appId, secretKey, baseUrl)
+    except BaseException:
+        ENV_STARTS.inc(result='failed')
+        raise
+    ENV_STARTS.inc(result='ok')
+    ENV_STARTS_PER_MINUTE.mark()
+    log.info(f"实例 {uniqueId} - 调试URL: {debugUrl}")
+    return debugUrl
+
+
+
+async def envStatus(envId, uniqueId, appId, secretKey, baseUrl):
+    data = {
+        'envId': envId,
+        'uniqueId': uniqueId
+    }
+    return await apiPost(baseUrl, '/api/env/status', data, appId, secretKey)
+
+
+
 async def startEnv(envId, uniqueId, appId, secretKey, baseUrl):
-    requestPath = baseUrl + '/api/env/start'
     data = {
         'envId': envId,
         'uniqueId': uniqueId
     }
-    headers = requestHeader(appId, secretKey)
-    response = postRequest(requestPath, data, headers).json()
+    result = await apiPost(baseUrl, '/api/env/start', data, appId, secretKey)
+    
+    port = result.get('debugPort')
+    if not port:
+        raise ApiError(f"启动结果中没有debugPort，请检查envId: {result}")
+    log.info(f"env open result: {result}")
+    return debug_address(baseUrl, port)
+
+
+
+async def installHelpers(context):
+    """helpers.js通过init script在每个新文档加载时预先安装，之后每次操作只需传函数名和参数"""
+    await context.add_init_script(script=cached('helpers.js', lambda: load_script('helpers.js')))
+
+
+
+async def callHelper(page, name, *args):
+    await wake(page)
+    if name.startswith('click') or name == 'closeModal':
+        # 页面上的点击会触发站点请求，与其他环境共用请求预算
+        await acquire('action')
+    result = await page.evaluate(HELPER_CALL, [name, list(args)])
+    if result == HELPER_MISSING:
+        # 页面在init script注册之前就已加载时补装一次
+        await page.evaluate(cached('helpers.js', lambda: load_script('helpers.js')))
+        result = await page.evaluate(HELPER_CALL, [name, list(args)])
+    return result
+
 
-    if response['code'] != 0:
-        print(response['msg'])
-        print('please check envId')
-        sys.exit()
 
-    port = response['data']['debugPort']
-    print('env open result:', response['data'])
-    return '127.0.0.1:' + port
+async def waitVisible(page, selector):
+    return await timing.measure('selector', page.wait_for_selector(selector, timeout=timing.timeout_ms('selector'),
+                                                                    state="visible"))
 
 
 
-async def operationEnv(context):
+async def modalOrText(page, label):
+    return (await callHelper(page, 'findModal')).get('found') or await callHelper(page, 'textVisible', label)
+
+
+
+async def afterClick(page, seconds, *labels):
+    """点击后等待页面过渡。普通模式固定等待seconds秒；精简渲染模式下动画已关闭，
+    labels中的文字出现就继续(最多seconds秒)，没有可检查的文字时只留settleMs"""
+    if not reduced():
+        await asyncio.sleep(seconds)
+        return
+    if not labels:
+        await asyncio.sleep(settle_seconds())
+        return
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if await callHelper(page, 'textVisible', *labels):
+                return
+        except Exception as e:
+            log.debug(f"检查页面文字失败: {str(e)}")
+        await asyncio.sleep(0.1)
+
+
+
+async def openRewardsPage(context):
     page = await context.new_page()
+    await reduce_page(page)
+    forward_browser_console(page)
+    watch_console(page)
+    listen(page, runtimeConfig.get('network'))
+    watch_site(page)
+    await expose_budget(page)
     
     
-    print("正在访问 Newton 奖励页面...")
-    try:
-        
-        await page.goto('https://www.magicnewton.com/portal/rewards', timeout=60000)
-        print("页面导航完成")
-        
-        
+    log.info("正在访问 Newton 奖励页面...")
+    enter_stage('navigate')
+    attempts = navigate_attempts()
+    for attempt in range(1, attempts + 1):
+        # 所有环境共用导航预算；站点返回429/5xx时由响应监听触发全局退避，下一次取预算时一起等待
+        await acquire('navigate')
         try:
-            await page.wait_for_load_state('domcontentloaded', timeout=10000)
-        except Exception as e:
-            print(f"等待页面加载状态超时，但继续执行: {str(e)}")
-        
-        
-        print("等待页面渲染...")
-        await asyncio.sleep(3)
-        
-        
-        print("尝试使用XPath定位'Play now'按钮...")
+            response = await timing.measure('goto', page.goto(runtimeConfig.get('site', {}).get('rewardsUrl', REWARDS_URL),
+                                                              timeout=timing.timeout_ms('goto')))
+        except Exception as e_goto:
+            raise NavigationTimeout(f"打开奖励页面失败: {str(e_goto)}") from e_goto
+        if response is None or not is_error(response.status):
+            break
+        log.warning(f"打开奖励页面返回 {response.status} ({attempt}/{attempts})")
+    else:
+        raise SiteThrottled(f"奖励页面连续 {attempts} 次返回 {response.status}")
+    log.info("页面导航完成")
+    
+    
+    try:
+        await timing.measure('loadState', page.wait_for_load_state('domcontentloaded', timeout=timing.timeout_ms('loadState')))
+    except Exception as e:
+        log.warning(f"等待页面加载状态超时，但继续执行: {str(e)}")
+    
+    
+    log.debug("等待页面渲染...")
+    await timing.wait_until('render', lambda: callHelper(page, 'textVisible', 'Play now', 'Roll now'))
+    return page
+
+
+
+async def minesweeperTask(page, uniqueId, envId):
+    try:
+        log.debug("尝试使用XPath定位'Play now'按钮...")
+        enter_stage('play_now')
         
         play_now_clicked = False
         try:
             
-            xpath_selector = "//p[normalize-space()='Play now']"
-            play_button = await page.wait_for_selector(xpath_selector, timeout=5000, state="visible")
+            xpath_selector = PLAY_NOW_XPATH
+            play_button = await waitVisible(page, xpath_selector)
             if play_button:
-                print("使用XPath找到'Play now'按钮，准备点击...")
-                await play_button.click()
-                print("已点击'Play now'按钮")
+                log.info("使用XPath找到'Play now'按钮，准备点击...")
+                await throttled('action', play_button.click())
+                log.info("已点击'Play now'按钮")
                 play_now_clicked = True
             else:
                 raise Exception("未找到按钮")
         except Exception as e1:
-            print(f"使用XPath点击按钮失败: {str(e1)}")
+            log.debug(f"使用XPath点击按钮失败: {str(e1)}")
             
             
             try:
-                print("尝试查找包含'Play now'文本的父元素...")
+                log.info("尝试查找包含'Play now'文本的父元素...")
                 
                 
-                result = await page.evaluate('''() => {
-                    const elements = Array.from(document.querySelectorAll('p')).filter(el => el.textContent.trim() === 'Play now');
-                    if (elements.length > 0) {
-                        
-                        let clickTarget = elements[0];
-                        
-                        while (clickTarget && clickTarget.tagName !== 'BODY') {
-                            if (clickTarget.tagName === 'BUTTON' || clickTarget.tagName === 'A') {
-                                break;
-                            }
-                            clickTarget = clickTarget.parentElement;
-                        }
-                        if (clickTarget) {
-                            clickTarget.click();
-                            return true;
-                        }
-                    }
-                    return false;
-                }''')
-                print(f"通过JavaScript点击'Play now'按钮: {'成功' if result else '失败'}")
+                result = await callHelper(page, 'clickByText', 'Play now', {'tag': 'p'})
+                log.info(f"通过JavaScript点击'Play now'按钮: {'成功' if result else '失败'}")
                 if result:
                     play_now_clicked = True
                 
                 
-                await asyncio.sleep(2)
+                await afterClick(page, 2, 'Continue')
                 
             except Exception as e2:
-                print(f"所有尝试均失败: {str(e2)}")
+                log.warning(f"所有尝试均失败: {str(e2)}")
+                record_error()
         
         
         continue_clicked = False
         if play_now_clicked:
-            print("等待'Continue'按钮出现...")
+            log.info("等待'Continue'按钮出现...")
+            enter_stage('max_modal')
             
-            await asyncio.sleep(3)
+            await timing.wait_until('modal', lambda: modalOrText(page, 'Continue'))
             
             
             try:
-                print("检查是否出现'MAXIMUM GAMEPLAY REACHED'模态框...")
+                log.info("检查是否出现'MAXIMUM GAMEPLAY REACHED'模态框...")
                 
                 
-                max_gameplay_modal = await page.evaluate('''() => {
-                   
-                    const textElements = Array.from(document.querySelectorAll('*')).filter(
-                        el => {
-                            const text = el.textContent || '';
-                           
-                            return text.toUpperCase().includes('MAXIMUM') && 
-                                   text.toUpperCase().includes('GAMEPLAY') && 
-                                   text.toUpperCase().includes('REACHED');
-                        }
-                    );
-                    
-                    if (textElements.length > 0) {
-                        return {found: true, method: 'text'};
-                    }
-                    
-                    
-                    const tomorrowElements = Array.from(document.querySelectorAll('*')).filter(
-                        el => {
-                            const text = el.textContent || '';
-                            return text.toUpperCase().includes('PLAY') && 
-                                   text.toUpperCase().includes('AGAIN') && 
-                                   text.toUpperCase().includes('TOMORROW');
-                        }
-                    );
-                    
-                    if (tomorrowElements.length > 0) {
-                        return {found: true, method: 'tomorrow'};
-                    }
-                    
-                   
-                    
-                    const possibleModals = Array.from(document.querySelectorAll('div')).filter(el => {
-                        if (!el.children || el.children.length === 0) return false;
-                        
-                        const style = window.getComputedStyle(el);
-                        const position = style.position;
-                        const bgColor = style.backgroundColor || '';
-                        const opacity = parseFloat(style.opacity || 1);
-                        const zIndex = parseInt(style.zIndex || 0);
-                        
-                      
-                        return (position === 'fixed' || position === 'absolute') &&
-                               (bgColor.includes('rgba') || bgColor.includes('rgb')) &&
-                               opacity < 1 &&
-                               zIndex > 10 &&
-                               el.offsetWidth > window.innerWidth * 0.5 &&
-                               el.offsetHeight > window.innerHeight * 0.5;
-                    });
-                    
-                    if (possibleModals.length > 0) {
-                        return {found: true, method: 'visual'};
-                    }
-                    
-                   
-                    const closeButtons = Array.from(document.querySelectorAll('*')).filter(el => {
-                        const text = el.textContent || '';
-                        const style = window.getComputedStyle(el);
-                        return (text === 'X' || text === '×' || text === '✕' || text === '✖') &&
-                               (style.position === 'absolute' || style.position === 'fixed') &&
-                               style.cursor === 'pointer';
-                    });
-                    
-                    if (closeButtons.length > 0) {
-                      
-                        for (const btn of closeButtons) {
-                            const rect = btn.getBoundingClientRect();
-                            if (rect.top < window.innerHeight * 0.4 && rect.right > window.innerWidth * 0.6) {
-                                return {found: true, method: 'closeBtn'};
-                            }
-                        }
-                    }
-                    
-                   
-                    const totalElements = Array.from(document.querySelectorAll('*')).filter(
-                        el => {
-                            const text = el.textContent || '';
-                            return text.toUpperCase().includes('TOTAL') && 
-                                   /\d+/.test(text);
-                        }
-                    );
-                    
-                    if (totalElements.length > 0) {
-                        return {found: true, method: 'total'};
-                    }
-                    
-                    return {found: false};
-                }''')
+                max_gameplay_modal = await callHelper(page, 'findModal')
                 
                 if max_gameplay_modal.get('found', False):
-                    print(f"检测到'MAXIMUM GAMEPLAY REACHED'模态框 (检测方法: {max_gameplay_modal.get('method', 'unknown')})，尝试关闭...")
+                    log.info(f"检测到'MAXIMUM GAMEPLAY REACHED'模态框 (检测方法: {max_gameplay_modal.get('method', 'unknown')})，尝试关闭...")
                     
                     
-                    close_button_clicked = await page.evaluate('''() => {
-                        
-                       
-                        const vw = window.innerWidth;
-                        const vh = window.innerHeight;
-                        
-                        
-                        const rightTopX = vw * 0.85; 
-                        const rightTopY = vh * 0.25; 
-                        
-                        
-                        const element = document.elementFromPoint(rightTopX, rightTopY);
-                        
-                      
-                        if (element) {
-                          
-                            const text = element.textContent || '';
-                            if (text === 'X' || text === '×' || text === '✕' || text === '✖') {
-                                element.click();
-                                return true;
-                            }
-                            
-                          
-                            let clickTarget = element;
-                            const maxLevels = 5; 
-                            for (let i = 0; i < maxLevels; i++) {
-                                if (!clickTarget || clickTarget.tagName === 'BODY') break;
-                                
-                                const style = window.getComputedStyle(clickTarget);
-                                if (clickTarget.tagName === 'BUTTON' || 
-                                    clickTarget.tagName === 'A' || 
-                                    style.cursor === 'pointer') {
-                                    clickTarget.click();
-                                    return true;
-                                }
-                                
-                                clickTarget = clickTarget.parentElement;
-                            }
-                            
-                            
-                            element.click();
-                            return true;
-                        }
-                        
-                       
-                        const closeButtons = Array.from(document.querySelectorAll('*')).filter(el => {
-                            const text = el.textContent || '';
-                            const style = window.getComputedStyle(el);
-                            return (text === 'X' || text === '×' || text === '✕' || text === '✖') &&
-                                   style.cursor === 'pointer';
-                        });
-                        
-                        if (closeButtons.length > 0) {
-                            closeButtons[0].click();
-                            return true;
-                        }
-                        
-                       
-                        const modalContainer = document.querySelector('div[class*="modal"], div[role="dialog"]');
-                        let closeBtn = null;
-                        
-                        if (modalContainer) {
-                         
-                            closeBtn = modalContainer.querySelector('button[aria-label="Close"], button[class*="close"]');
-                            
-                            if (closeBtn) {
-                                closeBtn.click();
-                                return true;
-                            }
-                        }
-                        
-                        return false;
-                    }''')
+                    close_button_clicked = await callHelper(page, 'closeModal')
                     
                     if close_button_clicked:
-                        print("成功点击模态框关闭按钮")
+                        log.info("成功点击模态框关闭按钮")
                     else:
-                        print("未找到明确的关闭按钮，尝试点击模态框外区域...")
+                        log.info("未找到明确的关闭按钮，尝试点击模态框外区域...")
                         
                         
-                        outside_clicked = await page.evaluate('''() => {
-                     
-                            const vw = window.innerWidth;
-                            const vh = window.innerHeight;
-                            
-                       
-                            const clickEvent = new MouseEvent('click', {
-                                'view': window,
-                                'bubbles': true,
-                                'cancelable': true
-                            });
-                            
-                        
-                            const points = [
-                                {x: 10, y: 10},           
-                                {x: vw - 10, y: 10},       
-                                {x: 10, y: vh - 10},     
-                                {x: vw - 10, y: vh - 10}, 
-                                {x: vw / 2, y: 10},        
-                                {x: vw / 2, y: vh - 10},  
-                                {x: 10, y: vh / 2},       
-                                {x: vw - 10, y: vh / 2}   
-                            ];
-                            
-                            let success = false;
-                            for (const point of points) {
-                                const elem = document.elementFromPoint(point.x, point.y);
-                                if (elem) {
-                                    elem.dispatchEvent(clickEvent);
-                                    success = true;
-                                }
-                            }
-                            
-                            return success;
-                        }''')
+                        outside_clicked = await callHelper(page, 'clickOutside', 'edges')
                         
                         if outside_clicked:
-                            print("成功点击模态框外区域")
+                            log.info("成功点击模态框外区域")
                         else:
-                            print("点击模态框外区域失败，尝试按ESC键...")
+                            log.warning("点击模态框外区域失败，尝试按ESC键...")
                             await page.keyboard.press('Escape')
                     
                     
-                    await asyncio.sleep(2)
+                    await timing.wait_until('modalClose', lambda: callHelper(page, 'modalGone'))
                     
                     
-                    modal_gone = await page.evaluate('''() => {
-                        
-                        const textElements = Array.from(document.querySelectorAll('*')).filter(
-                            el => {
-                                const text = el.textContent || '';
-                                return text.toUpperCase().includes('MAXIMUM') && 
-                                       text.toUpperCase().includes('GAMEPLAY') && 
-                                       text.toUpperCase().includes('REACHED');
-                            }
-                        );
-                        
-                        if (textElements.length > 0) {
-                            return false;
-                        }
-                        
-                       
-                        const tomorrowElements = Array.from(document.querySelectorAll('*')).filter(
-                            el => {
-                                const text = el.textContent || '';
-                                return text.toUpperCase().includes('PLAY') && 
-                                       text.toUpperCase().includes('AGAIN') && 
-                                       text.toUpperCase().includes('TOMORROW');
-                            }
-                        );
-                        
-                        if (tomorrowElements.length > 0) {
-                            return false; 
-                        }
-                        
-                       
-                        const totalElements = Array.from(document.querySelectorAll('*')).filter(
-                            el => {
-                                const text = el.textContent || '';
-                                return text.toUpperCase().includes('TOTAL') && 
-                                       /\d+/.test(text);
-                            }
-                        );
-                        
-                        if (totalElements.length > 0) {
-                            return false; 
-                        }
-                        
-                        return true;
-                    }''')
+                    modal_gone = await callHelper(page, 'modalGone')
                     
                     if modal_gone:
-                        print("成功关闭'MAXIMUM GAMEPLAY REACHED'模态框")
+                        log.info("成功关闭'MAXIMUM GAMEPLAY REACHED'模态框")
                     else:
-                        print("模态框仍然存在，尝试其他方法关闭...")
+                        log.warning("模态框仍然存在，尝试其他方法关闭...")
                         
                         try:
                             
-                            vw = await page.evaluate('window.innerWidth')
-                            vh = await page.evaluate('window.innerHeight')
+                            vw, vh = await callHelper(page, 'viewport')
                             
                             
                             x_button_x = int(vw * 0.85)
                             x_button_y = int(vh * 0.25)
                             
                             
-                            await page.mouse.click(x_button_x, x_button_y)
-                            print(f"尝试直接点击位置 ({x_button_x}, {x_button_y})")
+                            await throttled('action', page.mouse.click(x_button_x, x_button_y))
+                            log.info(f"尝试直接点击位置 ({x_button_x}, {x_button_y})")
                             
                             
-                            await asyncio.sleep(2)
+                            await timing.wait_until('modalClose', lambda: callHelper(page, 'modalGone'))
                         except Exception as e_mouse:
-                            print(f"鼠标点击失败: {str(e_mouse)}")
+                            log.warning(f"鼠标点击失败: {str(e_mouse)}")
             except Exception as e_modal:
-                print(f"处理模态框时出错: {str(e_modal)}")
+                log.warning(f"处理模态框时出错: {str(e_modal)}")
+                record_error()
             
             
+            enter_stage('continue')
             try:
                 
-                continue_xpath = "//div[contains(text(),'Continue')]"
-                continue_button = await page.wait_for_selector(continue_xpath, timeout=5000, state="visible")
+                continue_xpath = CONTINUE_XPATH
+                continue_button = await waitVisible(page, continue_xpath)
                 if continue_button:
-                    print("找到'Continue'按钮，准备点击...")
-                    await continue_button.click()
-                    print("已点击'Continue'按钮")
+                    log.info("找到'Continue'按钮，准备点击...")
+                    await throttled('action', continue_button.click())
+                    log.info("已点击'Continue'按钮")
                     continue_clicked = True
                 else:
                     raise Exception("未找到Continue按钮")
             except Exception as e3:
-                print(f"使用XPath点击Continue按钮失败: {str(e3)}")
+                log.debug(f"使用XPath点击Continue按钮失败: {str(e3)}")
                 
                 
                 try:
-                    print("尝试通过JavaScript点击'Continue'按钮...")
+                    log.info("尝试通过JavaScript点击'Continue'按钮...")
                     
-                    result = await page.evaluate('''() => {
-                        const elements = Array.from(document.querySelectorAll('div')).filter(
-                            el => el.textContent.includes('Continue')
-                        );
-                        if (elements.length > 0) {
-                            let clickTarget = elements[0];
-                         
-                            while (clickTarget && clickTarget.tagName !== 'BODY') {
-                                if (clickTarget.tagName === 'BUTTON' || clickTarget.tagName === 'A' || 
-                                    clickTarget.getAttribute('role') === 'button' || 
-                                    clickTarget.style.cursor === 'pointer') {
-                                    break;
-                                }
-                                clickTarget = clickTarget.parentElement;
-                            }
-                            if (clickTarget) {
-                                clickTarget.click();
-                                return true;
-                            }
-                        }
-                        return false;
-                    }''')
-                    print(f"通过JavaScript点击'Continue'按钮: {'成功' if result else '失败'}")
+                    result = await callHelper(page, 'clickByText', 'Continue', {'tag': 'div', 'exact': False})
+                    log.info(f"通过JavaScript点击'Continue'按钮: {'成功' if result else '失败'}")
                     if result:
                         continue_clicked = True
                     
                     
-                    await asyncio.sleep(2)
+                    await afterClick(page, 2)
                 except Exception as e4:
-                    print(f"所有Continue按钮点击尝试均失败: {str(e4)}")
+                    log.warning(f"所有Continue按钮点击尝试均失败: {str(e4)}")
+                    record_error()
         
         
         if continue_clicked:
-            print("等待游戏加载...")
+            log.info("等待游戏加载...")
+            enter_stage('game_load')
             
-            await asyncio.sleep(8)  
+            await timing.wait_until('gameLoad', lambda: callHelper(page, 'gameLoaded'))
             
             
             current_url = page.url
-            print(f"当前页面URL: {current_url}")
+            log.debug(f"当前页面URL: {current_url}")
             
             
             try:
-                print("检查页面加载状态...")
+                log.debug("检查页面加载状态...")
                 
-                await page.wait_for_load_state('networkidle', timeout=10000)
-                print("页面网络请求已完成")
+                await timing.measure('loadState', page.wait_for_load_state('networkidle', timeout=timing.timeout_ms('loadState')))
+                log.debug("页面网络请求已完成")
             except Exception as e_load:
-                print(f"等待页面加载完成时出错，但继续执行: {str(e_load)}")
+                log.warning(f"等待页面加载完成时出错，但继续执行: {str(e_load)}")
             
             
             page_title = await page.title()
-            print(f"页面标题: {page_title}")
+            log.debug(f"页面标题: {page_title}")
             
             
             max_cycles = 3  
             current_cycle = 0
+            opening_book = cached('opening_book.json', load_opening_book)
+            listener = listener_for(page)
+            trace_config = {**DEFAULT_TRACE_CONFIG, **runtimeConfig.get('trace', {})}
             
             while current_cycle < max_cycles:
                 current_cycle += 1
-                print(f"开始第 {current_cycle}/{max_cycles} 轮游戏")
+                log.info(f"开始第 {current_cycle}/{max_cycles} 轮游戏")
+                enter_stage('minesweeper')
+                if listener:
+                    listener.new_game()
                 
                 
-                game_loaded = await page.evaluate('''() => {
-                   
-                    const gameElements = document.querySelectorAll('.cell, .grid, .board, .game-container');
-                    return gameElements.length > 0;
-                }''')
+                game_loaded = await callHelper(page, 'gameLoaded')
                 
                 if not game_loaded:
-                    print("警告: 可能未正确加载游戏页面，尝试重新检查...")
+                    log.warning("警告: 可能未正确加载游戏页面，尝试重新检查...")
                     
-                    await asyncio.sleep(5)
+                    await timing.wait_until('gameLoad', lambda: callHelper(page, 'gameLoaded'))
                 
                 
                 try:
-                    print("检查inject.js文件...")
+                    log.debug("检查inject.js文件...")
                     
                     if not os.path.exists('inject.js'):
-                        print("错误: inject.js文件不存在!")
+                        log.error("错误: inject.js文件不存在!")
                         break
                     
-                    print("读取注入脚本...")
+                    log.debug("读取注入脚本...")
                     try:
-                        with open('inject.js', 'r', encoding='utf-8') as f:
-                            inject_script = f.read()
-                        print(f"注入脚本读取成功，大小: {len(inject_script)} 字节")
+                        inject_script = cached('inject.js', lambda: load_script('inject.js'))
+                        log.debug(f"注入脚本读取成功，大小: {len(inject_script)} 字节")
                     except Exception as e_read:
-                        print(f"读取inject.js文件失败: {str(e_read)}")
+                        log.warning(f"读取inject.js文件失败: {str(e_read)}")
                         break
                     
-                    print("注入扫雷自动解决脚本...")
+                    log.info("注入扫雷自动解决脚本...")
                     try:
                         
                         pre_inject_check = await page.evaluate('''() => {
@@ -745,11 +1214,14 @@ async def operationEnv(context):
                                 readyState: document.readyState
                             };
                         }''')
-                        print(f"注入前页面状态: {pre_inject_check}")
+                        log.debug(f"注入前页面状态: {pre_inject_check}")
                         
                         
+                        if opening_book:
+                            await page.evaluate('(book) => { window.minesweeperOpeningBook = book; }', opening_book)
+                        
                         await page.evaluate(inject_script)
-                        print("脚本注入成功！自动扫雷开始运行")
+                        log.info("脚本注入成功！自动扫雷开始运行")
                         
                         
                         post_inject_check = await page.evaluate('''() => {
@@ -760,502 +1232,494 @@ async def operationEnv(context):
                                 errors: window.lastInjectionError || 'none'
                             };
                         }''')
-                        print(f"注入后状态: {post_inject_check}")
+                        log.debug(f"注入后状态: {post_inject_check}")
                         
                     except Exception as e_inject:
-                        print(f"执行脚本注入失败: {str(e_inject)}")
-                        print("尝试简化版注入...")
+                        log.warning(f"执行脚本注入失败: {str(e_inject)}")
+                        log.info("尝试简化版注入...")
                         
                         
                         try:
                             await page.add_script_tag(content=inject_script)
-                            print("通过script标签注入成功")
+                            log.info("通过script标签注入成功")
                         except Exception as e_simple_inject:
-                            print(f"简化注入也失败: {str(e_simple_inject)}")
+                            log.warning(f"简化注入也失败: {str(e_simple_inject)}")
                             break
                     
                     
-                    print("让脚本运行33秒...")
+                    log.info("让脚本运行33秒...")
                     
-                    for i in range(6):
-                        await asyncio.sleep(5)
-                        print(f"脚本运行中... {(i+1)*5}/33 秒")
+                    if listener:
+                        # 接口返回对局结束后立即进入下一步，不用等满33秒
+                        for i in range(33):
+                            await asyncio.sleep(1)
+                            if listener.game_over():
+                                log.info(f"接口返回本局已结束 ({listener.game_over()})，用时约 {i + 1} 秒")
+                                break
+                        await asyncio.sleep(1)
+                    else:
+                        for i in range(6):
+                            await asyncio.sleep(5)
+                            log.debug(f"脚本运行中... {(i+1)*5}/33 秒")
                         
                         
+                            try:
+                                game_progress = await page.evaluate(GAME_PROGRESS_SCRIPT)
+                                log.debug(f"游戏进度: {game_progress}")
+                            except Exception as e_progress:
+                                log.debug(f"检查游戏进度失败: {str(e_progress)}")
+                    
+                        await asyncio.sleep(3)  
+                    
+                    
+                    game_status = None
+                    try:
+                        game_status = await page.evaluate(GAME_STATUS_SCRIPT)
+                        if game_status and game_status.get('gameOver'):
+                            GAMES.inc(result=game_status.get('result') or 'unknown')
+                            count(f"games_{game_status.get('result') or 'unknown'}")
+                            log.info(f"本局结果: {game_status.get('result')}, 点击 {game_status.get('clicks')} 次")
+                        else:
+                            GAMES.inc(result='unfinished')
+                        if game_status and game_status.get('unacked'):
+                            log.warning(f"有 {game_status['unacked']} 次点击没有得到页面响应"
+                                        + (f"，格子 {game_status['stalled']} 多次无响应后停止" if game_status.get('stalled') else ''))
+                    except Exception as e_status:
+                        log.debug(f"读取对局结果失败: {str(e_status)}")
+                    
+                    if trace_config['enabled']:
                         try:
-                            game_progress = await page.evaluate('''() => {
-                         
-                                const openedCells = document.querySelectorAll('.cell.open, .revealed, .flagged').length;
-                                return {
-                                    openedCells: openedCells,
-                                    time: new Date().toISOString()
-                                };
-                            }''')
-                            print(f"游戏进度: {game_progress}")
-                        except Exception as e_progress:
-                            print(f"检查游戏进度失败: {str(e_progress)}")
+                            trace_records = await page.evaluate('() => window.collectMinesweeperTrace ? window.collectMinesweeperTrace() : []')
+                            await asyncio.to_thread(write_trace, trace_records, trace_config['dir'], uniqueId, envId, current_cycle)
+                        except Exception as e_trace:
+                            log.debug(f"保存决策记录失败: {str(e_trace)}")
                     
-                    await asyncio.sleep(3)  
+                    if game_status and not game_status.get('gameOver') and game_status.get('clicks', 0) == 0:
+                        raise GameStall(f"第 {current_cycle} 轮游戏脚本未能点击任何格子，棋盘可能卡住")
                     
                     
-                    print("检查'Play Again'按钮...")
+                    log.info("检查'Play Again'按钮...")
                     play_again_clicked = False
                     
                     try:
                         
-                        play_again_xpath = "//div[normalize-space()='Play Again']"
-                        play_again_button = await page.wait_for_selector(play_again_xpath, timeout=5000, state="visible")
+                        play_again_xpath = PLAY_AGAIN_XPATH
+                        play_again_button = await waitVisible(page, play_again_xpath)
                         if play_again_button:
-                            print("找到'Play Again'按钮，准备点击...")
-                            await play_again_button.click()
-                            print("已点击'Play Again'按钮")
+                            log.info("找到'Play Again'按钮，准备点击...")
+                            await throttled('action', play_again_button.click())
+                            log.info("已点击'Play Again'按钮")
                             play_again_clicked = True
                             
                             
-                            await asyncio.sleep(3)
+                            await afterClick(page, 3)
                         else:
-                            print("未找到'Play Again'按钮，尝试JavaScript方法")
+                            log.info("未找到'Play Again'按钮，尝试JavaScript方法")
                             raise Exception("未找到Play Again按钮")
                     except Exception as e_play_again:
-                        print(f"使用XPath点击Play Again按钮失败: {str(e_play_again)}")
+                        log.debug(f"使用XPath点击Play Again按钮失败: {str(e_play_again)}")
                         
                         
                         try:
-                            print("尝试通过JavaScript点击'Play Again'按钮...")
+                            log.info("尝试通过JavaScript点击'Play Again'按钮...")
                             
-                            result = await page.evaluate('''() => {
-                                const elements = Array.from(document.querySelectorAll('div')).filter(
-                                    el => el.textContent.trim() === 'Play Again'
-                                );
-                                if (elements.length > 0) {
-                                    let clickTarget = elements[0];
-                                   
-                                    while (clickTarget && clickTarget.tagName !== 'BODY') {
-                                        if (clickTarget.tagName === 'BUTTON' || clickTarget.tagName === 'A' || 
-                                            clickTarget.getAttribute('role') === 'button' || 
-                                            clickTarget.style.cursor === 'pointer') {
-                                            break;
-                                        }
-                                        clickTarget = clickTarget.parentElement;
-                                    }
-                                    if (clickTarget) {
-                                        clickTarget.click();
-                                        return true;
-                                    }
-                                }
-                                return false;
-                            }''')
-                            print(f"通过JavaScript点击'Play Again'按钮: {'成功' if result else '失败'}")
+                            result = await callHelper(page, 'clickByText', 'Play Again', {'tag': 'div'})
+                            log.info(f"通过JavaScript点击'Play Again'按钮: {'成功' if result else '失败'}")
                             
                             if result:
                                 play_again_clicked = True
                                 
-                                await asyncio.sleep(3)
+                                await afterClick(page, 3)
                             else:
-                                print("无法找到或点击'Play Again'按钮，跳出循环")
+                                log.warning("无法找到或点击'Play Again'按钮，跳出循环")
                                 break
                                 
                         except Exception as e_js:
-                            print(f"所有点击'Play Again'尝试均失败: {str(e_js)}")
-                            print("结束游戏循环")
+                            log.warning(f"所有点击'Play Again'尝试均失败: {str(e_js)}")
+                            record_error()
+                            log.info("结束游戏循环")
                             break
                         
                     if not play_again_clicked:
-                        print("无法找到或点击'Play Again'按钮，跳出循环")
+                        log.warning("无法找到或点击'Play Again'按钮，跳出循环")
                         break
                     
+                except EnvFailure:
+                    raise
                 except Exception as e5:
-                    print(f"注入脚本失败: {str(e5)}")
+                    log.warning(f"注入脚本失败: {str(e5)}")
+                    record_error()
                     break
             
-            print(f"完成了 {current_cycle} 轮游戏")
+            log.info(f"完成了 {current_cycle} 轮游戏")
             
             
-            print("游戏循环结束，开始点击返回并领取奖励...")
+            log.info("游戏循环结束，开始点击返回并领取奖励...")
+            enter_stage('return_home')
             
             
             try:
-                print("尝试点击屏幕区域关闭结果对话框...")
+                log.info("尝试点击屏幕区域关闭结果对话框...")
                 
                 
-                result = await page.evaluate('''() => {
-                  
-                    const vw = window.innerWidth;
-                    const vh = window.innerHeight;
-                    
-                   
-                    const clickEvent = new MouseEvent('click', {
-                        'view': window,
-                        'bubbles': true,
-                        'cancelable': true
-                    });
-                    
-                   
-                    let success = false;
-                    
-                
-                    let elem = document.elementFromPoint(vw/2, vh*0.1);
-                    if (elem) {
-                        elem.dispatchEvent(clickEvent);
-                        success = true;
-                    }
-                    
-               
-                    elem = document.elementFromPoint(vw*0.1, vh/2);
-                    if (elem) {
-                        elem.dispatchEvent(clickEvent);
-                        success = true;
-                    }
-                    
-                 
-                    elem = document.elementFromPoint(vw*0.9, vh/2);
-                    if (elem) {
-                        elem.dispatchEvent(clickEvent);
-                        success = true;
-                    }
-                    
+                result = await callHelper(page, 'clickOutside', 'sides')
                 
-                    elem = document.elementFromPoint(vw/2, vh*0.9);
-                    if (elem) {
-                        elem.dispatchEvent(clickEvent);
-                        success = true;
-                    }
-                    
-                    return success;
-                }''')
-                
-                print(f"尝试点击屏幕区域关闭对话框: {'成功' if result else '失败'}")
+                log.info(f"尝试点击屏幕区域关闭对话框: {'成功' if result else '失败'}")
                 
                 
-                await asyncio.sleep(2)
+                await afterClick(page, 2, 'Return Home')
                 
                 
                 if not result:
-                    print("尝试按ESC键关闭对话框...")
+                    log.info("尝试按ESC键关闭对话框...")
                     await page.keyboard.press('Escape')
-                    await asyncio.sleep(1)
+                    await afterClick(page, 1, 'Return Home')
                 
                 
-                print("等待页面恢复...")
-                await asyncio.sleep(3)
+                log.info("等待页面恢复...")
+                await afterClick(page, 3, 'Return Home')
 
                 
-                print("检查页面上的'Return Home'按钮...")
+                log.info("检查页面上的'Return Home'按钮...")
                 return_home_clicked = False
                 try:
                     
-                    return_home_xpath = "//div[@class='fPSBzf bYPztT bYPznK pezuA cMGtQw pBppg dMMuNs']//button[@type='button']"
+                    return_home_xpath = RETURN_HOME_XPATH
                     
-                    simple_return_home_xpath = "//button[contains(., 'Return Home')]"
+                    simple_return_home_xpath = SIMPLE_RETURN_HOME_XPATH
                     
                     
-                    return_home_button = await page.wait_for_selector(return_home_xpath, timeout=5000, state="visible")
+                    return_home_button = await waitVisible(page, return_home_xpath)
                     if return_home_button:
-                        print("找到'Return Home'按钮，准备点击...")
-                        await return_home_button.click()
-                        print("已点击'Return Home'按钮")
+                        log.info("找到'Return Home'按钮，准备点击...")
+                        await throttled('action', return_home_button.click())
+                        log.info("已点击'Return Home'按钮")
                         return_home_clicked = True
                     else:
                         
-                        return_home_button = await page.wait_for_selector(simple_return_home_xpath, timeout=5000, state="visible")
+                        return_home_button = await waitVisible(page, simple_return_home_xpath)
                         if return_home_button:
-                            print("找到简化的'Return Home'按钮，准备点击...")
-                            await return_home_button.click()
-                            print("已点击'Return Home'按钮")
+                            log.info("找到简化的'Return Home'按钮，准备点击...")
+                            await throttled('action', return_home_button.click())
+                            log.info("已点击'Return Home'按钮")
                             return_home_clicked = True
                         else:
                             raise Exception("未找到Return Home按钮")
                 except Exception as e_return_home:
-                    print(f"使用XPath点击Return Home按钮失败: {str(e_return_home)}")
+                    log.debug(f"使用XPath点击Return Home按钮失败: {str(e_return_home)}")
                     
                     
                     try:
-                        print("尝试通过JavaScript点击'Return Home'按钮...")
-                        result = await page.evaluate('''() => {
-                        
-                            const buttons = Array.from(document.querySelectorAll('button')).filter(
-                                el => el.textContent.includes('Return Home')
-                            );
-                            if (buttons.length > 0) {
-                                buttons[0].click();
-                                return true;
-                            }
-                            
-                         
-                            const allButtons = document.querySelectorAll('button');
-                            if (allButtons.length > 0) {
-                           
-                                const viewportHeight = window.innerHeight;
-                                const viewportWidth = window.innerWidth;
-                                const centerX = viewportWidth / 2;
-                                const centerY = viewportHeight / 2;
-                                
-                            
-                                let closestButton = null;
-                                let closestDistance = Infinity;
-                                
-                                for (const button of allButtons) {
-                                    const rect = button.getBoundingClientRect();
-                                    const buttonCenterX = rect.left + rect.width / 2;
-                                    const buttonCenterY = rect.top + rect.height / 2;
-                                    
-                                    const distance = Math.sqrt(
-                                        Math.pow(buttonCenterX - centerX, 2) + 
-                                        Math.pow(buttonCenterY - centerY, 2)
-                                    );
-                                    
-                                    if (distance < closestDistance) {
-                                        closestDistance = distance;
-                                        closestButton = button;
-                                    }
-                                }
-                                
-                                if (closestButton) {
-                                    closestButton.click();
-                                    return true;
-                                }
-                            }
-                            
-                            return false;
-                        }''')
-                        print(f"通过JavaScript点击'Return Home'按钮: {'成功' if result else '失败'}")
+                        log.info("尝试通过JavaScript点击'Return Home'按钮...")
+                        result = await callHelper(page, 'clickAny', RETURN_HOME_TARGETS)
+                        log.info(f"通过JavaScript点击'Return Home'按钮: {'成功' if result else '失败'}")
                         if result:
                             return_home_clicked = True
                     except Exception as e_return_home_js:
-                        print(f"通过JavaScript点击Return Home按钮失败: {str(e_return_home_js)}")
+                        log.warning(f"通过JavaScript点击Return Home按钮失败: {str(e_return_home_js)}")
 
+                if not return_home_clicked:
+                    log.warning("所有方式都未能点击'Return Home'按钮，继续等待返回主页")
+                await afterClick(page, 3, 'Play now', 'Roll now')
+                log.info("扫雷任务完成")
                 
-                await asyncio.sleep(3)
+            except Exception as e_all:
+                log.warning(f"执行点击系列按钮过程中出错: {str(e_all)}")
+                record_error()
+                log.warning("操作未能完全完成")
+    
+    except EnvFailure:
+        raise
+    except Exception as e:
+        log.warning(f"扫雷过程中出错: {str(e)}")
+        record_error()
+
+
+
+async def diceTask(page, uniqueId, envId):
+    try:
+        log.info("尝试点击'Roll Now'按钮...")
+        enter_stage('dice')
+        roll_now_clicked = False
+        roll_xpath = ROLL_NOW_XPATH
+        try:
+            roll_button = await waitVisible(page, roll_xpath)
+            if roll_button:
+                log.info("找到'Roll Now'按钮，准备点击...")
+                await throttled('action', roll_button.click())
+                log.info("已点击'Roll Now'按钮")
+                roll_now_clicked = True
+            else:
+                raise Exception("未找到Roll Now按钮")
+        except Exception as e_roll:
+            log.debug(f"使用XPath点击Roll Now按钮失败: {str(e_roll)}")
+            
+            
+            try:
+                log.info("尝试通过JavaScript点击'Roll Now'按钮...")
+                result = await callHelper(page, 'clickByText', 'Roll now', {'tag': 'p'})
+                log.info(f"通过JavaScript点击'Roll Now'按钮: {'成功' if result else '失败'}")
+                roll_now_clicked = result
+            except Exception as e_roll_js:
+                log.warning(f"JavaScript点击Roll Now按钮失败: {str(e_roll_js)}")
+        
+        
+        if roll_now_clicked:
+            
+            await afterClick(page, 3, "Let's roll")
+            
+            
+            log.info("尝试点击'Let's roll'按钮...")
+            
+            absolute_lets_roll_xpath = ABSOLUTE_LETS_ROLL_XPATH
+            lets_roll_clicked = False
+            try:
+                
+                lets_roll_button = await waitVisible(page, absolute_lets_roll_xpath)
+                if lets_roll_button:
+                    log.info("找到绝对路径的'Let's roll'按钮，准备点击...")
+                    await throttled('action', lets_roll_button.click())
+                    log.info("已点击'Let's roll'按钮")
+                    lets_roll_clicked = True
+                else:
+                    
+                    simplified_lets_roll_xpath = SIMPLIFIED_LETS_ROLL_XPATH
+                    lets_roll_button = await waitVisible(page, simplified_lets_roll_xpath)
+                    if lets_roll_button:
+                        log.info("找到简化的'Let's roll'按钮，准备点击...")
+                        await throttled('action', lets_roll_button.click())
+                        log.info("已点击'Let's roll'按钮")
+                        lets_roll_clicked = True
+                    else:
+                        
+                        lets_roll_xpath = LETS_ROLL_XPATH
+                        lets_roll_button = await waitVisible(page, lets_roll_xpath)
+                        if lets_roll_button:
+                            log.info("找到'Let's roll'按钮，准备点击...")
+                            await throttled('action', lets_roll_button.click())
+                            log.info("已点击'Let's roll'按钮")
+                            lets_roll_clicked = True
+                        else:
+                            raise Exception("未找到Let's roll按钮")
+            except Exception as e_lets_roll:
+                log.debug(f"使用XPath点击Let's roll按钮失败: {str(e_lets_roll)}")
                 
                 
-                print("尝试点击'Roll Now'按钮...")
-                roll_now_clicked = False
-                roll_xpath = "//p[normalize-space()='Roll now']"
                 try:
-                    roll_button = await page.wait_for_selector(roll_xpath, timeout=5000, state="visible")
-                    if roll_button:
-                        print("找到'Roll Now'按钮，准备点击...")
-                        await roll_button.click()
-                        print("已点击'Roll Now'按钮")
-                        roll_now_clicked = True
+                    log.info("尝试通过JavaScript点击'Let's roll'按钮...")
+                    result = await callHelper(page, 'clickAny', LETS_ROLL_TARGETS)
+                    log.info(f"通过JavaScript点击'Let's roll'按钮: {'成功' if result else '失败'}")
+                    if result:
+                        lets_roll_clicked = True
+                except Exception as e_lets_roll_js:
+                    log.warning(f"所有'Let's roll'点击尝试均失败: {str(e_lets_roll_js)}")
+                    record_error()
+
+            
+            if lets_roll_clicked:
+                
+                log.info("等待'Throw Dice'按钮出现...")
+                await afterClick(page, 3, 'Throw Dice')
+                
+                
+                log.info("尝试点击'Throw Dice'按钮...")
+                throw_dice_xpath = THROW_DICE_XPATH
+                throw_dice_clicked = False
+                try:
+                    throw_dice_button = await waitVisible(page, throw_dice_xpath)
+                    if throw_dice_button:
+                        log.info("找到'Throw Dice'按钮，准备点击...")
+                        await throttled('action', throw_dice_button.click())
+                        log.info("已点击'Throw Dice'按钮")
+                        throw_dice_clicked = True
                     else:
-                        raise Exception("未找到Roll Now按钮")
-                except Exception as e_roll:
-                    print(f"使用XPath点击Roll Now按钮失败: {str(e_roll)}")
+                        raise Exception("未找到Throw Dice按钮")
+                except Exception as e_throw_dice:
+                    log.debug(f"使用XPath点击Throw Dice按钮失败: {str(e_throw_dice)}")
                     
                     
                     try:
-                        print("尝试通过JavaScript点击'Roll Now'按钮...")
-                        result = await page.evaluate('''() => {
-                            const elements = Array.from(document.querySelectorAll('p')).filter(
-                                el => el.textContent.trim() === 'Roll now'
-                            );
-                            if (elements.length > 0) {
-                                let clickTarget = elements[0];
-                             
-                                while (clickTarget && clickTarget.tagName !== 'BODY') {
-                                    if (clickTarget.tagName === 'BUTTON' || clickTarget.tagName === 'A' || 
-                                        clickTarget.getAttribute('role') === 'button' || 
-                                        clickTarget.style.cursor === 'pointer') {
-                                        break;
-                                    }
-                                    clickTarget = clickTarget.parentElement;
-                                }
-                                if (clickTarget) {
-                                    clickTarget.click();
-                                    return true;
-                                }
-                            }
-                            return false;
-                        }''')
-                        print(f"通过JavaScript点击'Roll Now'按钮: {'成功' if result else '失败'}")
-                        roll_now_clicked = result
-                    except Exception as e_roll_js:
-                        print(f"JavaScript点击Roll Now按钮失败: {str(e_roll_js)}")
+                        log.info("尝试通过JavaScript点击'Throw Dice'按钮...")
+                        result = await callHelper(page, 'clickAny', THROW_DICE_TARGETS)
+                        log.info(f"通过JavaScript点击'Throw Dice'按钮: {'成功' if result else '失败'}")
+                        throw_dice_clicked = result
+                    except Exception as e_throw_dice_js:
+                        log.warning(f"所有'Throw Dice'点击尝试均失败: {str(e_throw_dice_js)}")
+                        record_error()
                 
                 
-                if roll_now_clicked:
-                    
-                    await asyncio.sleep(3)
-                    
-                    
-                    print("尝试点击'Let's roll'按钮...")
-                    
-                    absolute_lets_roll_xpath = "/html[1]/body[1]/div[1]/div[11]/div[3]/div[1]/div[1]/div[3]/button[1]"
-                    lets_roll_clicked = False
-                    try:
-                        
-                        lets_roll_button = await page.wait_for_selector(absolute_lets_roll_xpath, timeout=5000, state="visible")
-                        if lets_roll_button:
-                            print("找到绝对路径的'Let's roll'按钮，准备点击...")
-                            await lets_roll_button.click()
-                            print("已点击'Let's roll'按钮")
-                            lets_roll_clicked = True
-                        else:
-                            
-                            simplified_lets_roll_xpath = "//button[contains(@class, 'hoEiop')]"
-                            lets_roll_button = await page.wait_for_selector(simplified_lets_roll_xpath, timeout=5000, state="visible")
-                            if lets_roll_button:
-                                print("找到简化的'Let's roll'按钮，准备点击...")
-                                await lets_roll_button.click()
-                                print("已点击'Let's roll'按钮")
-                                lets_roll_clicked = True
-                            else:
-                                
-                                lets_roll_xpath = "//button[@class='hoEiop dgDkEX iFUqYl bZRhvx eAZrqn diIxfU jTWvec ThTOq efvJEH cGFOJB fzoqjJ coifUy eAZrpM kyvghW fznPAm fzoAXm eePqkU']"
-                                lets_roll_button = await page.wait_for_selector(lets_roll_xpath, timeout=5000, state="visible")
-                                if lets_roll_button:
-                                    print("找到'Let's roll'按钮，准备点击...")
-                                    await lets_roll_button.click()
-                                    print("已点击'Let's roll'按钮")
-                                    lets_roll_clicked = True
-                                else:
-                                    raise Exception("未找到Let's roll按钮")
-                    except Exception as e_lets_roll:
-                        print(f"使用XPath点击Let's roll按钮失败: {str(e_lets_roll)}")
-                        
-                        
-                        try:
-                            print("尝试通过JavaScript点击'Let's roll'按钮...")
-                            result = await page.evaluate('''() => {
-                       
-                                const xpathResult = document.evaluate(
-                                    "/html[1]/body[1]/div[1]/div[11]/div[3]/div[1]/div[1]/div[3]/button[1]", 
-                                    document, 
-                                    null, 
-                                    XPathResult.FIRST_ORDERED_NODE_TYPE, 
-                                    null
-                                );
-                                
-                                if (xpathResult && xpathResult.singleNodeValue) {
-                                    xpathResult.singleNodeValue.click();
-                                    return true;
-                                }
-                                
-                                
-                                const elements = Array.from(document.querySelectorAll('button')).filter(
-                                    el => el.textContent.includes("Let's roll") || el.textContent.includes("Let's Roll")
-                                );
-                                
-                                if (elements.length > 0) {
-                                    elements[0].click();
-                                    return true;
-                                }
-                                
-                              
-                                const classButton = document.querySelector('button[class*="hoEiop"]');
-                                if (classButton) {
-                                    classButton.click();
-                                    return true;
-                                }
-                                
-                                return false;
-                            }''')
-                            print(f"通过JavaScript点击'Let's roll'按钮: {'成功' if result else '失败'}")
-                            if result:
-                                lets_roll_clicked = True
-                        except Exception as e_lets_roll_js:
-                            print(f"所有'Let's roll'点击尝试均失败: {str(e_lets_roll_js)}")
+                if throw_dice_clicked:
+                    DICE_ROLLS.inc()
+                    count('dice_rolls')
+                    log.info("等待骰子动画和结果显示...")
+                    await afterClick(page, 5, 'You rolled', 'Next roll in')
+                    log.info("骰子动画完成，结果已显示")
+            else:
+                log.warning("未能成功点击'Let's roll'按钮，跳过'Throw Dice'步骤")
 
-                    
-                    if lets_roll_clicked:
-                        
-                        print("等待'Throw Dice'按钮出现...")
-                        await asyncio.sleep(3)
-                        
-                        
-                        print("尝试点击'Throw Dice'按钮...")
-                        throw_dice_xpath = "//p[normalize-space()='Throw Dice']"
-                        throw_dice_clicked = False
-                        try:
-                            throw_dice_button = await page.wait_for_selector(throw_dice_xpath, timeout=5000, state="visible")
-                            if throw_dice_button:
-                                print("找到'Throw Dice'按钮，准备点击...")
-                                await throw_dice_button.click()
-                                print("已点击'Throw Dice'按钮")
-                                throw_dice_clicked = True
-                            else:
-                                raise Exception("未找到Throw Dice按钮")
-                        except Exception as e_throw_dice:
-                            print(f"使用XPath点击Throw Dice按钮失败: {str(e_throw_dice)}")
-                            
-                            
-                            try:
-                                print("尝试通过JavaScript点击'Throw Dice'按钮...")
-                                result = await page.evaluate('''() => {
-                                  
-                                    const elements = Array.from(document.querySelectorAll('p')).filter(
-                                        el => el.textContent.trim() === 'Throw Dice'
-                                    );
-                                    
-                                    if (elements.length > 0) {
-                                        let clickTarget = elements[0];
-                                     
-                                        while (clickTarget && clickTarget.tagName !== 'BODY') {
-                                            if (clickTarget.tagName === 'BUTTON' || clickTarget.tagName === 'A' || 
-                                                clickTarget.getAttribute('role') === 'button' || 
-                                                clickTarget.style.cursor === 'pointer') {
-                                                break;
-                                            }
-                                            clickTarget = clickTarget.parentElement;
-                                        }
-                                        if (clickTarget) {
-                                            clickTarget.click();
-                                            return true;
-                                        }
-                                    }
-                                    
-                                   
-                                    const allElements = Array.from(document.querySelectorAll('*'));
-                                    const throwDiceElements = allElements.filter(
-                                        el => el.textContent && el.textContent.includes('Throw Dice')
-                                    );
-                                    
-                                    if (throwDiceElements.length > 0) {
-                                        let clickTarget = throwDiceElements[0];
-                                   
-                                        while (clickTarget && clickTarget.tagName !== 'BODY') {
-                                            if (clickTarget.tagName === 'BUTTON' || clickTarget.tagName === 'A' || 
-                                                clickTarget.getAttribute('role') === 'button' || 
-                                                clickTarget.style.cursor === 'pointer') {
-                                                break;
-                                            }
-                                            clickTarget = clickTarget.parentElement;
-                                        }
-                                        if (clickTarget) {
-                                            clickTarget.click();
-                                            return true;
-                                        }
-                                    }
-                                    
-                                    return false;
-                                }''')
-                                print(f"通过JavaScript点击'Throw Dice'按钮: {'成功' if result else '失败'}")
-                                throw_dice_clicked = result
-                            except Exception as e_throw_dice_js:
-                                print(f"所有'Throw Dice'点击尝试均失败: {str(e_throw_dice_js)}")
-                        
-                        
-                        if throw_dice_clicked:
-                            print("等待骰子动画和结果显示...")
-                            await asyncio.sleep(5)
-                            print("骰子动画完成，结果已显示")
-                    else:
-                        print("未能成功点击'Let's roll'按钮，跳过'Throw Dice'步骤")
+        
+        await afterClick(page, 3)
+        log.info("掷骰子任务完成")
+    
+    except EnvFailure:
+        raise
+    except Exception as e:
+        log.warning(f"掷骰子过程中出错: {str(e)}")
+        record_error()
 
-                
-                await asyncio.sleep(3)
-                print("完成全部操作流程！")
-                
-            except Exception as e_all:
-                print(f"执行点击系列按钮过程中出错: {str(e_all)}")
-                print("操作未能完全完成")
+
+
+TASKS = {
+    'minesweeper': minesweeperTask,
+    'dice': diceTask
+}
+
+
+def task_graph(config):
+    """返回 (执行顺序, 依赖图, 是否并行)，依赖图中有未知任务或循环依赖时报错"""
+    config = {**DEFAULT_TASKS_CONFIG, **(config or {})}
+    graph = {name: list(deps) for name, deps in config['graph'].items()}
+    for name, deps in graph.items():
+        if name not in TASKS:
+            raise ValueError(f"未知任务: {name}，可用任务: {', '.join(TASKS)}")
+        for dep in deps:
+            if dep not in graph:
+                raise ValueError(f"任务 {name} 依赖的 {dep} 不在任务图中")
     
+    order = []
+    visiting = set()
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"任务图存在循环依赖: {name}")
+        visiting.add(name)
+        for dep in graph[name]:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+    for name in graph:
+        visit(name)
+    return order, graph, config['parallelTabs']
+
+
+
+async def preflight(page, names):
+    """页面加载后读取各任务今天是否还有次数，返回 {任务: 原因}，只包含确定不可执行的任务"""
+    config = {**DEFAULT_PREFLIGHT_CONFIG, **runtimeConfig.get('preflight', {})}
+    rules = {name: rule for name, rule in config['rules'].items() if name in names}
+    if not config['enabled'] or not rules:
+        return {}
+    
+    enter_stage('preflight')
+    listener = listener_for(page)
+    deadline = time.monotonic() + config['waitSeconds']
+    while True:
+        # 页面接口返回的次数优先于DOM文本
+        network_status = listener.task_status() if listener else {}
+        if all(name in network_status for name in rules):
+            status = {name: network_status[name] for name in rules}
+            break
+        try:
+            status = {**await callHelper(page, 'taskStatus', rules), **network_status}
+        except Exception as e:
+            log.debug(f"预检失败，按原流程执行所有任务: {str(e)}")
+            return {}
+        if all(s['available'] is not None for s in status.values()) or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(0.5)
+    
+    log.info("预检结果: " + ', '.join(
+        f"{name} {'跳过' if s['available'] is False else '执行'} ({s['reason']}"
+        f"{', 剩余 ' + str(s['remaining']) if s['remaining'] is not None else ''})"
+        for name, s in status.items()))
+    return {name: s['reason'] for name, s in status.items() if s['available'] is False}
+
+
+
+async def runTask(context, name, page, uniqueId, envId, parallel=False):
+    # 并行任务在各自的asyncio任务里运行，单独记录当前阶段，耗时和错误汇总到环境会话
+    tracker = fork_session() if parallel else None
+    try:
+        async with (tracker.bounded() if tracker else contextlib.nullcontext()):
+            if page is None:
+                page = await openRewardsPage(context)
+            log.info(f"开始任务: {name}")
+            await TASKS[name](page, uniqueId, envId)
+            if parallel:
+                await finished(page)
+        TASK_RESULTS.inc(task=name, result='ok')
+        return page
     except Exception as e:
-        print(f"操作过程中出错: {str(e)}")
+        TASK_RESULTS.inc(task=name, result='failed')
+        raise classify(e, current_stage())
+    finally:
+        if tracker is not None:
+            tracker.finish()
+
+
+
+async def operationEnv(context, uniqueId, envId):
+    await installHelpers(context)
+    await install_reduced_motion(context)
+    order, graph, parallel = task_graph(runtimeConfig.get('tasks'))
+    page = await openRewardsPage(context)
+    await freeze_idle(context, [page])
+    
+    
+    skipped = await preflight(page, order)
+    for name in skipped:
+        TASK_RESULTS.inc(task=name, result='skipped')
+    order = [name for name in order if name not in skipped]
+    if not order:
+        log.info("今日所有任务均已完成，无需操作")
+        return
+    
+    if not parallel:
+        for name in order:
+            await runTask(context, name, page, uniqueId, envId)
+    else:
+        log.info(f"在独立标签页中并行执行任务: {', '.join(order)}")
+        # 各任务在自己的记录器中计时和限时，这里结束预检阶段，等待期间只受会话总时限约束
+        leave_stage()
+        runs = {}
+        idle = {}
+        
+        async def run(name, task_page):
+            for dep in graph[name]:
+                if dep not in runs:
+                    continue
+                try:
+                    await runs[dep]
+                except Exception:
+                    log.warning(f"任务 {name} 依赖的 {dep} 失败，跳过")
+                    raise
+            if task_page is None:
+                # 依赖的任务结束后其标签页空闲，接着使用，不再新开标签页重新打开奖励页面
+                for dep in graph[name]:
+                    page_done = idle.pop(dep, None)
+                    if page_done is not None and not page_done.is_closed():
+                        task_page = page_done
+                        await wake(task_page)
+                        break
+            idle[name] = await runTask(context, name, task_page, uniqueId, envId, parallel=True)
+        
+        
+        for index, name in enumerate(order):
+            runs[name] = asyncio.create_task(run(name, page if index == 0 else None))
+        results = await asyncio.gather(*runs.values(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
     
-    print('浏览器操作完成')
+    log.info("完成全部操作流程！")
+    log.info('浏览器操作完成')
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
@@ -0,0 +1,216 @@
+
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+
+from logger import get_logger
+
+
+log = get_logger()
+
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+API_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {} if self.label_names else {(): 0}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class PerMinute(Metric):
+    """最近60秒内的事件数，用于直接观察每分钟启动/关闭数量"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, window=60):
+        super().__init__(name, help_text)
+        self.window = window
+        self.events = deque()
+
+    def mark(self):
+        with self.lock:
+            self.events.append(time.monotonic())
+
+    def value(self):
+        cutoff = time.monotonic() - self.window
+        with self.lock:
+            while self.events and self.events[0] < cutoff:
+                self.events.popleft()
+            return len(self.events)
+
+    def render(self):
+        return self.header() + [f'{self.name} {self.value()}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            items = sorted((k, {'counts': list(v['counts']), 'sum': v['sum'], 'count': v['count']})
+                           for k, v in self.series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, [("le", _format_value(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, [("le", "+Inf")])} {series["count"]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series["sum"])}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {series["count"]}')
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+ACTIVE_INSTANCES = register(Gauge('newton_active_instances', '正在运行的实例数'))
+QUEUE_DEPTH = register(Gauge('newton_queue_depth', '等待启动的环境数'))
+ENV_STARTS = register(Counter('newton_env_starts_total', '环境启动次数', ['result']))
+ENV_CLOSES = register(Counter('newton_env_closes_total', '环境关闭次数', ['result']))
+ENV_STARTS_PER_MINUTE = register(PerMinute('newton_env_starts_per_minute', '最近一分钟的环境启动数'))
+ENV_CLOSES_PER_MINUTE = register(PerMinute('newton_env_closes_per_minute', '最近一分钟的环境关闭数'))
+API_LATENCY = register(Histogram('newton_morelogin_api_seconds', 'MoreLogin本地API请求耗时', ['endpoint'], API_BUCKETS))
+STAGE_LATENCY = register(Histogram('newton_stage_seconds', '各阶段耗时', ['stage']))
+GAMES = register(Counter('newton_games_total', '扫雷对局结果', ['result']))
+TASK_RESULTS = register(Counter('newton_tasks_total', '各任务的执行结果(ok/failed/skipped)', ['task', 'result']))
+DICE_ROLLS = register(Counter('newton_dice_rolls_total', '完成的掷骰子次数'))
+ERRORS = register(Counter('newton_errors_total', '按阶段统计的错误数', ['stage']))
+SLOTS_IN_USE = register(Gauge('newton_slots_in_use', '占用资源的环境数(从启动到确认关闭)'))
+SITE_ERRORS = register(Counter('newton_site_errors_total', '站点返回的限流(429)和服务器错误(5xx)次数', ['status']))
+SITE_BACKOFF = register(Gauge('newton_site_backoff', '是否正在因站点错误暂停访问(1为是)'))
+BUDGET_WAIT = register(Histogram('newton_site_budget_wait_seconds', '访问站点前等待请求预算和退避的时间', ['kind'], API_BUCKETS))
+CLOSE_RELEASE = register(Histogram('newton_close_release_seconds', '关闭请求成功到浏览器进程和调试端口释放的耗时', ['result']))
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+async def _handle_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b'\r\n', b'\n'):
+                break
+
+        parts = request_line.decode('latin-1').split()
+        path = parts[1] if len(parts) > 1 else '/'
+        if path.split('?')[0] in ('/metrics', '/'):
+            status, body = '200 OK', render_metrics().encode('utf-8')
+        else:
+            status, body = '404 Not Found', b'not found\n'
+
+        writer.write((f'HTTP/1.1 {status}\r\n'
+                      'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                      f'Content-Length: {len(body)}\r\n'
+                      'Connection: close\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+    except Exception as e:
+        log.debug(f"处理监控请求出错: {str(e)}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(config):
+    """按配置启动Prometheus文本格式的监控端点，未启用时返回None"""
+    if not config or not config.get('enabled'):
+        return None
+    host = config.get('host', '127.0.0.1')
+    port = config.get('port', 9108)
+    server = await asyncio.start_server(_handle_request, host, port)
+    log.info(f"监控端点已启动: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,199 @@
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_site')
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def default_chrome_path():
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+
+class MockMoreLogin:
+    """模拟MoreLogin本地API: 每个envId对应一个带远程调试端口的无头Chromium"""
+
+    def __init__(self, chrome_path, headless=True, invalid_env_ids=()):
+        self.chrome_path = chrome_path
+        self.headless = headless
+        self.invalid_env_ids = set(invalid_env_ids)
+        self.lock = threading.Lock()
+        self.browsers = {}
+        self.closing = {}
+
+    def env_key(self, data):
+        return str(data.get('envId') or data.get('uniqueId'))
+
+    def start(self, data):
+        key = self.env_key(data)
+        if key in self.invalid_env_ids or key in ('', 'None'):
+            return {'code': -1, 'msg': f'env not found: {key}', 'data': None}
+
+        with self.lock:
+            browser = self.browsers.get(key)
+            if browser and browser['process'].poll() is None:
+                return {'code': 0, 'msg': 'success', 'data': {'envId': key, 'debugPort': str(browser['port'])}}
+
+            port = find_free_port()
+            profile_dir = tempfile.mkdtemp(prefix=f'mock-env-{key}-')
+            args = [
+                self.chrome_path,
+                f'--remote-debugging-port={port}',
+                f'--user-data-dir={profile_dir}',
+                '--no-first-run',
+                '--no-default-browser-check',
+                '--disable-gpu',
+                'about:blank'
+            ]
+            if self.headless:
+                args.insert(1, '--headless=new')
+            process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.browsers[key] = {'process': process, 'port': port, 'profile': profile_dir}
+        return {'code': 0, 'msg': 'success', 'data': {'envId': key, 'debugPort': str(port)}}
+
+    def close(self, data):
+        key = self.env_key(data)
+        with self.lock:
+            browser = self.browsers.pop(key, None)
+        if browser is None:
+            return {'code': -1, 'msg': f'env not running: {key}', 'data': None}
+        # 与真实客户端一样先返回成功，浏览器进程在后台退出，退出前状态仍为运行中
+        with self.lock:
+            self.closing[key] = browser
+        threading.Thread(target=self._terminate, args=(browser, key), daemon=True).start()
+        return {'code': 0, 'msg': 'success', 'data': None}
+
+    def status(self, data):
+        key = self.env_key(data)
+        if key in self.invalid_env_ids:
+            return {'code': -1, 'msg': f'env not found: {key}', 'data': None}
+        with self.lock:
+            browser = self.browsers.get(key) or self.closing.get(key)
+            running = browser is not None and browser['process'].poll() is None
+        return {
+            'code': 0,
+            'msg': 'success',
+            'data': {
+                'envId': key,
+                'status': 'running' if running else 'stopped',
+                'localStatus': 'running' if running else 'stopped',
+                'debugPort': str(browser['port']) if running else ''
+            }
+        }
+
+    def _terminate(self, browser, key=None):
+        process = browser['process']
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(browser['profile'], ignore_errors=True)
+        with self.lock:
+            if key is not None and self.closing.get(key) is browser:
+                del self.closing[key]
+
+    def close_all(self):
+        with self.lock:
+            browsers = list(self.browsers.values())
+            self.browsers.clear()
+        for browser in browsers:
+            self._terminate(browser)
+
+
+def make_handler(morelogin):
+    routes = {
+        '/api/env/start': morelogin.start,
+        '/api/env/close': morelogin.close,
+        '/api/env/status': morelogin.status,
+        '/api/mock/state': lambda data: {'code': 0, 'msg': 'success', 'data': data}
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            handler = routes.get(path)
+            if handler is None:
+                self._send(404, b'{"code": 404, "msg": "not found"}', 'application/json')
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                data = {}
+            result = handler(data)
+            self._send(200, json.dumps(result).encode('utf-8'), 'application/json')
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path.rstrip('/') in ('/portal/rewards', '/portal', ''):
+                with open(os.path.join(SITE_DIR, 'rewards.html'), 'rb') as f:
+                    self._send(200, f.read(), 'text/html; charset=utf-8')
+            else:
+                self._send(404, b'not found', 'text/plain')
+
+    return Handler
+
+
+def start_mock_server(host='127.0.0.1', port=40000, chrome_path=None, headless=True, invalid_env_ids=()):
+    """在后台线程启动模拟服务，返回 (server, morelogin)，由调用方负责shutdown和close_all"""
+    morelogin = MockMoreLogin(chrome_path or default_chrome_path(), headless, invalid_env_ids)
+    server = ThreadingHTTPServer((host, port), make_handler(morelogin))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, morelogin
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟MoreLogin本地API和Newton奖励页面，用于压测调度逻辑')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=40000)
+    parser.add_argument('--chrome', help='Chromium可执行文件，默认使用playwright自带的chromium')
+    parser.add_argument('--headed', action='store_true', help='显示浏览器窗口')
+    parser.add_argument('--invalid-env', action='append', default=[], help='模拟无效的envId，可重复指定')
+    args = parser.parse_args()
+
+    server, morelogin = start_mock_server(args.host, args.port, args.chrome, not args.headed, args.invalid_env)
+    print(f"模拟MoreLogin API: http://{args.host}:{args.port}/api/env/start")
+    print(f"模拟奖励页面: http://{args.host}:{args.port}/portal/rewards")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        morelogin.close_all()
+
+
+if __name__ == '__main__':
+    main()
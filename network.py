@@ -0,0 +1,160 @@
+
+import re
+import time
+import weakref
+
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_NETWORK_CONFIG = {
+    'enabled': False,
+    'urlPattern': r'/api/',
+    'paths': {
+        'board': 'data.board',
+        'gameOver': 'data.gameOver',
+        'result': 'data.result',
+        'remainingPlays': 'data.remainingPlays',
+        'diceAvailable': 'data.diceAvailable'
+    },
+    'cellValues': {
+        'hidden': [None, -1, ''],
+        'flag': ['F', 'flag', -2],
+        'mine': ['X', 'mine', 9]
+    }
+}
+
+pageStates = weakref.WeakKeyDictionary()
+
+
+def extract(data, path):
+    """按 a.b.0.c 形式的路径取值，路径不存在时返回None"""
+    for key in path.split('.'):
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and key.lstrip('-').isdigit():
+            index = int(key)
+            data = data[index] if -len(data) <= index < len(data) else None
+        else:
+            return None
+        if data is None:
+            return None
+    return data
+
+
+def encode_board(board, cell_values):
+    """把接口返回的二维数组转成注入脚本使用的棋盘编码 (行之间用/分隔，'.'为未翻开)"""
+    if isinstance(board, str):
+        return board
+    lines = []
+    for row in board:
+        if isinstance(row, str):
+            lines.append(row)
+            continue
+        line = ''
+        for cell in row:
+            if cell in cell_values['hidden']:
+                line += '.'
+            elif cell in cell_values['mine']:
+                line += 'X'
+            elif cell in cell_values['flag']:
+                line += 'F'
+            elif isinstance(cell, int) and 0 <= cell <= 8:
+                line += str(cell)
+            else:
+                line += '.'
+        lines.append(line)
+    return '/'.join(lines)
+
+
+class GameStateListener:
+    """监听页面自身的JSON响应，按配置的路径读取棋盘、对局结果和剩余次数"""
+
+    def __init__(self, page, config):
+        self.page = page
+        self.config = config
+        self.pattern = re.compile(config['urlPattern'])
+        self.state = {}
+        self.updated_at = None
+        self.game_started_at = time.monotonic()
+
+    def attach(self):
+        self.page.on('response', self.on_response)
+        pageStates[self.page] = self
+        return self
+
+    def new_game(self):
+        self.game_started_at = time.monotonic()
+        for key in ('board', 'gameOver', 'result'):
+            self.state.pop(key, None)
+
+    async def on_response(self, response):
+        if not self.pattern.search(response.url):
+            return
+        try:
+            if 'json' not in (response.headers.get('content-type') or ''):
+                return
+            body = await response.json()
+        except Exception:
+            return
+
+        values = {}
+        for key, path in self.config['paths'].items():
+            if path:
+                value = extract(body, path)
+                if value is not None:
+                    values[key] = value
+        if not values:
+            return
+        if 'board' in values:
+            values['board'] = encode_board(values['board'], self.config['cellValues'])
+        self.state.update(values)
+        self.updated_at = time.monotonic()
+
+        if 'board' in values or 'gameOver' in values:
+            try:
+                await self.page.evaluate('(s) => window.minesweeperPushState && window.minesweeperPushState(s)', {
+                    'board': self.state.get('board'),
+                    'gameOver': bool(self.state.get('gameOver')),
+                    'result': self.state.get('result')
+                })
+            except Exception as e:
+                log.debug(f"推送棋盘状态失败: {str(e)}")
+
+    @staticmethod
+    def _int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def game_over(self):
+        """本局已结束时返回结果 (won/lost/unknown)，否则返回None"""
+        if self.updated_at is None or self.updated_at < self.game_started_at or not self.state.get('gameOver'):
+            return None
+        return self.state.get('result') or 'unknown'
+
+    def task_status(self):
+        """接口中读到的各任务次数；值缺失或无法解析的任务不返回，由预检按DOM判断"""
+        status = {}
+        remaining = self._int(self.state.get('remainingPlays'))
+        if remaining is not None:
+            status['minesweeper'] = {'available': remaining > 0, 'remaining': remaining, 'reason': 'network'}
+        if self.state.get('diceAvailable') is not None:
+            status['dice'] = {'available': bool(self.state['diceAvailable']), 'remaining': None, 'reason': 'network'}
+        return status
+
+
+def listen(page, config):
+    config = config or {}
+    # paths和cellValues只覆盖写出的键，其余保留默认值
+    config = {**DEFAULT_NETWORK_CONFIG, **config,
+              **{key: {**DEFAULT_NETWORK_CONFIG[key], **config.get(key, {})} for key in ('paths', 'cellValues')}}
+    if not config['enabled']:
+        return None
+    return GameStateListener(page, config).attach()
+
+
+def listener_for(page):
+    return pageStates.get(page)
@@ -0,0 +1,191 @@
+
+import argparse
+import json
+import random
+import sys
+import time
+
+
+DEFAULT_BOARDS = ['10x10']
+DEFAULT_MINES = [10, 15, 20]
+DEFAULT_TRIALS = 20000
+DEFAULT_TOP = 8
+BOOK_FILE = 'opening_book.json'
+
+
+def parse_board(text):
+    try:
+        rows, cols = text.lower().split('x')
+        rows, cols = int(rows), int(cols)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"棋盘尺寸格式错误: {text} (应为 行x列，例如 10x10)")
+    if rows < 2 or cols < 2:
+        raise argparse.ArgumentTypeError(f"棋盘尺寸过小: {text}")
+    return rows, cols
+
+
+def build_neighbors(rows, cols):
+    neighbors = []
+    for y in range(rows):
+        for x in range(cols):
+            cell = []
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    if dx == 0 and dy == 0:
+                        continue
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < cols and 0 <= ny < rows:
+                        cell.append(ny * cols + nx)
+            neighbors.append(cell)
+    return neighbors
+
+
+def reveal_sizes(mine_set, neighbors):
+    # 与游戏一致: 点到0会连锁翻开整片0区域及其边界数字
+    n = len(neighbors)
+    counts = [0] * n
+    for m in mine_set:
+        for nb in neighbors[m]:
+            counts[nb] += 1
+
+    sizes = [0] * n
+    seen = [False] * n
+    for start in range(n):
+        if start in mine_set or seen[start]:
+            continue
+        if counts[start] != 0:
+            sizes[start] = 1
+            continue
+
+        component = []
+        border = set()
+        stack = [start]
+        seen[start] = True
+        while stack:
+            cell = stack.pop()
+            component.append(cell)
+            for nb in neighbors[cell]:
+                if counts[nb] == 0:
+                    if not seen[nb]:
+                        seen[nb] = True
+                        stack.append(nb)
+                elif nb not in mine_set:
+                    border.add(nb)
+        size = len(component) + len(border)
+        for cell in component:
+            sizes[cell] = size
+    return sizes
+
+
+def simulate(rows, cols, mines, trials, first_click_safe, rng):
+    """对每个格子统计作为首次点击时的安全率、开局概率和期望翻开格数"""
+    n = rows * cols
+    if mines >= n:
+        raise ValueError(f"雷数 {mines} 必须小于格子总数 {n}")
+
+    neighbors = build_neighbors(rows, cols)
+    cells = list(range(n))
+    safe_count = [0] * n
+    open_count = [0] * n
+    reveal_total = [0] * n
+
+    # 均匀布雷中只统计该格安全的样本，等价于"首次点击必安全"规则下的条件分布
+    for _ in range(trials):
+        mine_set = set(rng.sample(cells, mines))
+        sizes = reveal_sizes(mine_set, neighbors)
+        for cell in cells:
+            if cell in mine_set:
+                continue
+            safe_count[cell] += 1
+            reveal_total[cell] += sizes[cell]
+            if sizes[cell] > 1:
+                open_count[cell] += 1
+
+    stats = []
+    for cell in cells:
+        safe = safe_count[cell]
+        p_safe = 1.0 if first_click_safe else safe / trials
+        expected = reveal_total[cell] / safe if safe else 0.0
+        p_open = open_count[cell] / safe if safe else 0.0
+        stats.append({
+            'x': cell % cols,
+            'y': cell // cols,
+            'pSafe': p_safe,
+            'pOpen': p_open,
+            'expectedReveal': expected,
+            'score': p_safe * expected
+        })
+    return stats
+
+
+def build_entry(rows, cols, mine_counts, trials, first_click_safe, top, rng):
+    per_density = [simulate(rows, cols, m, trials, first_click_safe, rng) for m in mine_counts]
+
+    merged = []
+    for i in range(rows * cols):
+        samples = [stats[i] for stats in per_density]
+        merged.append({
+            'x': samples[0]['x'],
+            'y': samples[0]['y'],
+            'pSafe': round(sum(s['pSafe'] for s in samples) / len(samples), 4),
+            'pOpen': round(sum(s['pOpen'] for s in samples) / len(samples), 4),
+            'expectedReveal': round(sum(s['expectedReveal'] for s in samples) / len(samples), 3),
+            'score': round(sum(s['score'] for s in samples) / len(samples), 4)
+        })
+
+    merged.sort(key=lambda s: (-s['score'], -s['pOpen'], s['y'], s['x']))
+    ranked = merged[:top]
+    return {
+        'rows': rows,
+        'cols': cols,
+        'mines': list(mine_counts),
+        'trials': trials,
+        'firstClickSafe': first_click_safe,
+        'cells': [[s['x'], s['y']] for s in ranked],
+        'stats': ranked
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线模拟扫雷开局，生成注入脚本使用的开局表')
+    parser.add_argument('--board', action='append', type=parse_board,
+                        help='棋盘尺寸 行x列，可重复指定 (默认 10x10)')
+    parser.add_argument('--mines', action='append', type=int,
+                        help='雷数，可重复指定，多个雷数的结果取平均 (默认 10/15/20)')
+    parser.add_argument('--trials', type=int, default=DEFAULT_TRIALS, help='每种配置的模拟局数')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='每种棋盘保留的候选开局格数')
+    parser.add_argument('--first-click-safe', action='store_true',
+                        help='游戏保证首次点击不是雷时使用')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子，用于复现结果')
+    parser.add_argument('--output', default=BOOK_FILE, help='输出文件')
+    args = parser.parse_args()
+
+    boards = args.board or [parse_board(b) for b in DEFAULT_BOARDS]
+    mine_counts = args.mines or DEFAULT_MINES
+    rng = random.Random(args.seed)
+
+    book = {'version': 1, 'generatedAt': int(time.time()), 'boards': {}}
+    for rows, cols in boards:
+        key = f"{rows}x{cols}"
+        started = time.time()
+        try:
+            entry = build_entry(rows, cols, mine_counts, args.trials, args.first_click_safe, args.top, rng)
+        except ValueError as e:
+            print(f"跳过棋盘 {key}: {str(e)}")
+            continue
+        book['boards'][key] = entry
+        best = entry['stats'][0]
+        print(f"棋盘 {key} 模拟完成 ({time.time() - started:.1f} 秒)，最佳开局 ({best['x']}, {best['y']}) "
+              f"安全率 {best['pSafe']:.3f} 开局率 {best['pOpen']:.3f} 期望翻开 {best['expectedReveal']:.1f}")
+
+    if not book['boards']:
+        print("没有生成任何开局表")
+        sys.exit(1)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(book, f, ensure_ascii=False, indent=2)
+    print(f"开局表已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
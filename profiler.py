@@ -0,0 +1,195 @@
+
+import asyncio
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import time
+
+from logger import get_logger, uniqueIdVar
+from replay import percentile
+from stages import currentTracker
+
+
+log = get_logger()
+
+DEFAULT_PROFILE_CONFIG = {
+    'dir': 'profiles',
+    'lagIntervalMs': 100,
+    'slowCallbackMs': 20,
+    'top': 20,
+    'cprofile': False
+}
+
+
+def context_labels(context):
+    """从回调或任务的contextvars中取出环境和阶段，用于把耗时归到具体环境/阶段"""
+    if context is None:
+        return '-', '-'
+    tracker = context.get(currentTracker, None)
+    return context.get(uniqueIdVar, '-'), (tracker.stage if tracker and tracker.stage else '-')
+
+
+def callback_label(handle):
+    callback = getattr(handle, '_callback', None)
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        frame = getattr(coro, 'cr_frame', None)
+        location = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}" if frame else ''
+        return f"{getattr(coro, '__qualname__', repr(coro))} {location}".strip()
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+class Profiler:
+    """--profile模式: 采样事件循环延迟、记录最慢的同步回调、统计每个环境每个阶段的Playwright/CDP调用次数和耗时"""
+
+    def __init__(self, config=None, cprofile=None):
+        self.config = {**DEFAULT_PROFILE_CONFIG, **(config or {})}
+        if cprofile is not None:
+            self.config['cprofile'] = cprofile
+        self.lag = []
+        self.slow = []
+        self.blocking = {}
+        self.calls = {}
+        self.lag_task = None
+        self.cprofile = None
+        self.patches = []
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._patch_handle()
+        self._patch_channel()
+        self.lag_task = asyncio.create_task(self._sample_lag())
+        if self.config['cprofile']:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        log.info("性能分析已开启")
+
+    def stop(self):
+        if self.cprofile:
+            self.cprofile.disable()
+        if self.lag_task:
+            self.lag_task.cancel()
+        for owner, name, original in reversed(self.patches):
+            setattr(owner, name, original)
+        self.patches = []
+        return self.write_report()
+
+    async def _sample_lag(self):
+        interval = self.config['lagIntervalMs'] / 1000
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.lag.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def _patch(self, owner, name, replacement):
+        self.patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def _patch_handle(self):
+        # 所有call_soon回调和任务的每一步都经过Handle._run，超过阈值的记录下来
+        profiler = self
+        original = asyncio.events.Handle._run
+        threshold = self.config['slowCallbackMs']
+
+        def _run(handle):
+            started = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                if elapsed >= threshold:
+                    profiler._record_slow(handle, elapsed)
+
+        self._patch(asyncio.events.Handle, '_run', _run)
+
+    def _record_slow(self, handle, elapsed):
+        uniqueId, stage = context_labels(getattr(handle, '_context', None))
+        label = callback_label(handle)
+        entry = (elapsed, uniqueId, stage, label)
+        if len(self.slow) < self.config['top']:
+            heapq.heappush(self.slow, entry)
+        else:
+            heapq.heappushpop(self.slow, entry)
+        total = self.blocking.setdefault((stage, label), [0, 0.0])
+        total[0] += 1
+        total[1] += elapsed
+
+    def _patch_channel(self):
+        # 每个page.evaluate/click/goto等调用最终都是一次发往driver的请求，在这里统一计数
+        try:
+            from playwright._impl._connection import Channel
+        except ImportError:
+            log.warning("无法统计CDP调用: 当前playwright版本不支持")
+            return
+        profiler = self
+        original = Channel._inner_send
+
+        async def _inner_send(channel, method, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await original(channel, method, *args, **kwargs)
+            finally:
+                uniqueId = uniqueIdVar.get()
+                tracker = currentTracker.get()
+                stage = tracker.stage if tracker and tracker.stage else '-'
+                entry = profiler.calls.setdefault((uniqueId, stage, method), [0, 0.0])
+                entry[0] += 1
+                entry[1] += (time.perf_counter() - started) * 1000
+
+        self._patch(Channel, '_inner_send', _inner_send)
+
+    def report(self):
+        lines = []
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        lines.append(f"运行时长: {elapsed:.1f} 秒")
+        lines.append(f"\n== 事件循环延迟 (每 {self.config['lagIntervalMs']} ms 采样，{len(self.lag)} 次) ==")
+        lines.append(f"p50 {percentile(self.lag, 50):.1f} ms  p99 {percentile(self.lag, 99):.1f} ms  "
+                     f"最大 {max(self.lag or [0]):.1f} ms")
+
+        lines.append(f"\n== 阻塞事件循环的位置 (单次 >= {self.config['slowCallbackMs']} ms，按总耗时排序) ==")
+        for (stage, label), (count, total) in sorted(self.blocking.items(), key=lambda kv: -kv[1][1])[:self.config['top']]:
+            lines.append(f"{total:9.1f} ms  {count:5d} 次  阶段 {stage:<12} {label}")
+
+        lines.append("\n== 最慢的单次同步回调 ==")
+        for elapsed_ms, uniqueId, stage, label in sorted(self.slow, reverse=True):
+            lines.append(f"{elapsed_ms:9.1f} ms  环境 {uniqueId:<6} 阶段 {stage:<12} {label}")
+
+        by_stage = {}
+        by_method = {}
+        envs = set()
+        for (uniqueId, stage, method), (count, total) in self.calls.items():
+            envs.add(uniqueId)
+            for key, table in ((stage, by_stage), ((stage, method), by_method)):
+                entry = table.setdefault(key, [0, 0.0])
+                entry[0] += count
+                entry[1] += total
+        env_count = max(1, len(envs - {'-'}))
+        lines.append(f"\n== CDP调用 (按阶段，{env_count} 个环境的平均值) ==")
+        for stage, (count, total) in sorted(by_stage.items(), key=lambda kv: -kv[1][1]):
+            lines.append(f"{stage:<14} 每环境 {count / env_count:7.1f} 次  {total / env_count:9.1f} ms  "
+                         f"平均 {total / count:7.1f} ms/次")
+        lines.append("\n== CDP调用 (按阶段和方法，总耗时排序) ==")
+        for (stage, method), (count, total) in sorted(by_method.items(), key=lambda kv: -kv[1][1])[:self.config['top'] * 2]:
+            lines.append(f"{stage:<14} {method:<28} {count:6d} 次  {total:9.1f} ms  平均 {total / count:7.1f} ms")
+
+        if self.cprofile:
+            stream = io.StringIO()
+            pstats.Stats(self.cprofile, stream=stream).sort_stats('cumulative').print_stats(self.config['top'] * 2)
+            lines.append("\n== cProfile (累计耗时) ==")
+            lines.append(stream.getvalue())
+        return '\n'.join(lines)
+
+    def write_report(self):
+        os.makedirs(self.config['dir'], exist_ok=True)
+        base = os.path.join(self.config['dir'], 'profile-' + time.strftime('%Y%m%d-%H%M%S'))
+        text = self.report()
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        if self.cprofile:
+            self.cprofile.dump_stats(base + '.pstats')
+        log.info(f"性能分析报告已保存到 {base}.txt\n{text}")
+        return base + '.txt'
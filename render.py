@@ -0,0 +1,63 @@
+
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_RENDER_CONFIG = {
+    'reduced': False,
+    'viewport': {'width': 960, 'height': 720},
+    'settleMs': 300
+}
+
+# 动画和过渡缩短到0.01ms而不是0: 时长为0时不会触发transitionend/animationend，依赖这些事件关闭弹窗的页面会卡住
+REDUCED_MOTION_SCRIPT = '''(() => {
+    const css = `*, *::before, *::after {
+        animation-duration: 0.01ms !important;
+        animation-delay: 0s !important;
+        animation-iteration-count: 1 !important;
+        transition-duration: 0.01ms !important;
+        transition-delay: 0s !important;
+        scroll-behavior: auto !important;
+    }`;
+    const install = () => {
+        if (document.getElementById('__nf_reduced_motion')) return;
+        const style = document.createElement('style');
+        style.id = '__nf_reduced_motion';
+        style.textContent = css;
+        (document.head || document.documentElement).appendChild(style);
+    };
+    if (document.documentElement) install();
+    else document.addEventListener('readystatechange', install, {once: true});
+})()'''
+
+_render_config = dict(DEFAULT_RENDER_CONFIG)
+
+
+def configure_render(config=None):
+    _render_config.update(config or {})
+
+
+def reduced():
+    return _render_config['reduced']
+
+
+def settle_seconds():
+    return _render_config['settleMs'] / 1000
+
+
+async def install_reduced_motion(context):
+    """精简渲染模式: 每个新文档加载时注入关闭动画和过渡的样式"""
+    if reduced():
+        await context.add_init_script(script=REDUCED_MOTION_SCRIPT)
+
+
+async def reduce_page(page):
+    """在打开页面之前缩小视口并声明prefers-reduced-motion，减少每个浏览器的绘制开销"""
+    if not reduced():
+        return
+    try:
+        await page.set_viewport_size(_render_config['viewport'])
+        await page.emulate_media(reduced_motion='reduce')
+    except Exception as e:
+        log.debug(f"设置精简渲染失败: {str(e)}")
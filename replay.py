@@ -0,0 +1,129 @@
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from playwright.async_api import async_playwright
+
+from traces import read_traces, group_games, known_mines
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def replay_games(games, inject_script, opening_book):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.set_content('<html><body></body></html>')
+        await page.evaluate('''(book) => {
+            window.minesweeperNoAutostart = true;
+            window.minesweeperOpeningBook = book;
+        }''', opening_book)
+        await page.evaluate(inject_script)
+
+        for game in games:
+            boards = [d['board'] for d in game['decisions']]
+            game['replayed'] = await page.evaluate('(boards) => boards.map(b => window.minesweeperSolve(b))', boards)
+        await browser.close()
+
+
+def summarize(games):
+    summary = {
+        'games': len(games),
+        'won': 0,
+        'lost': 0,
+        'decisions': 0,
+        'sameMove': 0,
+        'recordedMineHits': 0,
+        'replayedMineHits': 0,
+        'reasons': {},
+        'solveMs': []
+    }
+    for game in games:
+        final = game['final'] or {}
+        if final.get('result') in ('won', 'lost'):
+            summary[final['result']] += 1
+        mines = known_mines(final.get('board'))
+
+        game['replayedMineHits'] = 0
+        for decision, replayed in zip(game['decisions'], game.get('replayed', [])):
+            summary['decisions'] += 1
+            recorded_move = tuple(decision['move'])
+            replayed_move = tuple(replayed['move']) if replayed.get('move') else None
+            if recorded_move == replayed_move:
+                summary['sameMove'] += 1
+            if recorded_move in mines:
+                summary['recordedMineHits'] += 1
+            if replayed_move in mines:
+                summary['replayedMineHits'] += 1
+                game['replayedMineHits'] += 1
+            reason = replayed.get('reason') or 'unknown'
+            summary['reasons'][reason] = summary['reasons'].get(reason, 0) + 1
+            summary['solveMs'].append(replayed.get('elapsedMs', 0.0))
+    return summary
+
+
+def save_losses(games, directory):
+    os.makedirs(directory, exist_ok=True)
+    saved = 0
+    for game in games:
+        final = game['final'] or {}
+        if final.get('result') != 'lost':
+            continue
+        path = os.path.join(directory, f"loss-{game['uniqueId']}-{game['game']}.ndjson")
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in game['decisions'] + [final]:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        saved += 1
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用当前注入脚本离线重放扫雷决策记录')
+    parser.add_argument('paths', nargs='+', help='trace文件或目录 (*.ndjson)')
+    parser.add_argument('--inject', default='inject.js', help='要测试的注入脚本')
+    parser.add_argument('--book', default='opening_book.json', help='开局表文件，不存在时不使用')
+    parser.add_argument('--save-losses', metavar='DIR', help='把失败的对局保存为回归用例')
+    parser.add_argument('--fail-on-mine', action='store_true', help='重放时选中已知地雷则以非0退出，用于回归检查')
+    args = parser.parse_args()
+
+    games = [g for g in group_games(read_traces(args.paths)) if g['decisions']]
+    if not games:
+        print("没有找到可重放的对局")
+        sys.exit(1)
+
+    with open(args.inject, 'r', encoding='utf-8') as f:
+        inject_script = f.read()
+    opening_book = None
+    if args.book and os.path.exists(args.book):
+        with open(args.book, 'r', encoding='utf-8') as f:
+            opening_book = json.load(f)
+
+    asyncio.run(replay_games(games, inject_script, opening_book))
+    summary = summarize(games)
+
+    decisions = summary['decisions'] or 1
+    print(f"对局: {summary['games']} (胜 {summary['won']} / 负 {summary['lost']})，决策: {summary['decisions']}")
+    print(f"与记录一致的决策: {summary['sameMove']} ({summary['sameMove'] / decisions:.1%})")
+    print(f"选中已知地雷: 记录 {summary['recordedMineHits']} 次，重放 {summary['replayedMineHits']} 次")
+    print(f"单步求解耗时: 平均 {sum(summary['solveMs']) / decisions:.2f} ms，"
+          f"p95 {percentile(summary['solveMs'], 95):.2f} ms，最大 {max(summary['solveMs'] or [0]):.2f} ms")
+    print("决策来源: " + ', '.join(f"{k} {v}" for k, v in sorted(summary['reasons'].items(), key=lambda kv: -kv[1])))
+
+    if args.save_losses:
+        print(f"已保存 {save_losses(games, args.save_losses)} 个失败对局到 {args.save_losses}")
+
+    if args.fail_on_mine and summary['replayedMineHits'] > 0:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
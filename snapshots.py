@@ -0,0 +1,151 @@
+
+import asyncio
+import collections
+import json
+import os
+import re
+import shutil
+import time
+import traceback
+import weakref
+
+from lifecycle import wake
+from logger import get_logger
+
+
+log = get_logger()
+
+DEFAULT_SNAPSHOT_CONFIG = {
+    'enabled': True,
+    'dir': 'snapshots',
+    'consoleLines': 100,
+    'maxDomBytes': 300000,
+    'screenshotQuality': 60,
+    'maxPerEnv': 5,
+    'maxBytesPerEnv': 20 * 1024 * 1024,
+    'maxConcurrent': 2,
+    'timeoutSeconds': 15
+}
+
+pageConsoles = weakref.WeakKeyDictionary()
+
+_snapshot_config = dict(DEFAULT_SNAPSHOT_CONFIG)
+_semaphore = None
+
+
+def configure_snapshots(config=None):
+    global _semaphore
+    _snapshot_config.update(config or {})
+    _semaphore = None
+
+
+def watch_console(page):
+    """为页面保留最近N条console消息和页面异常，失败快照时写入，平时只做一次追加"""
+    if not _snapshot_config['enabled']:
+        return
+    lines = collections.deque(maxlen=_snapshot_config['consoleLines'])
+    pageConsoles[page] = lines
+    page.on('console', lambda message: lines.append(f"{time.strftime('%H:%M:%S')} {message.type} {message.text}"))
+    page.on('pageerror', lambda error: lines.append(f"{time.strftime('%H:%M:%S')} pageerror {error}"))
+
+
+def trim_dom(html, max_bytes):
+    """去掉脚本、样式和内联图片，超过上限时截断"""
+    html = re.sub(r'(<script\b[^>]*>).*?(</script>)', r'\1\2', html, flags=re.S | re.I)
+    html = re.sub(r'(<style\b[^>]*>).*?(</style>)', r'\1\2', html, flags=re.S | re.I)
+    html = re.sub(r'data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+', 'data:...', html)
+    data = html.encode('utf-8')
+    if len(data) > max_bytes:
+        data = data[:max_bytes] + '\n<!-- truncated -->'.encode('utf-8')
+    return data
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def prune(env_dir, max_count, max_bytes):
+    """每个环境只保留最近的快照: 超过数量或总大小上限时从最旧的开始删除，最新的一份总是保留"""
+    snapshots = sorted(name for name in os.listdir(env_dir) if os.path.isdir(os.path.join(env_dir, name)))
+    sizes = {name: dir_size(os.path.join(env_dir, name)) for name in snapshots}
+    total = sum(sizes.values())
+    while len(snapshots) > 1 and (len(snapshots) > max_count or total > max_bytes):
+        oldest = snapshots.pop(0)
+        total -= sizes[oldest]
+        shutil.rmtree(os.path.join(env_dir, oldest), ignore_errors=True)
+
+
+def write_snapshot(config, uniqueId, meta, pages):
+    """在线程中执行: DOM裁剪、写文件和清理旧快照都不占用事件循环"""
+    env_dir = os.path.join(config['dir'], 'env-' + re.sub(r'[^\w.-]', '_', str(uniqueId)))
+    now = time.time()
+    path = os.path.join(env_dir, f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}-{meta['kind']}")
+    os.makedirs(path, exist_ok=True)
+    for index, (url, screenshot, html, console) in enumerate(pages):
+        prefix = os.path.join(path, f'page{index}')
+        meta.setdefault('pages', []).append(url)
+        if screenshot:
+            with open(prefix + '.jpg', 'wb') as f:
+                f.write(screenshot)
+        if html is not None:
+            with open(prefix + '.html', 'wb') as f:
+                f.write(trim_dom(html, config['maxDomBytes']))
+        if console:
+            with open(prefix + '-console.log', 'w', encoding='utf-8') as f:
+                f.write('\n'.join(console) + '\n')
+    with open(os.path.join(path, 'failure.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    prune(env_dir, config['maxPerEnv'], config['maxBytesPerEnv'])
+    return path
+
+
+async def grab_page(page, config):
+    screenshot = html = None
+    await wake(page)
+    try:
+        screenshot = await page.screenshot(type='jpeg', quality=config['screenshotQuality'])
+    except Exception as e:
+        log.debug(f"快照截图失败: {str(e)}")
+    try:
+        html = await page.content()
+    except Exception as e:
+        log.debug(f"快照读取DOM失败: {str(e)}")
+    return page.url, screenshot, html, list(pageConsoles.get(page, ()))
+
+
+async def capture_failure(context, failure, uniqueId, envId):
+    """环境失败时保存每个标签页的截图、裁剪后的DOM和最近的console消息，返回快照目录"""
+    global _semaphore
+    config = _snapshot_config
+    if not config['enabled'] or context is None:
+        return None
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(config['maxConcurrent'])
+
+    meta = {
+        'uniqueId': uniqueId,
+        'envId': envId,
+        'kind': failure.kind,
+        'stage': failure.stage,
+        'message': str(failure),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'traceback': ''.join(traceback.format_exception(failure))
+    }
+    try:
+        # 同时截图的环境数量有上限，截图本身也有时限，避免拖慢正常运行的环境
+        async with _semaphore, asyncio.timeout(config['timeoutSeconds']):
+            pages = [page for page in context.pages if page in pageConsoles] or context.pages
+            grabbed = [await grab_page(page, config) for page in pages]
+        path = await asyncio.to_thread(write_snapshot, config, uniqueId, meta, grabbed)
+    except Exception as e:
+        log.warning(f"保存失败快照出错: {str(e)}")
+        return None
+    log.info(f"失败快照已保存到 {path}")
+    return path
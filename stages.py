@@ -0,0 +1,168 @@
+
+import asyncio
+import contextlib
+import contextvars
+import time
+
+from failures import DeadlineExceeded
+from metrics import STAGE_LATENCY, ERRORS
+
+
+currentTracker = contextvars.ContextVar('stageTracker', default=None)
+
+DEFAULT_DEADLINE_CONFIG = {
+    'sessionSeconds': 1200,
+    'stageSeconds': {
+        'start_env': 120,
+        'connect': 60,
+        'navigate': 120,
+        'preflight': 30,
+        'play_now': 60,
+        'max_modal': 60,
+        'continue': 60,
+        'game_load': 60,
+        'minesweeper': 300,
+        'return_home': 60,
+        'dice': 180
+    },
+    'timeoutsMs': {
+        'goto': 60000,
+        'loadState': 10000,
+        'selector': 5000
+    }
+}
+
+_deadline_config = dict(DEFAULT_DEADLINE_CONFIG)
+
+
+def configure_deadlines(config=None):
+    config = config or {}
+    _deadline_config.update(config)
+    # 只覆盖配置中写出的阶段和超时，其余保留默认值
+    for key in ('stageSeconds', 'timeoutsMs'):
+        _deadline_config[key] = {**DEFAULT_DEADLINE_CONFIG[key], **config.get(key, {})}
+
+
+def timeout_ms(name):
+    """Playwright单次等待的超时(毫秒)，统一在deadlines.timeoutsMs中配置"""
+    return _deadline_config['timeoutsMs'].get(name, DEFAULT_DEADLINE_CONFIG['timeoutsMs'][name])
+
+
+class StageTracker:
+    """记录一个环境会话内各阶段的耗时，进入下一阶段时自动结束上一阶段"""
+
+    def __init__(self, deadline=None):
+        self.stage = None
+        self.started = None
+        self.timings = {}
+        self.errors = {}
+        self.counts = {}
+        self.deadline = deadline
+        self.timeout = None
+        self.limit = None
+
+    def enter(self, name):
+        self.finish()
+        self.stage = name
+        self.started = time.monotonic()
+        self._reschedule()
+
+    def _reschedule(self):
+        # 当前阶段的截止时间为 min(会话截止时间, 进入阶段时间 + 阶段预算)，离开阶段后恢复为会话截止时间
+        if self.timeout is None:
+            return
+        when = self.deadline
+        self.limit = ('session', _deadline_config['sessionSeconds'])
+        budget = _deadline_config['stageSeconds'].get(self.stage) if self.stage else None
+        if budget is not None:
+            stage_deadline = asyncio.get_running_loop().time() + budget
+            if stage_deadline < when:
+                when = stage_deadline
+                self.limit = ('stage', budget)
+        self.timeout.reschedule(when)
+
+    @contextlib.asynccontextmanager
+    async def bounded(self):
+        """限制当前asyncio任务的运行时间，超时后取消任务并抛出DeadlineExceeded"""
+        if self.deadline is None:
+            self.deadline = asyncio.get_running_loop().time() + _deadline_config['sessionSeconds']
+        try:
+            async with asyncio.timeout_at(self.deadline) as timeout:
+                self.timeout = timeout
+                self._reschedule()
+                yield
+        except TimeoutError as e:
+            if not timeout.expired():
+                raise
+            kind, seconds = self.limit
+            message = (f"阶段 {self.stage} 超过预算 {seconds} 秒" if kind == 'stage'
+                       else f"环境会话超过总时限 {seconds} 秒")
+            raise DeadlineExceeded(message, self.stage) from e
+        finally:
+            self.timeout = None
+
+    def finish(self):
+        if self.stage is None:
+            return
+        elapsed = time.monotonic() - self.started
+        self.timings[self.stage] = self.timings.get(self.stage, 0.0) + elapsed
+        STAGE_LATENCY.observe(elapsed, stage=self.stage)
+        self.stage = None
+        self.started = None
+        self._reschedule()
+
+    def error(self, stage=None):
+        stage = stage or self.stage or 'unknown'
+        self.errors[stage] = self.errors.get(stage, 0) + 1
+        ERRORS.inc(stage=stage)
+
+
+def start_session():
+    tracker = StageTracker()
+    currentTracker.set(tracker)
+    return tracker
+
+
+def fork_session():
+    """在并行任务里调用: 新的记录器只跟踪本任务的当前阶段，耗时和错误汇总到所属环境的会话"""
+    parent = currentTracker.get()
+    tracker = StageTracker()
+    if parent is not None:
+        tracker.timings = parent.timings
+        tracker.errors = parent.errors
+        tracker.counts = parent.counts
+        tracker.deadline = parent.deadline
+    currentTracker.set(tracker)
+    return tracker
+
+
+def current_stage():
+    tracker = currentTracker.get()
+    return tracker.stage if tracker else None
+
+
+def enter_stage(name):
+    tracker = currentTracker.get()
+    if tracker is not None:
+        tracker.enter(name)
+
+
+def leave_stage():
+    tracker = currentTracker.get()
+    if tracker is not None:
+        tracker.finish()
+
+
+def count(name, n=1):
+    """会话内的计数(对局胜负、掷骰次数等)，会话结束后写入历史记录"""
+    tracker = currentTracker.get()
+    if tracker is not None:
+        tracker.counts[name] = tracker.counts.get(name, 0) + n
+
+
+def record_error(stage=None):
+    tracker = currentTracker.get()
+    if tracker is not None:
+        tracker.error(stage)
+    else:
+        ERRORS.inc(stage=stage or 'unknown')
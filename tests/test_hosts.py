@@ -0,0 +1,40 @@
+import asyncio
+
+import main
+from fleet import Fleet, debug_address, env_key
+
+
+REMOTE = 'http://192.168.1.20:40000'
+ENV = {'uniqueId': 1, 'envId': 'env-1'}
+
+
+def test_debug_address_uses_api_host():
+    assert debug_address(REMOTE, 9222) == '192.168.1.20:9222'
+    assert debug_address('http://127.0.0.1:40000', 9222) == '127.0.0.1:9222'
+    assert debug_address('http://[fd00::5]:40000', 9222) == '[fd00::5]:9222'
+
+
+def test_fleet_attaches_on_remote_host():
+    fleet = Fleet({'attachRunning': True}, REMOTE)
+    fleet.status[env_key(ENV)] = {'state': 'running', 'debugPort': 9333, 'at': 0}
+    assert fleet.debug_url(ENV) == '192.168.1.20:9333'
+
+
+def test_start_env_returns_remote_endpoint(monkeypatch):
+    async def api_post(baseUrl, path, data, appId, secretKey):
+        return {'debugPort': 9444}
+    monkeypatch.setattr(main, 'apiPost', api_post)
+    debugUrl = asyncio.run(main.startEnv('env-1', 1, 'app', 'secret', REMOTE))
+    assert debugUrl == '192.168.1.20:9444'
+
+
+def test_release_probe_checks_remote_host(monkeypatch):
+    probed = []
+
+    async def open_connection(host, port):
+        probed.append((host, port))
+        raise OSError('refused')
+    monkeypatch.setattr(asyncio, 'open_connection', open_connection)
+    assert asyncio.run(main.portOpen('192.168.1.20:9444')) is False
+    assert asyncio.run(main.portOpen('[fd00::5]:9444')) is False
+    assert probed == [('192.168.1.20', 9444), ('fd00::5', 9444)]
@@ -0,0 +1,23 @@
+from inventory import Inventory
+
+
+def envs(*tag_lists):
+    return [{'uniqueId': index + 1, 'envId': f'env-{index + 1}', 'tags': tags} for index, tags in enumerate(tag_lists)]
+
+
+def selected(inventory, tags):
+    return [env['envId'] for env in inventory.select(tags=tags)]
+
+
+def test_resync_drops_removed_tags(tmp_path):
+    inventory = Inventory(str(tmp_path / 'inventory.db'))
+    inventory.sync(envs(['vip', 'eu'], ['vip']))
+    assert selected(inventory, ['vip']) == ['env-1', 'env-2']
+
+    inventory.sync(envs(['eu'], []))
+    assert selected(inventory, ['vip']) == []
+    assert selected(inventory, ['eu']) == ['env-1']
+
+    inventory.sync(envs(['eu'], ['vip']))
+    assert selected(inventory, ['vip']) == ['env-2']
+    inventory.close()
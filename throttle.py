@@ -0,0 +1,199 @@
+
+import asyncio
+import re
+import time
+import weakref
+
+from logger import get_logger
+from metrics import SITE_ERRORS, SITE_BACKOFF, BUDGET_WAIT
+
+
+log = get_logger()
+
+DEFAULT_THROTTLE_CONFIG = {
+    'enabled': True,
+    'urlPattern': r'magicnewton\.com',
+    'buckets': {
+        'navigate': {'rate': 0.5, 'burst': 3},
+        'action': {'rate': 5, 'burst': 10}
+    },
+    'errorStatuses': [429, 500, 502, 503, 504],
+    'backoff': {
+        'initialSeconds': 5,
+        'maxSeconds': 60,
+        'factor': 2,
+        'resetSeconds': 300
+    },
+    'navigateAttempts': 3
+}
+
+# 退避期间暂停注入脚本的点击，页面关闭后自动移除
+sitePages = weakref.WeakSet()
+
+
+class TokenBucket:
+    """本机所有环境共用的请求预算: 每秒补充rate个，最多积攒burst个；按到达顺序发放"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self):
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Backoff:
+    """站点返回429或5xx时所有环境一起暂停；短时间内再次触发时等待时间按factor倍增加"""
+
+    def __init__(self, config):
+        self.config = config
+        self.until = 0.0
+        self.delay = 0.0
+        self.tripped_at = None
+
+    def remaining(self):
+        return max(0.0, self.until - time.monotonic())
+
+    def trip(self, status, retry_after=None):
+        now = time.monotonic()
+        if self.remaining() > 0:
+            # 退避期间其他环境收到的错误不再叠加，只按Retry-After延长
+            if retry_after is not None:
+                self.until = max(self.until, now + min(retry_after, self.config['maxSeconds']))
+            return False
+        if self.tripped_at is not None and now - self.tripped_at < self.config['resetSeconds']:
+            delay = min(self.delay * self.config['factor'], self.config['maxSeconds'])
+        else:
+            delay = self.config['initialSeconds']
+        if retry_after is not None:
+            delay = min(max(delay, retry_after), self.config['maxSeconds'])
+        self.delay = delay
+        self.tripped_at = now
+        self.until = max(self.until, now + delay)
+        SITE_BACKOFF.set(1)
+        log.warning(f"站点返回 {status}，所有环境暂停访问 {delay:.0f} 秒")
+        return True
+
+    async def wait(self):
+        while (remaining := self.remaining()) > 0:
+            SITE_BACKOFF.set(1)
+            await asyncio.sleep(remaining)
+        SITE_BACKOFF.set(0)
+
+
+_throttle_config = dict(DEFAULT_THROTTLE_CONFIG)
+_buckets = {}
+_backoff = None
+
+
+def configure_throttle(config=None):
+    global _backoff
+    _throttle_config.update(config or {})
+    _buckets.clear()
+    _backoff = Backoff({**DEFAULT_THROTTLE_CONFIG['backoff'], **_throttle_config['backoff']})
+
+
+def backoff():
+    global _backoff
+    if _backoff is None:
+        _backoff = Backoff(dict(DEFAULT_THROTTLE_CONFIG['backoff']))
+    return _backoff
+
+
+async def acquire(kind):
+    """访问站点之前调用: 先等待全局退避结束，再从对应的预算中取一个令牌"""
+    if not _throttle_config['enabled']:
+        return
+    bucket = _buckets.get(kind)
+    if bucket is None:
+        settings = {**DEFAULT_THROTTLE_CONFIG['buckets'], **_throttle_config['buckets']}[kind]
+        bucket = _buckets[kind] = TokenBucket(settings['rate'], settings['burst'])
+    started = time.monotonic()
+    await backoff().wait()
+    await bucket.take()
+    # 取到令牌时可能又进入了退避
+    await backoff().wait()
+    BUDGET_WAIT.observe(time.monotonic() - started, kind=kind)
+
+
+async def throttled(kind, awaitable):
+    await acquire(kind)
+    return await awaitable
+
+
+def retry_after(response):
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def navigate_attempts():
+    return _throttle_config['navigateAttempts'] if _throttle_config['enabled'] else 1
+
+
+def is_error(status):
+    return status in _throttle_config['errorStatuses']
+
+
+def observe(status, url, retry_after_seconds=None):
+    """记录站点响应，429/5xx触发全局退避并让各页面里的注入脚本暂停点击"""
+    if not _throttle_config['enabled'] or not is_error(status) or not re.search(_throttle_config['urlPattern'], url):
+        return False
+    SITE_ERRORS.inc(status=str(status))
+    until = backoff().until
+    backoff().trip(status, retry_after_seconds)
+    # 新的退避和Retry-After延长都要通知到页面
+    if backoff().until > until:
+        for page in list(sitePages):
+            apply_backoff(page)
+    return True
+
+
+def apply_backoff(page):
+    remaining = backoff().remaining()
+    if remaining > 0:
+        asyncio.ensure_future(pause_page(page, int(remaining * 1000)))
+
+
+async def pause_page(page, duration_ms):
+    try:
+        await page.evaluate('(ms) => { window.minesweeperPausedUntil = Date.now() + ms; }', duration_ms)
+    except Exception as e:
+        log.debug(f"通知页面暂停失败: {str(e)}")
+
+
+def watch_site(page):
+    """监听页面的所有响应，站点的限流和服务器错误会让所有环境一起退避"""
+    if not _throttle_config['enabled']:
+        return
+    sitePages.add(page)
+    page.on('response', lambda response: observe(response.status, response.url, retry_after(response)))
+    # 退避期间打开或跳转的页面同样暂停，window上的标记在每次加载新文档后重新设置
+    apply_backoff(page)
+    page.on('domcontentloaded', lambda _: apply_backoff(page))
+
+
+async def expose_budget(page):
+    """注入脚本每次点击格子之前调用window.minesweeperAcquire()，与其他操作共用action预算"""
+    if not _throttle_config['enabled']:
+        return
+    try:
+        await page.expose_function('minesweeperAcquire', lambda: acquire('action'))
+    except Exception as e:
+        log.debug(f"注册点击预算函数失败: {str(e)}")
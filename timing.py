@@ -0,0 +1,175 @@
+
+import asyncio
+import json
+import os
+import socket
+import time
+
+from logger import get_logger, uniqueIdVar
+from replay import percentile
+from stages import DEFAULT_DEADLINE_CONFIG, timeout_ms
+
+
+log = get_logger()
+
+DEFAULT_TIMING_CONFIG = {
+    'profile': 'learned',
+    'path': 'timing.json',
+    'window': 200,
+    'envWindow': 30,
+    'minSamples': 20,
+    'percentile': 99,
+    'margin': 1.5,
+    'maxFactor': 2,
+    'pollMs': {'min': 100, 'max': 1000}
+}
+
+# 每个步骤的固定等待上限(秒)。safe与原来写死的等待时间一致(goto/loadState/selector取deadlines.timeoutsMs)，
+# fast用于网络和机器都很快的环境；learned模式在样本不足时使用safe，样本足够后取 p99 × margin，
+# 并限制在 [fast, safe × maxFactor] 之间
+PRESETS = {
+    'safe': {
+        'render': 3,
+        'modal': 3,
+        'modalClose': 2,
+        'gameLoad': 8
+    },
+    'fast': {
+        'goto': 20,
+        'loadState': 3,
+        'selector': 2,
+        'render': 1,
+        'modal': 1,
+        'modalClose': 0.5,
+        'gameLoad': 2
+    }
+}
+
+
+class TimingModel:
+    """记录每个步骤在本机和每个环境上的实际耗时，按滚动百分位计算超时和轮询间隔，运行之间保存在文件中"""
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_TIMING_CONFIG, **(config or {})}
+        self.host = socket.gethostname()
+        self.samples = {'hosts': {}, 'envs': {}}
+        self.dirty = False
+
+    def load(self):
+        path = self.config['path']
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.samples = {'hosts': data.get('hosts', {}), 'envs': data.get('envs', {})}
+        except Exception as e:
+            log.warning(f"读取等待时间记录失败，重新开始统计: {str(e)}")
+
+    def snapshot(self):
+        self.dirty = False
+        return {scope: {key: {step: list(values) for step, values in steps.items()} for key, steps in keys.items()}
+                for scope, keys in self.samples.items()}
+
+    def write(self, data):
+        path = self.config['path']
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def record(self, step, seconds):
+        seconds = round(seconds, 3)
+        for scope, key, window in (('hosts', self.host, self.config['window']),
+                                   ('envs', uniqueIdVar.get(), self.config['envWindow'])):
+            if key == '-':
+                continue
+            values = self.samples[scope].setdefault(key, {}).setdefault(step, [])
+            values.append(seconds)
+            del values[:-window]
+        self.dirty = True
+
+    def _observed(self, step):
+        # 环境自己的样本足够时优先使用，否则使用本机所有环境的样本
+        for scope, key in (('envs', uniqueIdVar.get()), ('hosts', self.host)):
+            values = self.samples[scope].get(key, {}).get(step, [])
+            if len(values) >= self.config['minSamples']:
+                return values
+        return None
+
+    def safe_limit(self, step):
+        return timeout_ms(step) / 1000 if step in DEFAULT_DEADLINE_CONFIG['timeoutsMs'] else PRESETS['safe'][step]
+
+    def limit(self, step):
+        """步骤的等待上限(秒)"""
+        profile = self.config['profile']
+        safe = self.safe_limit(step)
+        if profile == 'safe':
+            return safe
+        if profile in PRESETS:
+            return PRESETS[profile][step]
+        values = self._observed(step)
+        if values is None:
+            return safe
+        learned = percentile(values, self.config['percentile']) * self.config['margin']
+        return min(max(learned, PRESETS['fast'][step]), safe * self.config['maxFactor'])
+
+    def timeout_ms(self, step):
+        return int(self.limit(step) * 1000)
+
+    def poll_interval(self, step):
+        """轮询间隔取典型耗时的1/5，限制在 pollMs.min ~ pollMs.max 之间"""
+        values = self._observed(step)
+        typical = percentile(values, 50) if values else self.limit(step) / 2
+        poll = self.config['pollMs']
+        return min(max(typical / 5, poll['min'] / 1000), poll['max'] / 1000)
+
+    async def wait_until(self, step, predicate):
+        """轮询predicate直到为真或达到上限，返回是否满足"""
+        limit = self.limit(step)
+        interval = self.poll_interval(step)
+        started = time.monotonic()
+        while True:
+            try:
+                if await predicate():
+                    self.record(step, time.monotonic() - started)
+                    return True
+            except Exception as e:
+                log.debug(f"等待 {step} 时检查失败: {str(e)}")
+            elapsed = time.monotonic() - started
+            if elapsed >= limit:
+                # 超时只说明实际耗时不短于elapsed，按删失样本记录: 慢的时候上限会随之变大，但最多回到safe，
+                # 条件一直不满足的步骤不会把等待越拉越长
+                self.record(step, min(elapsed, self.safe_limit(step) / self.config['margin']))
+                return False
+            await asyncio.sleep(min(interval, limit - elapsed))
+
+    async def measure(self, step, awaitable):
+        """执行一次带超时的Playwright等待并记录耗时，超时等失败按删失样本记录后原样抛出"""
+        started = time.monotonic()
+        try:
+            result = await awaitable
+        except Exception:
+            # 与wait_until一致: 失败时的耗时只是下限，最多按safe记录，避免上限卡在过小的值上一直超时
+            self.record(step, min(time.monotonic() - started, self.safe_limit(step) / self.config['margin']))
+            raise
+        self.record(step, time.monotonic() - started)
+        return result
+
+
+timing = TimingModel()
+
+
+def configure_timing(config=None):
+    timing.config.update(config or {})
+    timing.load()
+
+
+async def save_timing():
+    # 在事件循环里复制样本，写文件放到线程中
+    if not timing.dirty:
+        return
+    try:
+        await asyncio.to_thread(timing.write, timing.snapshot())
+    except Exception as e:
+        log.warning(f"保存等待时间记录失败: {str(e)}")
@@ -0,0 +1,73 @@
+
+import glob
+import json
+import os
+import re
+import time
+
+
+DEFAULT_TRACE_CONFIG = {
+    'enabled': True,
+    'dir': 'traces'
+}
+
+MINE_CHARS = ('X', 'M', 'B')
+
+
+def write_trace(records, directory, uniqueId, envId, cycle):
+    """把一轮游戏的决策记录追加到 traces/<日期>/env-<uniqueId>.ndjson"""
+    if not records:
+        return None
+    day_dir = os.path.join(directory, time.strftime('%Y%m%d'))
+    os.makedirs(day_dir, exist_ok=True)
+    path = os.path.join(day_dir, 'env-' + re.sub(r'[^\w.-]', '_', str(uniqueId)) + '.ndjson')
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            record = {'uniqueId': uniqueId, 'envId': envId, 'cycle': cycle, **record}
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    return path
+
+
+def expand_paths(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', '*.ndjson'), recursive=True)))
+        else:
+            files.extend(sorted(glob.glob(path)))
+    return files
+
+
+def read_traces(paths):
+    for path in expand_paths(paths):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def group_games(records):
+    """按 (uniqueId, game) 分组，返回的每局包含按时间排序的决策和最终结果"""
+    games = {}
+    for record in records:
+        key = (record.get('uniqueId'), record.get('game'))
+        game = games.setdefault(key, {'uniqueId': key[0], 'game': key[1], 'decisions': [], 'final': None})
+        if 'result' in record:
+            game['final'] = record
+        elif record.get('move') is not None:
+            game['decisions'].append(record)
+    for game in games.values():
+        game['decisions'].sort(key=lambda r: r.get('t', 0))
+    return list(games.values())
+
+
+def known_mines(board):
+    mines = set()
+    if not board:
+        return mines
+    for y, line in enumerate(board.split('/')):
+        for x, ch in enumerate(line):
+            if ch in MINE_CHARS:
+                mines.add((x, y))
+    return mines